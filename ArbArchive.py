@@ -0,0 +1,194 @@
+"""
+Архив завершённых боёв.
+
+Завершённый бой переносится из живых таблиц ``BATTLE_*`` в архив одной транзакцией: строки всех таблиц боя
+(по правилу каскадного удаления ``'battle'``) сжимаются в один JSON-блоб в ``ARCHIVE_BATTLE_DATA``, а краткие
+сведения о бое записываются в индекс ``ARCHIVE_BATTLES``. Живые таблицы хранят только активные бои,
+а архивный бой можно прочитать (``load``) или вернуть в живые таблицы для разбора (``restore``).
+Ссылки на бой, которые каскад обнуляет (``LOC_INIT.current_battle``), сохраняются вместе с боем и
+возвращаются при ``restore``.
+
+Таблицы архива (``ARCHIVE_SCHEMA``) создаются миграцией ``ArbMigrations``, а если она ещё не применена -
+самим ``BattleArchive`` перед первым обращением к архиву.
+"""
+import datetime
+import json
+import zlib
+from dataclasses import asdict, dataclass
+
+from ArbDatabase import DEFAULT_MANAGER, DataManager
+
+ARCHIVE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS ARCHIVE_BATTLES (battle_id INTEGER PRIMARY KEY, label TEXT, battle_type TEXT, '
+    'rounds INTEGER, actors INTEGER, archived_at TEXT, summary TEXT, size INTEGER)',
+    'CREATE INDEX IF NOT EXISTS IDX_ARCHIVE_BATTLES_ARCHIVED ON ARCHIVE_BATTLES (archived_at)',
+    'CREATE TABLE IF NOT EXISTS ARCHIVE_BATTLE_DATA (battle_id INTEGER PRIMARY KEY, data BLOB)',
+)
+
+
+@dataclass(frozen=True)
+class ArchivedBattle:
+    battle_id: int
+    label: str
+    battle_type: str
+    rounds: int
+    actors: int
+    archived_at: str
+    summary: str
+    size: int
+
+
+class BattleArchive:
+    INDEX_TABLE = 'ARCHIVE_BATTLES'
+    DATA_TABLE = 'ARCHIVE_BATTLE_DATA'
+    ROOT_TABLE = 'BATTLE_INIT'
+    RULE = 'battle'
+    # Ключ снимка с обнулёнными каскадом ссылками на бой (не таблица)
+    NULLIFIED = '_nullified'
+
+    def __init__(self, data_manager: DataManager = None, compression_level: int = 9):
+        self.data_manager = data_manager or DEFAULT_MANAGER
+        self.compression_level = compression_level
+        self._ready = False
+
+    def ensure_tables(self):
+        """Создаёт таблицы архива, если миграция с ними ещё не применена."""
+        if self._ready:
+            return
+        tables = {table.lower() for table in self.data_manager.schema.tables()}
+        if not {self.INDEX_TABLE.lower(), self.DATA_TABLE.lower()} <= tables:
+            for statement in ARCHIVE_SCHEMA:
+                self.data_manager.raw_execute(statement)
+        self._ready = True
+
+    def _table_rows(self, table: str, columns: tuple[str, ...], battle_id: int) -> dict | None:
+        names = self.data_manager.get_all_columns(table)
+        where = ' OR '.join(f'{column} = ?' for column in columns)
+        rows = self.data_manager.raw_execute(f"SELECT {', '.join(names)} FROM {table} WHERE {where}",
+                                             (battle_id,) * len(columns))
+        return {'columns': names, 'rows': [list(row) for row in rows]} if rows else None
+
+    def snapshot(self, battle_id: int) -> dict[str, dict]:
+        """Строки боя из живых таблиц: ``{таблица: {'columns': [...], 'rows': [[...], ...]}}``."""
+        tables = {self.ROOT_TABLE: ('id',), **self.data_manager.cascade.references(self.RULE)}
+        snapshot = {}
+        for table, columns in tables.items():
+            rows = self._table_rows(table, columns, battle_id)
+            if rows:
+                snapshot[table] = rows
+        return snapshot
+
+    def nullified(self, battle_id: int) -> dict[str, dict]:
+        """
+        Строки, в которых каскад обнулит ссылку на бой: ``{таблица: {колонка: {'key': [...], 'rows': [[...], ...]}}}``
+        (ключ строки - первичный ключ таблицы или ``rowid``).
+        """
+        schema = self.data_manager.schema
+        tables = {table.lower(): table for table in schema.tables()}
+        result = {}
+        for table, columns in self.data_manager.cascade.rules[self.RULE].nullify.items():
+            table = tables.get(table.lower())
+            if table is None:
+                continue
+            keys = schema.unique_keys(table)
+            key = sorted(keys[0]) if keys else ['rowid']
+            for column in (column for column in schema.columns(table) if column in columns):
+                rows = self.data_manager.raw_execute(f"SELECT {', '.join(key)} FROM {table} WHERE {column} = ?", (battle_id,))
+                if rows:
+                    result.setdefault(table, {})[column] = {'key': key, 'rows': [list(row) for row in rows]}
+        return result
+
+    def _pack(self, snapshot: dict) -> bytes:
+        data = json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return zlib.compress(data, self.compression_level)
+
+    @staticmethod
+    def _unpack(blob: bytes) -> dict:
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+    def archive(self, battle_id: int, summary: str = None) -> ArchivedBattle | None:
+        """
+        Переносит бой в архив: сохраняет его строки и удаляет их из живых таблиц одной транзакцией.
+        Возвращает запись индекса архива или None, если боя нет.
+        """
+        self.ensure_tables()
+        with self.data_manager.transaction():
+            snapshot = self.snapshot(battle_id)
+            if self.ROOT_TABLE not in snapshot:
+                return None
+
+            battle = dict(zip(snapshot[self.ROOT_TABLE]['columns'], snapshot[self.ROOT_TABLE]['rows'][0]))
+            actors = {value for table in ('BATTLE_CHARACTERS', 'BATTLE_DEAD') if table in snapshot
+                      for value in self._values(snapshot[table], 'character_id')}
+            nullified = self.nullified(battle_id)
+            blob = self._pack({**snapshot, self.NULLIFIED: nullified} if nullified else snapshot)
+            entry = ArchivedBattle(battle_id, battle.get('label'), battle.get('battle_type'), battle.get('round') or 0,
+                                   len(actors), datetime.datetime.now().isoformat(timespec='seconds'), summary, len(blob))
+
+            self.data_manager.bulk_upsert(self.INDEX_TABLE, 'battle_id', [asdict(entry)])
+            self.data_manager.bulk_upsert(self.DATA_TABLE, 'battle_id', [{'battle_id': battle_id, 'data': blob}])
+            self.data_manager.cascade_delete(self.RULE, battle_id)
+        return entry
+
+    @staticmethod
+    def _values(table: dict, column: str) -> list:
+        index = table['columns'].index(column)
+        return [row[index] for row in table['rows']]
+
+    def entries(self, limit: int = 25) -> list[ArchivedBattle]:
+        """Последние бои в архиве (по времени архивации)."""
+        self.ensure_tables()
+        rows = self.data_manager.raw_execute(f'SELECT * FROM {self.INDEX_TABLE} ORDER BY archived_at DESC LIMIT ?',
+                                             (limit,))
+        return [ArchivedBattle(*row) for row in rows]
+
+    def get(self, battle_id: int) -> ArchivedBattle | None:
+        self.ensure_tables()
+        row = self.data_manager.fetch_one_or_none(self.INDEX_TABLE, f'battle_id = {battle_id}')
+        return ArchivedBattle(**row) if row else None
+
+    def _data(self, battle_id: int) -> dict | None:
+        self.ensure_tables()
+        row = self.data_manager.fetch_one_or_none(self.DATA_TABLE, f'battle_id = {battle_id}')
+        return self._unpack(row['data']) if row else None
+
+    def load(self, battle_id: int) -> dict[str, list[dict]] | None:
+        """Строки архивного боя по таблицам (без возврата в живые таблицы) или None, если боя нет в архиве."""
+        data = self._data(battle_id)
+        if data is None:
+            return None
+        return {table: [dict(zip(rows['columns'], values)) for values in rows['rows']]
+                for table, rows in data.items() if table != self.NULLIFIED}
+
+    def restore(self, battle_id: int, keep: bool = False) -> dict[str, int] | None:
+        """
+        Возвращает архивный бой в живые таблицы одной транзакцией (для разбора боя) и, если не указано ``keep``,
+        удаляет его из архива. Ссылки на бой, обнулённые при архивации (``LOC_INIT.current_battle``), возвращаются,
+        если строки ещё существуют. Возвращает число восстановленных строк по таблицам или None, если боя нет в архиве.
+        """
+        data = self._data(battle_id)
+        if data is None:
+            return None
+        tables = self.load(battle_id)
+        if self.data_manager.check(self.ROOT_TABLE, f'id = {battle_id}'):
+            raise ValueError(f'Бой {battle_id} уже есть среди активных боёв')
+
+        with self.data_manager.transaction():
+            for table, rows in tables.items():
+                self.data_manager.bulk_insert(table, rows)
+            for table, columns in data.get(self.NULLIFIED, {}).items():
+                for column, refs in columns.items():
+                    self.data_manager.bulk_update(table, refs['key'], [{**dict(zip(refs['key'], row)), column: battle_id}
+                                                                       for row in refs['rows']])
+            if not keep:
+                self.data_manager.delete(self.DATA_TABLE, f'battle_id = {battle_id}')
+                self.data_manager.delete(self.INDEX_TABLE, f'battle_id = {battle_id}')
+        return {table: len(rows) for table, rows in tables.items()}
+
+    def info(self) -> dict[str, int]:
+        self.ensure_tables()
+        battles, size = self.data_manager.raw_execute(f'SELECT COUNT(*), TOTAL(size) FROM {self.INDEX_TABLE}', fetch='one')
+        return {'battles': battles, 'bytes': int(size)}
+
+
+DEFAULT_ARCHIVE = BattleArchive()
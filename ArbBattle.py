@@ -5,6 +5,10 @@ import pprint
 import random
 from dataclasses import dataclass
 from ArbDatabase import DataManager, DataModel, DataDict
+from ArbArchive import BattleArchive
+from ArbBattleState import BattleState, TurnScheduler
+from ArbVision import LayerView, ObserverView, StealthCache, StealthScore, TargetView, VisibilityCache, VisibilityMatrix, \
+    layers_vigilance
 from ArbEventManager import Event, EventHandler, EventManager
 from ArbHealth import Body, BodyElement
 from ArbSkills import Skill, SkillInit
@@ -15,7 +19,7 @@ from abc import ABC, abstractmethod
 from ArbResponse import Response, ResponsePool, RespondLog, RespondIcon, Notification
 from ArbItems import Item
 
-from functools import wraps
+from functools import cached_property, wraps
 from collections import Counter
 
 
@@ -30,7 +34,7 @@ class Weather(DataModel):
         self.rain_intense = self.get('rain_intense', 0)
         self.wind_speed = self.get('wind_speed', 0)
         self.temperature = int(self.get('temp', 0))
-        self.visibility = self.get('visibility', 100)
+        self.visibility = self.get('visibility', 100) if self.get('visibility') is not None else 100
         self.light = self.get('light', 100)
         self.noise = self.get('noise', 0)
         self.description = self.get('desc', '')
@@ -50,7 +54,7 @@ class DayTime(DataModel):
         DataModel.__init__(self, 'DAYTIME_CONDS', f'id = "{self.id}"', data_manager=self.data_manager)
         self.label = self.get('label','Неизвестное время суток')
         self.temperature = int(self.get('temp', 0))
-        self.visibility = self.get('visibility', 100)
+        self.visibility = self.get('visibility', 100) if self.get('visibility') is not None else 100
         self.light = self.get('light', 100)
         self.noise = self.get('noise', 0)
         self.description = self.get('desc', '')
@@ -73,7 +77,7 @@ class Terrain(DataModel):
         self.desc = self.get('desc','')
         self.types = self.get('type', 'Природный')
         self.movement_cost = self.get('movement_cost',1)
-        self.visibility = self.get('visibility', 100)
+        self.visibility = self.get('visibility', 100) if self.get('visibility') is not None else 100
         self.light = self.get('light', 100)
         self.coverage = self.get('coverage', 0) == 1
         self.reachable = self.get('reachable', 1) == 1
@@ -225,7 +229,9 @@ class GameObject(DataModel):
         self.id = id
         self.data_manager = kwargs.get('data_manager', DataManager())
 
-        DataModel.__init__(self, 'BATTLE_OBJECTS', f'object_id = {self.id}', data_manager=self.data_manager)
+        state = BattleState.current()
+        DataModel.__init__(self, 'BATTLE_OBJECTS', f'object_id = {self.id}', data_manager=self.data_manager,
+                           row=state.game_object(self.id) if state else None)
 
         self.layer_id = self.get('layer_id', 0)
         self.battle_id = self.get('battle_id', 0)
@@ -263,6 +269,10 @@ class GameObject(DataModel):
             return self.data_manager.select_dict('BATTLE_OBJECTS',filter=f'battle_id = {self.battle_id} AND layer_id = {self.layer_id} AND object_id = {self.id}')[0]
 
     def current_characters(self):
+        state = BattleState.current(self.battle_id)
+        if state:
+            return [actor_id for actor_id in state.object_actors(self.id) if state.actor(actor_id).get('layer_id') == self.layer_id]
+
         if self.data_manager.check('BATTLE_CHARACTERS',f'battle_id = {self.battle_id} AND layer_id = {self.layer_id} AND object = {self.id}') is None:
             return []
         else:
@@ -291,8 +301,8 @@ class GameObject(DataModel):
     def delete_object(self):
         chars = self.current_characters()
         if chars:
-            for char in chars:
-                self.data_manager.update('BATTLE_CHARACTERS',{'object': None}, f'character_id = {char}')
+            self.data_manager.bulk_update('BATTLE_CHARACTERS', 'character_id',
+                                          [{'character_id': char, 'object': None} for char in chars])
 
         self.data_manager.delete('BATTLE_OBJECTS',f'object_id = {self.id} AND layer_id = {self.layer_id} AND battle_id = {self.battle_id}')
 
@@ -347,7 +357,9 @@ class BattleTeam(DataModel):
         self.id = id
         self.data_manager = kwargs.get('data_manager', DataManager())
 
-        DataModel.__init__(self, 'BATTLE_TEAMS', f'team_id = {self.id}', data_manager=self.data_manager)
+        state = BattleState.current()
+        DataModel.__init__(self, 'BATTLE_TEAMS', f'team_id = {self.id}', data_manager=self.data_manager,
+                           row=state.team(self.id) if state else None)
 
         self.battle_id = self.get('battle_id', None)
         self.label = self.get('label', 'Неизвестная команда')
@@ -387,10 +399,10 @@ class BattleTeam(DataModel):
             return None
 
     def delete_team(self):
-        members = self.fetch_members()
-        for member in members:
-            self.data_manager.update('BATTLE_CHARACTERS', {'team_id': None}, f'character_id = {member}')
-            self.data_manager.update('BATTLE_DEAD', {'team_id': None}, f'character_id = {member}')
+        members = [{'character_id': member, 'team_id': None} for member in self.fetch_members()]
+        with self.data_manager.transaction():
+            self.data_manager.bulk_update('BATTLE_CHARACTERS', 'character_id', members)
+            self.data_manager.bulk_update('BATTLE_DEAD', 'character_id', members)
 
         self.delete_record()
 
@@ -443,12 +455,20 @@ class BattleTeam(DataModel):
         return self.data_manager.get_count('BATTLE_CHARACTERS','character_id',f'team_id = {self.id} AND battle_id = {self.battle_id}')
 
     def fetch_members(self) -> list[int]:
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.team_members(self.id)
+
         if self.data_manager.check('BATTLE_CHARACTERS', f'team_id = {self.id}'):
             return [member.get('character_id') for member in self.data_manager.select_dict('BATTLE_CHARACTERS', filter=f'team_id = {self.id} ')]
         else:
             return []
 
     def get_dead_members(self) -> list[int]:
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.dead_team_members(self.id)
+
         if self.data_manager.check('BATTLE_DEAD', f'team_id = {self.id}'):
             return [member.get('character_id') for member in self.data_manager.select_dict('BATTLE_DEAD', filter=f'team_id = {self.id}')]
         else:
@@ -471,11 +491,10 @@ class BattleTeam(DataModel):
         self.coordinator_id = target_id
 
     def set_activity(self, set: bool) -> None:
-        if set:
-            self.data_manager.update('BATTLE_TEAMS', {'round_active': 1}, f'team_id = {self.id}')
-
-        else:
-            self.data_manager.update('BATTLE_TEAMS', {'round_active': 0}, f'team_id = {self.id}')
+        values = {'round_active': 1 if set else 0}
+        state = BattleState.current(self.battle_id)
+        if not state or not state.update_team(self.id, values):
+            self.data_manager.update('BATTLE_TEAMS', values, f'team_id = {self.id}')
 
     def set_com_points(self, com_points:int) -> None:
         self.data_manager.update('BATTLE_TEAMS', {'com_points': com_points}, f'team_id = {self.id}')
@@ -563,7 +582,7 @@ class Coordinator(DataModel):
         return decorator
 
     def make_sound(self, sound_id:str, layer_id:int, volume:int=None) -> None:
-        prompt = {'id': self.data_manager.maxValue('BATTLE_SOUNDS','id')+1,
+        prompt = {'id': self.data_manager.next_id('BATTLE_SOUNDS'),
                   'battle_id': self.battle_id,
                   'actor_id': None,
                   'layer_id': layer_id,
@@ -1064,7 +1083,7 @@ class Capture(BattleType):
 class BattleLogger:
     @staticmethod
     def log_event(data_manager: DataManager, battle_id: int, event_type: str, actor_id: int = None, event_description: str = '', target_id: int = None):
-        event_id = data_manager.maxValue('BATTLE_EVENTS', 'event_id') + 1
+        event_id = data_manager.next_id('BATTLE_EVENTS', 'event_id')
         round = Battlefield(battle_id, data_manager=data_manager).round
 
         query = {
@@ -1106,17 +1125,27 @@ class Layer(DataModel):
         self.battle_id = battle_id
         self.data_manager = kwargs.get('data_manager',DataManager())
 
-        DataModel.__init__(self, 'BATTLE_LAYERS', f'id = {self.id} and battle_id = {self.battle_id}', data_manager=self.data_manager)
+        state = BattleState.current(self.battle_id)
+        DataModel.__init__(self, 'BATTLE_LAYERS', f'id = {self.id} and battle_id = {self.battle_id}', data_manager=self.data_manager,
+                           row=state.layer(self.id) if state else None)
 
         self.label = self.get('label','Неизвестная местность')
-        self.terrain = Terrain(self.get('terrain_type','Field'), data_manager=self.data_manager)
+        self.terrain = Terrain(self.get('terrain_type') or 'Field', data_manager=self.data_manager)
         self.height = self.get('height', 0) if self.get('height', 0) is not None else 0
 
     def get_objects(self):
+        state = BattleState.current(self.battle_id)
+        if state:
+            return [GameObject(object_id, data_manager=self.data_manager) for object_id in state.layer_objects(self.id)]
+
         return [GameObject(i.get('object_id'), layer_id=self.id, battle_id=self.battle_id, data_manager=self.data_manager) for i in self.data_manager.select_dict('BATTLE_OBJECTS', filter=f'layer_id = {self.id} AND battle_id = {self.battle_id}')]
 
     def get_traps(self):
         from ArbWeapons import Trap
+        state = BattleState.current(self.battle_id)
+        if state:
+            return [Trap(trap_id, data_manager=self.data_manager) for trap_id in state.layer_traps(self.id)]
+
         traps_list = []
         if self.data_manager.check('BATTLE_TRAPS', f'battle_id = {self.battle_id} AND layer_id = {self.id}'):
             for trap in self.data_manager.select_dict('BATTLE_TRAPS',
@@ -1129,12 +1158,20 @@ class Layer(DataModel):
         return self.height + self.terrain.height
 
     def fetch_characters(self):
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.layer_actors(self.id)
+
         if not self.data_manager.check('BATTLE_CHARACTERS', f'layer_id = {self.id} AND battle_id = {self.battle_id}'):
             return []
         else:
             return [charc.get('character_id') for charc in self.data_manager.select_dict('BATTLE_CHARACTERS', filter=f'layer_id = {self.id} AND battle_id = {self.battle_id}')]
 
     def characters_not_in_cover(self):
+        state = BattleState.current(self.battle_id)
+        if state:
+            return [actor_id for actor_id in state.layer_actors(self.id) if state.actor(actor_id).get('object') is None]
+
         characters = self.fetch_characters()
         total_list = []
         for char in characters:
@@ -1146,6 +1183,10 @@ class Layer(DataModel):
         return total_list
 
     def get_all_characters_on_layer(self):
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.layer_actors(self.id)
+
         if not self.data_manager.check('BATTLE_CHARACTERS', f'layer_id = {self.id} AND battle_id = {self.battle_id}'):
             return []
         else:
@@ -1153,10 +1194,9 @@ class Layer(DataModel):
 
     def add_object(self, object_type:str, endurance:int=None, captured:int=None, value:int=None, uses:int=None):
         value = value if value is not None and value > 0 else 1
-        object_id = self.data_manager.maxValue('BATTLE_OBJECTS', 'object_id')
+        object_ids = self.data_manager.reserve_ids('BATTLE_OBJECTS', 'object_id', value)
 
-        for i in range(value):
-            object_id += 1
+        for object_id in object_ids:
             prompt = {'battle_id': self.battle_id,
                       'layer_id': self.id,
                       'object_id': object_id,
@@ -1175,11 +1215,7 @@ class Layer(DataModel):
     def add_trap(self, trap_type:str, buff:int=None, value:int=None):
         value = value if value is not None and value > 0 else 1
         buff = buff if buff is not None else 0
-        trap_id = self.data_manager.maxValue('BATTLE_TRAPS', 'trap_id') + 1
-
-        for i in range(value):
-            trap_id += 1
-
+        for trap_id in self.data_manager.reserve_ids('BATTLE_TRAPS', 'trap_id', value):
             prompt = {
                 'battle_id': self.battle_id,
                 'layer_id': self.id,
@@ -1243,7 +1279,9 @@ class Battlefield(DataModel):
         self.battle_id = battle_id
         self.data_manager = kwargs.get('data_manager', DataManager())
 
-        DataModel.__init__(self, 'BATTLE_INIT', f'id = {self.battle_id}', data_manager=self.data_manager)
+        state = BattleState.current(self.battle_id)
+        DataModel.__init__(self, 'BATTLE_INIT', f'id = {self.battle_id}', data_manager=self.data_manager,
+                           row=state.battle if state else None)
         self.label = self.get('label', 'Неизвестное поле боя')
         self.distance_delta = self.get('distance_delta', 0)
         self.description = self.get('desc', '')
@@ -1342,6 +1380,10 @@ class Battlefield(DataModel):
             :return: dict[int, Layer]
             """
 
+        state = BattleState.current(self.battle_id)
+        if state:
+            return {layer_id: Layer(layer_id, self.battle_id, data_manager=self.data_manager) for layer_id in state.layers()}
+
         if not self.data_manager.check('BATTLE_LAYERS', f'battle_id = {self.battle_id}'):
             return {}
 
@@ -1359,6 +1401,10 @@ class Battlefield(DataModel):
             :return: list[int]
             """
 
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.teams()
+
         if self.data_manager.check('BATTLE_TEAMS', f'battle_id = {self.battle_id}'):
             teams = self.data_manager.select_dict('BATTLE_TEAMS', filter=f'battle_id = {self.battle_id}')
             return [team.get('team_id') for team in teams]
@@ -1372,6 +1418,10 @@ class Battlefield(DataModel):
         :return: list[int]
         """
 
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.actors()
+
         if self.data_manager.check('BATTLE_CHARACTERS', f'battle_id = {self.battle_id}') is None:
             return []
         else:
@@ -1384,6 +1434,10 @@ class Battlefield(DataModel):
         :return: list[int]
         """
 
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.dead()
+
         if self.data_manager.check('BATTLE_DEAD', f'battle_id = {self.battle_id}') is None:
             return []
         else:
@@ -1436,6 +1490,20 @@ class Battlefield(DataModel):
 
         return (max_layer - min_layer) * self.distance_delta
 
+    def turn_scheduler(self) -> TurnScheduler:
+        """
+            Очередь ходов боя: из состояния боя текущей команды или из строк участников (одним запросом)
+
+            :return: TurnScheduler
+        """
+
+        state = BattleState.current(self.battle_id)
+        if state:
+            return state.scheduler()
+
+        return TurnScheduler.from_rows(self.data_manager.select_dict('BATTLE_CHARACTERS', 'character_id, initiative, is_active',
+                                                                     filter=f'battle_id = {self.battle_id}'))
+
     def max_initiative_actor(self) -> int | None:
         """
             Выводит идентификатор персонажа с максимальной инициативой среди списка !активных! персонажей.
@@ -1444,16 +1512,7 @@ class Battlefield(DataModel):
             :return: int | None - идентификатор персонажа с максимальной инициативой
         """
 
-        c_list = self.fetch_actors()
-        c_actor = None
-        max_initiative = 0
-        for act in c_list:
-            actor = Actor(act, data_manager=self.data_manager)
-            if actor.initiative > max_initiative and actor.is_active is None:
-                max_initiative = actor.initiative
-                c_actor = act
-
-        return c_actor
+        return self.turn_scheduler().next_actor()
 
     def turn_order(self) -> list[int]:
         """
@@ -1462,9 +1521,7 @@ class Battlefield(DataModel):
             :return: list[int] - список идентификаторов персонажей
         """
 
-        c_list = self.fetch_actors()
-        sorted_actors = sorted(c_list, key=lambda actor: Actor(actor, data_manager=self.data_manager).initiative, reverse=True)
-        return [actor for actor in sorted_actors]
+        return self.turn_scheduler().order()
 
     def current_turn_index(self) -> int:
         """
@@ -1473,11 +1530,7 @@ class Battlefield(DataModel):
             :return: int - индекс хода персонажа
         """
 
-        for index, actor in enumerate(self.turn_order()):
-            if Actor(actor, data_manager=self.data_manager).is_active:
-                return index
-        else:
-            return 0
+        return self.turn_scheduler().current_index()
 
     def actor_turn_index(self, actor_id: int) -> int | None:
         """
@@ -1488,10 +1541,7 @@ class Battlefield(DataModel):
             :return: int | None - индекс хода персонажа
         """
 
-        for index, actor in enumerate(self.turn_order()):
-            if actor == actor_id:
-                return index
-        return None
+        return self.turn_scheduler().index(actor_id)
 
     def delete_actor(self, actor_id: int) -> None:
         """
@@ -1654,7 +1704,7 @@ class Battlefield(DataModel):
             CharacterProgress(actor, data_manager=self.data_manager).update_progress_data(exp=exp)
             APManager(actor, data_manager=self.data_manager).clear_ap()
 
-        self.delete_battle()
+        BattleArchive(self.data_manager).archive(self.battle_id, summary=ending_text)
 
         return ResponsePool(Response(True, ending_text, f'Конец {self.label} ({self.get_battle_type_label()})'))
 
@@ -1678,27 +1728,11 @@ class Battlefield(DataModel):
         if is_end:
             return True, self.end_battle()
 
-        self.round += 1
-        self.data_manager.update('BATTLE_INIT', {'round': self.round}, f'id = {self.battle_id}')
-
-        print(self.fetch_actors())
-        for act in self.fetch_actors():
-            print(act)
-            actor = Actor(act, data_manager=self.data_manager)
-            print(actor)
-            if self.round % self.key_round_delay == 0:
-                new_initiative = actor.roll_initiative()
-                actor.set_initiative(new_initiative)
-            ActionPoints.character_ap(act, data_manager=self.data_manager).new_round_ap()
-            actor.set_active(None)
+        summary = RoundTransition(self).run()
+        self.round = summary.round
+        self.round_summary = summary
+        self.data_manager.logger.info(summary.describe())
 
-        teams = self.fetch_teams()
-
-        if teams:
-            for team in teams:
-                BattleTeam(team, data_manager=self.data_manager).set_activity(True)
-
-        self.clear_round_sounds()
         BattleLogger.log_event(self.data_manager, self.battle_id, 'NewCycle', event_description=f'Начинается {self.round} раунд!')
 
         return False, ResponsePool(Response(True, f'*Начинается {"последний " if self.round == self.last_round else ""}{self.round} раунд!*', 'Сражение продолжается'))
@@ -1706,13 +1740,20 @@ class Battlefield(DataModel):
     def next_actor(self) -> ResponsePool:
         from ArbCharacters import Character
 
-        if self.data_manager.check('BATTLE_CHARACTERS', f'battle_id = {self.battle_id} AND is_active = 1'):
+        state = BattleState.current(self.battle_id)
+        if state:
+            active_actor = state.active_actor()
+        elif self.data_manager.check('BATTLE_CHARACTERS', f'battle_id = {self.battle_id} AND is_active = 1'):
             active_actor = self.data_manager.select_dict('BATTLE_CHARACTERS', filter=f'battle_id = {self.battle_id} AND is_active = 1')[0].get('character_id')
+        else:
+            active_actor = None
+
+        if active_actor is not None:
             Actor(active_actor, data_manager=self.data_manager).set_active(False)
             BattleLogger.log_event(self.data_manager, self.battle_id, 'EndTurn', event_description=f'Персонаж {active_actor} завершает свой ход!')
 
-        if self.max_initiative_actor() is not None:
-            n_actor = self.max_initiative_actor()
+        n_actor = self.max_initiative_actor()
+        if n_actor is not None:
             Actor(n_actor, data_manager=self.data_manager).set_active(True)
             BattleLogger.log_event(self.data_manager, self.battle_id, 'NewTurn', actor_id=n_actor, event_description=f'Персонаж {n_actor} начинает свой ход!')
             Notification.create_notification('Ваш ход',f'*Ваш персонаж **{Character(n_actor).name}** прямо сейчас ходит в бою **{self.label}***',n_actor)
@@ -1734,14 +1775,10 @@ class Battlefield(DataModel):
             return ResponsePool(responses)
 
     def is_last_actor(self, actor_id: int) -> bool:
-        order_list = self.turn_order()
-        if actor_id == order_list[-1]:
-            return True
-        else:
-            return False
+        return actor_id == self.turn_scheduler().last()
 
     def create_team(self, label: str, role: str = None) -> BattleTeam:
-        c_id = self.data_manager.maxValue('BATTLE_TEAMS', 'team_id') + 1
+        c_id = self.data_manager.next_id('BATTLE_TEAMS', 'team_id')
 
         query = {'battle_id': self.battle_id,
                  'team_id': c_id,
@@ -1818,12 +1855,7 @@ class Battlefield(DataModel):
         return new_units
 
     def delete_battle(self) -> None:
-        battle_tables = self.data_manager.get_tables_with_prefix('BATTLE_')
-        for i in battle_tables:
-            if 'battle_id' in self.data_manager.get_all_columns(i):
-                self.data_manager.delete(i, f'battle_id = {self.battle_id}')
-        self.data_manager.delete('BATTLE_INIT', filter=f'id = {self.battle_id}')
-        self.data_manager.update('LOC_INIT', {'current_battle': None}, filter=f'current_battle = {self.battle_id}')
+        self.data_manager.cascade_delete('battle', self.battle_id)
 
     def update_battle(self, **kwargs) -> None:
 
@@ -1891,7 +1923,7 @@ class Battlefield(DataModel):
                 current_id += 1
 
     def add_sound(self, sound_type: str, actor_id: int = None, layer_id: int = None, volume: int = None, content:str = None):
-        c_id = self.data_manager.maxValue('BATTLE_SOUNDS', 'id') + 1
+        c_id = self.data_manager.next_id('BATTLE_SOUNDS')
         prompt = {'id': c_id,
                   'battle_id': self.battle_id,
                   'actor_id': actor_id if actor_id else None,
@@ -2388,7 +2420,7 @@ class ActorSounds:
         return total_text
 
     def make_sound(self, sound_id:str, volume:int=None, content:str=None) -> None:
-        idx = self.data_manager.maxValue('BATTLE_SOUNDS', 'id') + 1
+        idx = self.data_manager.next_id('BATTLE_SOUNDS')
 
         query = {
             'id': idx,
@@ -2460,13 +2492,28 @@ class ActorVision:
         self.actor = actor
         self.data_manager = actor.data_manager
 
-        self.time_factor = self.get_time_factor()
-        self.weather_factor = self.get_weather_factor()
+    @cached_property
+    def time_factor(self) -> float:
+        return self.get_time_factor()
 
-        self.dov = self.distance_of_view()
+    @cached_property
+    def weather_factor(self) -> float:
+        return self.get_weather_factor()
+
+    @cached_property
+    def dov(self) -> float:
+        return self.distance_of_view()
+
+    @cached_property
+    def capacities(self) -> dict:
+        return self.actor.capacities()
+
+    @cached_property
+    def armor_skills(self) -> dict:
+        return self.actor.armor_skills()
 
     def distance_of_view(self) -> float:
-        vision = self.actor.get_body().get_capacity('Vision') / 100
+        vision = self.capacities.get('Vision', 0) / 100
         actor_height = self.actor.get_total_height()
 
         height_bonus = actor_height * 400
@@ -2476,26 +2523,20 @@ class ActorVision:
         return basic_fov * vision * self.time_factor * self.weather_factor
 
     def get_nightvision_baff(self) -> float:
-        from ArbClothes import CharacterArmor
-
-        capacity = self.actor.get_capacity('NightVision')
-        armor_bonus = CharacterArmor(self.actor.actor_id, data_manager=self.data_manager).armors_skills().get('NightVision', 0)
+        capacity = self.capacities.get('NightVision', 0)
+        armor_bonus = self.armor_skills.get('NightVision', 0)
 
         return max(capacity, armor_bonus)
 
     def get_recon_baff(self) -> float:
-        from ArbClothes import CharacterArmor
-
-        capacity = self.actor.get_capacity('Recon')
-        armor_bonus = CharacterArmor(self.actor.actor_id, data_manager=self.data_manager).armors_skills().get('Recon', 0)
+        capacity = self.capacities.get('Recon', 0)
+        armor_bonus = self.armor_skills.get('Recon', 0)
 
         return max(capacity, armor_bonus)
 
     def get_thermal_vision_baff(self) -> float:
-        from ArbClothes import CharacterArmor
-
-        capacity = self.actor.get_capacity('ThermalVision')
-        armor_bonus = CharacterArmor(self.actor.actor_id, data_manager=self.data_manager).armors_skills().get('ThermalVision', 0)
+        capacity = self.capacities.get('ThermalVision', 0)
+        armor_bonus = self.armor_skills.get('ThermalVision', 0)
 
         return max(capacity, armor_bonus)
 
@@ -2515,97 +2556,81 @@ class ActorVision:
 
     def layer_vigilance(self, target_layer: int, distance_delta: float):
         total_distance = abs(target_layer - self.actor.layer_id) * distance_delta
-        terrain_coverage = Layer(target_layer, self.actor.battle_id).terrain.visibility / 100
+        terrain_coverage = Layer(target_layer, self.actor.battle_id, data_manager=self.data_manager).terrain.visibility / 100
         layer_baff = 0 if self.actor.layer_id != target_layer else 40
 
         return round((self.dov - total_distance) / self.dov * 100 * self.time_factor * self.weather_factor * terrain_coverage + layer_baff, 2)
 
-    def total_layers_vigilance(self):
-        battle = self.actor.get_battle()
+    def view(self, buffs: bool = True) -> ObserverView:
+        thermal_factor = 1+self.get_thermal_vision_baff()/100 if buffs else 1
+        recon_factor = 1+self.get_recon_baff()/100 if buffs else 1
 
-        battle_layers = battle.get_layers()
-        battle_layers_id = set(battle_layers.keys())
-        distance_delta = battle.distance_delta
+        return ObserverView(self.actor.actor_id, self.actor.layer_id, self.actor.object_id, self.actor.get_total_height(),
+                            self.dov, self.time_factor, self.weather_factor, thermal_factor, recon_factor)
 
-        current_height = self.actor.get_total_height()
-
-        layers_vigilance = {}
-        cached_results = {}
+    @staticmethod
+    def layer_views(battle: 'Battlefield') -> dict[int, LayerView]:
+        return {layer_id: LayerView(layer_id, layer.get_height(), bool(layer.terrain.coverage), layer.terrain.visibility / 100)
+                for layer_id, layer in battle.get_layers().items()}
 
-        for i in reversed([i for i in battle_layers_id if i < self.actor.layer_id]):  # обратный проход по слоям
-            if i in layers_vigilance:
-                break
+    @staticmethod
+    def build_matrix(battle_id: int, data_manager: DataManager) -> VisibilityMatrix:
+        """Матрица видимости боя: снимки всех персонажей и слоёв боя (см. ``ArbVision``)."""
+        battle = Battlefield(battle_id, data_manager=data_manager)
 
-            if i in cached_results:
-                layers_vigilance[i] = cached_results[i]
-            else:
-                vigilance = self.layer_vigilance(i, distance_delta)
-                if vigilance <= 0:
-                    break
-                layers_vigilance[i] = vigilance
-                cached_results[i] = vigilance
+        observers, targets = [], []
+        for actor_id in battle.fetch_actors():
+            actor = Actor(actor_id, data_manager=data_manager)
+            observers.append(ActorVision(actor).view())
+            targets.append(TargetView(actor_id, actor.layer_id, actor.object_id, actor.disguise()))
 
-            if battle_layers[i].terrain.coverage and i != self.actor.layer_id:
-                if current_height - battle_layers[i].get_height() > 10:
-                    continue
-                else:
-                    break
-            if battle_layers[i].get_height() - current_height >= 5:
-                break
+        return VisibilityMatrix(battle_id, ActorVision.layer_views(battle), observers, targets, battle.distance_delta, battle.round)
 
-        for i in [i for i in battle_layers_id if i >= self.actor.layer_id]: # проход по слоям
-            if i in layers_vigilance:
-                break
+    def get_matrix(self) -> VisibilityMatrix | None:
+        if not self.actor.battle_id:
+            return None
 
-            if i in cached_results:
-                layers_vigilance[i] = cached_results[i]
-            else:
-                vigilance = self.layer_vigilance(i, distance_delta)
-                if vigilance <= 0:
-                    break
-                layers_vigilance[i] = vigilance
-                cached_results[i] = vigilance
+        matrix = DEFAULT_VISIBILITY.get(self.actor.battle_id, self.data_manager)
+        return matrix if self.actor.actor_id in matrix else None
 
-            if battle_layers[i].terrain.coverage and i != self.actor.layer_id:
-                if current_height - battle_layers[i].get_height() > 10:
-                    continue
-                else:
-                    break
-            if battle_layers[i].get_height() - current_height >= 5:
-                break
+    def total_layers_vigilance(self):
+        matrix = self.get_matrix()
+        if matrix:
+            return matrix.layers_vigilance(self.actor.actor_id)
 
-        return layers_vigilance
+        battle = self.actor.get_battle()
+        return layers_vigilance(self.view(buffs=False), self.layer_views(battle), battle.distance_delta)
 
     def get_visible_characters(self):
-        layers_vigilance = self.total_layers_vigilance()
-        thermal_vision_baff = 1+self.get_thermal_vision_baff()/100
-        recon_baff = 1+self.get_recon_baff()/100
-
-        visible_characters = {}
-
-        for layer_id, vigilance in layers_vigilance.items():
-            layer = Layer(layer_id, self.actor.battle_id)
-            layer_characters = layer.get_all_characters_on_layer()
-
-            if not layer_characters:
-                continue
+        matrix = self.get_matrix()
+        if matrix:
+            return matrix.visible_characters(self.actor.actor_id)
 
-            visible_characters[layer_id] = []
+        return self.compute_visible_characters()
 
-            for character_id in layer_characters:
-                object_baff = 20 if Actor(character_id, data_manager=self.data_manager).object_id == self.actor.object_id else 0
+    def compute_visible_characters(self):
+        """Видимые персонажи без матрицы боя: слои и маскировка целей читаются заново."""
+        battle = self.actor.get_battle()
+        layers = self.layer_views(battle)
+        observer = self.view()
 
-                if Actor(character_id, data_manager=self.data_manager).disguise() > vigilance * thermal_vision_baff * recon_baff + object_baff:
-                    continue
-                else:
-                    visible_characters[layer_id].append(character_id)
+        targets = []
+        for layer_id in layers_vigilance(observer, layers, battle.distance_delta):
+            for character_id in Layer(layer_id, battle.battle_id, data_manager=self.data_manager).get_all_characters_on_layer():
+                character = Actor(character_id, data_manager=self.data_manager)
+                targets.append(TargetView(character_id, character.layer_id, character.object_id, character.disguise()))
 
-        return visible_characters
+        matrix = VisibilityMatrix(battle.battle_id, layers, [observer], targets, battle.distance_delta)
+        return matrix.visible_characters(self.actor.actor_id)
 
     def get_visible_dead_bodies(self):
         layers_vigilance = self.total_layers_vigilance()
         total_bodies = {}
 
+        state = BattleState.current(self.actor.battle_id)
+        if state:
+            return {layer: state.dead(layer) for layer in layers_vigilance}
+
         for layer in layers_vigilance:
             dead_bodies = [body.get('character_id') for body in self.data_manager.select_dict('BATTLE_DEAD', filter=f'layer_id = {layer} and battle_id = {self.actor.battle_id}')]
             total_bodies[layer] = dead_bodies
@@ -2657,13 +2682,11 @@ class ActorMovement:
         self.actor = actor
 
     def set_layer(self, layer_id:int):
-        query = {'layer_id': layer_id}
-        self.actor.data_manager.update('BATTLE_CHARACTERS', query, f'character_id = {self.actor.actor_id}')
+        self.actor.update_battle_data({'layer_id': layer_id})
         self.actor.layer_id = layer_id
 
     def set_object(self, object_id:int | None):
-        query = {'object': object_id}
-        self.actor.data_manager.update('BATTLE_CHARACTERS', query, f'character_id = {self.actor.actor_id}')
+        self.actor.update_battle_data({'object': object_id})
         self.actor.object_id = object_id
 
     def movement_cost(self):
@@ -2825,12 +2848,15 @@ class ActorMovement:
     def get_layer_objects(self):
         layer = self.actor.layer_id
         battle = self.actor.battle_id
+        state = BattleState.current(battle)
+        if state:
+            return state.layer_objects(layer)
 
         return [object_id.get('object_id') for object_id in self.actor.data_manager.select_dict('BATTLE_OBJECTS', filter=f'layer_id = {layer} and battle_id = {battle}')]
 
     def set_fly_height(self, height: int):
         self.actor.fly_height = height
-        self.actor.data_manager.update('BATTLE_CHARACTERS', {'height': height}, f'character_id = {self.actor.actor_id}')
+        self.actor.update_battle_data({'height': height})
 
     def fly(self, height: int) -> 'ActionManager':
         from ArbClothes import CharacterArmor
@@ -3045,6 +3071,112 @@ class ActionPoints:
         self.data_manager.update('CHARS_COMBAT', {'ap': basic_ap + ap_bonus + actor_bonus, 'ap_bonus': 0}, f'id = {self.actor_id}')
 
 
+@dataclass(frozen=True)
+class RoundSummary:
+    battle_id: int
+    round: int
+    initiative_rolled: bool
+    initiatives: dict[int, int]
+    action_points: dict[int, float]
+    created_records: int
+    teams: int
+
+    def describe(self) -> str:
+        initiative = f', инициатива переброшена ({len(self.initiatives)})' if self.initiative_rolled else ''
+        return (f'Бой {self.battle_id}: раунд {self.round}, участников {len(self.action_points)}{initiative}, '
+                f'новых боевых записей {self.created_records}, команд {self.teams}')
+
+
+class RoundTransition:
+    """
+    Переход боя к следующему раунду одним пакетом: новые инициативы и очки действия всех участников считаются
+    в памяти, а затем записываются несколькими запросами (по набору строк, а не по участнику) в одной транзакции:
+    номер раунда, инициативы, сброс активности участников и команд, очки действия и очистка звуков раунда.
+    """
+
+    BASIC_AP = 10
+
+    def __init__(self, battle: 'Battlefield'):
+        self.battle = battle
+        self.data_manager = battle.data_manager
+
+    def fetch_actors(self) -> dict[int, dict]:
+        state = BattleState.current(self.battle.battle_id)
+        if state:
+            return {actor_id: state.actor(actor_id) for actor_id in state.actors()}
+
+        return {row.get('character_id'): row for row in self.data_manager.select_dict('BATTLE_CHARACTERS', 'character_id, team_id',
+                                                                                       filter=f'battle_id = {self.battle.battle_id}')}
+
+    def roll_initiatives(self, actors: dict[int, dict]) -> dict[int, int]:
+        """Инициатива как в ``Actor.roll_initiative``; бонус роли считается один раз на команду."""
+        bonuses = {}
+        initiatives = {}
+        for actor_id, row in actors.items():
+            team_id = row.get('team_id') or None
+            if team_id not in bonuses:
+                bonuses[team_id] = BattleTeam(team_id, data_manager=self.data_manager).role.initiative_bonus if team_id is not None else 0
+            initiatives[actor_id] = round(random.randint(0, 100) + bonuses[team_id])
+
+        return initiatives
+
+    def action_points(self, actors: dict[int, dict], combat: dict[int, dict]) -> dict[int, float]:
+        """
+        Очки действия как в ``ActionPoints.new_round_ap``: базовые, накопленный бонус и сила персонажа. Сила берётся
+        из кеша ``DEFAULT_STEALTH``; если таблицы тела или экипировки изменились, отпечатки всех участников читаются
+        одним пакетом, и пересчитываются только персонажи, у которых они изменились.
+        """
+        prints = {}
+
+        def fingerprint(kind: str, actor_id: int) -> tuple:
+            # Отпечатки тела и одежды читаются для всех участников разом и только если кеш устарел
+            if kind not in prints:
+                prints[kind] = (Actor.body_fingerprints if kind == 'body' else Actor.clothes_fingerprints)(list(actors), self.data_manager)
+            return prints[kind].get(actor_id, ())
+
+        action_points = {}
+        for actor_id in actors:
+            capacities = Actor.cached_capacities(actor_id, self.data_manager, lambda: fingerprint('body', actor_id))
+            skills = Actor.cached_armor_skills(actor_id, self.data_manager, lambda: fingerprint('clothes', actor_id))
+            power = max(capacities.get('Power') or 0, skills.get('Power') or 0)
+            ap_bonus = combat.get(actor_id, {}).get('ap_bonus')
+            action_points[actor_id] = self.BASIC_AP + (ap_bonus if ap_bonus is not None else 0) + power / 10
+
+        return action_points
+
+    def run(self) -> RoundSummary:
+        battle_id = self.battle.battle_id
+        new_round = self.battle.round + 1
+
+        actors = self.fetch_actors()
+        combat = {row.get('id'): row for row in self.data_manager.select_in('CHARS_COMBAT', 'id', list(actors))}
+        missing = [{'id': actor_id, 'ap': 0, 'ap_bonus': 0, 'supressed': None, 'hunted': None, 'contained': None,
+                    'ready': None, 'target': None, 'melee_target': None} for actor_id in actors if actor_id not in combat]
+
+        initiative_rolled = new_round % self.battle.key_round_delay == 0
+        initiatives = self.roll_initiatives(actors) if initiative_rolled else {}
+        action_points = self.action_points(actors, combat)
+
+        with self.data_manager.transaction():
+            self.data_manager.update('BATTLE_INIT', {'round': new_round}, f'id = {battle_id}')
+            if initiatives:
+                self.data_manager.bulk_update('BATTLE_CHARACTERS', 'character_id',
+                                              [{'character_id': actor_id, 'initiative': initiative} for actor_id, initiative in initiatives.items()])
+            self.data_manager.update('BATTLE_CHARACTERS', {'is_active': None}, f'battle_id = {battle_id}')
+            self.data_manager.bulk_insert('CHARS_COMBAT', missing)
+            self.data_manager.bulk_update('CHARS_COMBAT', 'id',
+                                          [{'id': actor_id, 'ap': ap, 'ap_bonus': 0} for actor_id, ap in action_points.items()])
+            self.data_manager.update('BATTLE_TEAMS', {'round_active': 1}, f'battle_id = {battle_id}')
+            self.battle.clear_round_sounds()
+
+        state = BattleState.current(battle_id)
+        if state and state.battle is not None:
+            state.battle['round'] = new_round
+
+        teams = len(self.battle.fetch_teams())
+        return RoundSummary(battle_id, new_round, initiative_rolled, initiatives, action_points, len(missing), teams)
+
+
 class ActorDeath:
     def __init__(self, target_id:int, killer_id:int=None, reason:str=None, **kwargs):
         self.data_manager = kwargs.get('data_manager', DataManager())
@@ -3068,7 +3200,9 @@ class Actor(DataModel):
         self.data_manager = kwargs.get('data_manager', DataManager())
         self.event_manager = kwargs.get('event_manager', EventManager())
 
-        DataModel.__init__(self, 'BATTLE_CHARACTERS', f'character_id = {self.actor_id}', data_manager=self.data_manager)
+        state = BattleState.current()
+        DataModel.__init__(self, 'BATTLE_CHARACTERS', f'character_id = {self.actor_id}', data_manager=self.data_manager,
+                           row=state.actor(self.actor_id) if state else None)
 
         self.battle_id = self.get('battle_id', 0) if self.get('battle_id') is not None else None
         self.layer_id = self.get('layer_id', 0) if self.get('layer_id') is not None else None
@@ -3080,7 +3214,13 @@ class Actor(DataModel):
         self.is_active = self.get('is_active', None)
 
         self.fly_height = self.get('height', 0) if self.get('height') else 0
-        self.ap = self.get_ap()
+        self._ap = None
+
+    @property
+    def ap(self) -> 'APManager':
+        if self._ap is None:
+            self._ap = self.get_ap()
+        return self._ap
 
     def get_character(self):
         from ArbCharacters import Character
@@ -3291,23 +3431,80 @@ class Actor(DataModel):
 
         return layer_height + object_height + self_height
 
-    def disguise(self) -> float:
+    def stealth_score(self) -> StealthScore:
+        """Составляющие маскировки персонажа (из кеша ``DEFAULT_STEALTH``, см. ``ArbVision``)."""
         from ArbClothes import CharacterArmor
         from ArbRaces import Race
 
-        clothes_disguise = CharacterArmor(self.actor_id, data_manager=self.data_manager).calculate_disguise()
-        race_disguise = Race(self.get_body().get_character_race(), data_manager=self.data_manager).natural_disguise
-        object_disguise = self.get_object().object_type.coverage if self.object_id is not None else 0
-        stealth_skill_value = self.get_skill('Stealth')
-        stealth_modificator = 0.75 + stealth_skill_value * 0.005
-        stealth_armor_skill = self.get_armor_skill('Stealth')
-        stealth_capacity = self.get_capacity('Stealth')
+        clothes, armor_skill = DEFAULT_STEALTH.component(
+            self.actor_id, 'armor',
+            lambda: (CharacterArmor(self.actor_id, data_manager=self.data_manager).calculate_disguise(), self.armor_skills().get('Stealth', 0)),
+            self.data_manager, fingerprint=self.clothes_fingerprint)
+        race, capacity = DEFAULT_STEALTH.component(
+            self.actor_id, 'body',
+            lambda: (Race(self.get_body().get_character_race(), data_manager=self.data_manager).natural_disguise, self.capacities().get('Stealth', 0)),
+            self.data_manager)
+        skill = DEFAULT_STEALTH.component(self.actor_id, 'skill', lambda: self.get_skill('Stealth'), self.data_manager)
+        object_cover = DEFAULT_STEALTH.component(
+            self.actor_id, 'cover',
+            lambda: self.get_object().object_type.coverage if self.object_id is not None else 0,
+            self.data_manager, key=self.object_id)
+
+        return StealthScore(self.actor_id, clothes, armor_skill, race, capacity, skill, object_cover)
+
+    def capacities(self, fingerprint=None) -> dict[str, float]:
+        return self.cached_capacities(self.actor_id, self.data_manager, fingerprint or self.body_fingerprint)
+
+    def armor_skills(self, fingerprint=None) -> dict[str, float]:
+        return self.cached_armor_skills(self.actor_id, self.data_manager, fingerprint or self.clothes_fingerprint)
+
+    @staticmethod
+    def cached_capacities(actor_id: int, data_manager: DataManager, fingerprint=None) -> dict[str, float]:
+        """Способности тела персонажа (``Body.calculate_capacities``) из кеша ``DEFAULT_STEALTH``."""
+        return DEFAULT_STEALTH.component(actor_id, 'capacities',
+                                         lambda: Body(actor_id, data_manager=data_manager).calculate_capacities(),
+                                         data_manager, fingerprint=fingerprint)
+
+    @staticmethod
+    def cached_armor_skills(actor_id: int, data_manager: DataManager, fingerprint=None) -> dict[str, float]:
+        """Навыки надетой брони персонажа (``CharacterArmor.armors_skills``) из кеша ``DEFAULT_STEALTH``."""
+        from ArbClothes import CharacterArmor
+        return DEFAULT_STEALTH.component(actor_id, 'armor_skills',
+                                         lambda: CharacterArmor(actor_id, data_manager=data_manager).armors_skills(),
+                                         data_manager, fingerprint=fingerprint)
 
-        total_armor_factor = (stealth_armor_skill + clothes_disguise) / 2 if stealth_armor_skill >= clothes_disguise else clothes_disguise
+    def clothes_fingerprint(self) -> tuple:
+        """Надетая одежда персонажа одним запросом: если она не изменилась, маскировка одежды прежняя."""
+        return self.clothes_fingerprints([self.actor_id], self.data_manager).get(self.actor_id, ())
 
-        total_disguise = (total_armor_factor + max(race_disguise, stealth_capacity) + object_disguise) * stealth_modificator
+    def body_fingerprint(self) -> tuple:
+        """Раса, импланты, ранения и болезни персонажа: если они не изменились, способности тела прежние."""
+        return self.body_fingerprints([self.actor_id], self.data_manager).get(self.actor_id, ())
+
+    @staticmethod
+    def clothes_fingerprints(actor_ids: list[int], data_manager: DataManager) -> dict[int, tuple]:
+        """Надетая одежда нескольких персонажей одним запросом."""
+        result = {}
+        for start in range(0, len(actor_ids), data_manager.IN_BATCH_SIZE):
+            batch = tuple(actor_ids[start:start + data_manager.IN_BATCH_SIZE])
+            rows = data_manager.raw_execute(
+                "SELECT e.id, i.id, i.type, i.material, i.quality, i.endurance FROM CHARS_EQUIPMENT e JOIN ITEMS i ON i.id = e.item_id "
+                f"WHERE e.id IN ({', '.join(['?'] * len(batch))}) AND i.class = 'Одежда' ORDER BY e.id, i.id", batch)
+            for row in rows:
+                result.setdefault(row[0], []).append(tuple(row[1:]))
+        return {actor_id: tuple(items) for actor_id, items in result.items()}
+
+    @staticmethod
+    def body_fingerprints(actor_ids: list[int], data_manager: DataManager) -> dict[int, tuple]:
+        """Строки тела нескольких персонажей: по одному запросу к CHARS_INIT, CHARS_BODY, CHARS_INJURY и CHARS_DISEASE."""
+        result = {actor_id: [] for actor_id in actor_ids}
+        for table, columns in (('CHARS_INIT', 'id, race'), ('CHARS_BODY', '*'), ('CHARS_INJURY', '*'), ('CHARS_DISEASE', '*')):
+            for row in data_manager.select_in(table, 'id', actor_ids, columns):
+                result[row['id']].append((table, tuple(sorted(row.items()))))
+        return {actor_id: tuple(rows) for actor_id, rows in result.items()}
 
-        return round(total_disguise, 2)
+    def disguise(self) -> float:
+        return self.stealth_score().total
 
     def roll_initiative(self) -> int:
         team = BattleTeam(self.team_id, data_manager=self.data_manager) if self.team_id is not None else None
@@ -3316,8 +3513,18 @@ class Actor(DataModel):
 
         return round(random.randint(0, 100) + team_bonus)
 
+    def update_battle_data(self, values: dict) -> None:
+        """Изменяет строку персонажа в BATTLE_CHARACTERS (через состояние боя команды, если оно есть)."""
+        state = BattleState.current(self.battle_id)
+        if not state or not state.update_actor(self.actor_id, values):
+            self.data_manager.update('BATTLE_CHARACTERS', values, f'character_id = {self.actor_id}')
+        if values.keys() & {'layer_id', 'object', 'height'}:
+            DEFAULT_VISIBILITY.invalidate(self.battle_id)
+            DEFAULT_STEALTH.invalidate(self.actor_id, ('cover',))
+
     def set_initiative(self, initiative: int) -> None:
-        self.data_manager.update('BATTLE_CHARACTERS', {'initiative': initiative}, f'character_id = {self.actor_id}')
+        self.initiative = initiative
+        self.update_battle_data({'initiative': initiative})
 
     def set_active(self, active_status: bool | None) -> None:
         is_active = 1
@@ -3330,7 +3537,7 @@ class Actor(DataModel):
             is_active = 0
 
         self.is_active = active_status
-        self.data_manager.update('BATTLE_CHARACTERS', {'is_active': is_active}, f'character_id = {self.actor_id}')
+        self.update_battle_data({'is_active': is_active})
 
     def distance_to_layer(self, layer_id: int) -> float:
         distance_delta = self.get_battle().distance_delta
@@ -3931,8 +4138,15 @@ class APManager:
             self.data_manager.insert('CHARS_COMBAT', query)
 
     def get_ap_data(self):
-        self.check_record()
-        return self.data_manager.select_dict('CHARS_COMBAT', filter=f'id = {self.actor_id}')[0]
+        data = DataModel.load('CHARS_COMBAT', f'id = {self.actor_id}', self.data_manager)
+        if not data:
+            data = {
+                'id': self.actor_id,
+                'ap': 0,
+                'ap_bonus': 0
+            }
+            self.data_manager.insert('CHARS_COMBAT', data)
+        return data
 
     def clear_ap(self):
         self.ap = 0
@@ -3948,8 +4162,11 @@ class StatusManager(DataModel):
     def __init__(self, actor_id:int, **kwargs):
         self.data_manager = kwargs.get('data_manager') if kwargs.get('data_manager') else DataManager()
         self.actor_id = actor_id
-        StatusManager.check_record(self.actor_id)
-        DataModel.__init__(self, 'CHARS_COMBAT', f'id = {actor_id}', data_manager=self.data_manager)
+        state = BattleState.current()
+        row = state.status(self.actor_id) if state else None
+        if row is None:
+            StatusManager.check_record(self.actor_id)
+        DataModel.__init__(self, 'CHARS_COMBAT', f'id = {actor_id}', data_manager=self.data_manager, row=row)
 
         self.suppressing_cover = self.get('supressed', None)
         self.hunting_target = self.get('hunted', None)
@@ -4057,33 +4274,50 @@ class StatusManager(DataModel):
 
         return respond_log
 
+    @staticmethod
+    def update_status(actor_id: int, values: dict):
+        """Изменяет боевые статусы персонажа (через состояние боя команды, если персонаж в нём есть)."""
+        state = BattleState.current()
+        if not state or not state.update_status(actor_id, values):
+            DataManager().update('CHARS_COMBAT', values, f'id = {actor_id}')
+
+    @staticmethod
+    def update_statuses(values_by_actor: dict[int, dict]):
+        """``update_status`` для нескольких персонажей: тех, кого нет в состоянии боя, - одним ``bulk_update``."""
+        state = BattleState.current()
+        rows = [{'id': actor_id, **values} for actor_id, values in values_by_actor.items()
+                if not state or not state.update_status(actor_id, values)]
+        if rows:
+            DataManager().bulk_update('CHARS_COMBAT', 'id', rows)
+
     @staticmethod
     def clear_all_statuses(actor_id:int):
         query = {'hunted': None,
                  'supressed': None,
                  'contained': None,
                  'ready': None}
-        db = DataManager()
-        db.update('CHARS_COMBAT', query, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, query)
 
     @staticmethod
     def clear_target(actor_id:int):
-        db = DataManager()
-        db.update('CHARS_COMBAT', {'target': None}, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, {'target': None})
 
     @staticmethod
     def clear_melee_target(actor_id:int):
-        db = DataManager()
-        db.update('CHARS_COMBAT', {'melee_target': None}, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, {'melee_target': None})
 
     @staticmethod
     def trigger_overwatch(actor_id:int, attacker_id:int, log: 'ActionManager'):
-        db = DataManager()
-        data = db.select_dict('CHARS_COMBAT', filter=f'id = {actor_id}')
-        if not data:
-            StatusManager.check_record(actor_id)
+        state = BattleState.current()
+        data = state.status(actor_id) if state else None
+        if data is None:
+            db = DataManager()
+            data = db.select_dict('CHARS_COMBAT', filter=f'id = {actor_id}')
+            if not data:
+                StatusManager.check_record(actor_id)
+                return None
 
-        data = data[0]
+            data = data[0]
         is_ready = int(data.get('ready', False)) if data.get('ready', False) else False
         print('СТАТУС ДОЗОРА:', is_ready)
         if is_ready:
@@ -4108,6 +4342,10 @@ class StatusManager(DataModel):
 
     @staticmethod
     def get_actor_suppressors(actor_id:int, data_manager:DataManager() = None):
+        state = BattleState.current()
+        if state and state.actor(actor_id):
+            return state.suppressors(state.actor(actor_id).get('object'))
+
         db = DataManager() if not data_manager else data_manager
         data = db.select_dict('BATTLE_CHARACTERS', filter=f'character_id = {actor_id}')
         if not data:
@@ -4122,6 +4360,10 @@ class StatusManager(DataModel):
 
     @staticmethod
     def get_actor_hunters(actor_id:int, data_manager: DataManager = None):
+        state = BattleState.current()
+        if state and state.actor(actor_id):
+            return state.hunters(actor_id)
+
         db = DataManager() if not data_manager else data_manager
         data = db.select_dict('BATTLE_CHARACTERS', filter=f'character_id = {actor_id}')
         if not data:
@@ -4144,6 +4386,10 @@ class StatusManager(DataModel):
 
     @staticmethod
     def get_actor_containers(actor_id: int, data_manager: DataManager = None):
+        state = BattleState.current()
+        if state and state.actor(actor_id):
+            return state.containers(state.actor(actor_id).get('layer_id'))
+
         db = DataManager() if not data_manager else data_manager
         data = db.select_dict('BATTLE_CHARACTERS', filter=f'character_id = {actor_id}')
         if not data:
@@ -4169,6 +4415,10 @@ class StatusManager(DataModel):
 
     @staticmethod
     def get_actor_melee(actor_id: int, data_manager: DataManager = None):
+        state = BattleState.current()
+        if state and state.actor(actor_id):
+            return state.melees(actor_id)
+
         db = DataManager() if not data_manager else data_manager
         data = db.select_dict('BATTLE_CHARACTERS', filter=f'character_id = {actor_id}')
         if not data:
@@ -4198,10 +4448,8 @@ class StatusManager(DataModel):
 
     @staticmethod
     def clear_hunters(actor_id: int):
-        db = DataManager()
-        status = StatusManager(actor_id, data_manager=db)
-        for hunter in status.hunters:
-            db.update('CHARS_COMBAT', {'hunted': None}, f'id = {hunter}')
+        status = StatusManager(actor_id, data_manager=DataManager())
+        StatusManager.update_statuses({hunter: {'hunted': None} for hunter in status.hunters})
 
     @staticmethod
     def dead_clear(actor_id: int):
@@ -4212,33 +4460,31 @@ class StatusManager(DataModel):
 
     @staticmethod
     def clear_hunt(actor_id: int):
-        db = DataManager()
-        db.update('CHARS_COMBAT', {'hunted': None}, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, {'hunted': None})
 
     @staticmethod
     def clear_contained(actor_id: int):
-        db = DataManager()
-        db.update('CHARS_COMBAT', {'contained': None}, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, {'contained': None})
 
     @staticmethod
     def clear_suppress(actor_id: int):
-        db = DataManager()
-        db.update('CHARS_COMBAT', {'supressed': None}, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, {'supressed': None})
 
     @staticmethod
     def clear_overwatch(actor_id: int):
-        db = DataManager()
-        db.update('CHARS_COMBAT', {'ready': None}, f'id = {actor_id}')
+        StatusManager.update_status(actor_id, {'ready': None})
 
     @staticmethod
     def clear_targeters(actor_id:int):
-        db = DataManager()
         targeters = StatusManager.get_targeters(actor_id)
-        for t in targeters:
-            db.update('CHARS_COMBAT', {'target': None}, f'id = {t}')
+        StatusManager.update_statuses({t: {'target': None} for t in targeters})
 
     @staticmethod
     def get_targeters(actor_id:int):
+        state = BattleState.current()
+        if state and state.actor(actor_id):
+            return state.targeters(actor_id)
+
         db = DataManager()
         targeters = db.select_dict('CHARS_COMBAT', filter=f'target = {actor_id}')
         return [t.get('id') for t in targeters]
@@ -4254,3 +4500,7 @@ class ActionManager:
 
     def action(self, title:str, content:str, icon: str = RespondIcon.info()):
         self.log.add_respond(title, content, respond_icon=icon)
+
+
+DEFAULT_VISIBILITY = VisibilityCache(ActorVision.build_matrix)
+DEFAULT_STEALTH = StealthCache()
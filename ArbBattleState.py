@@ -0,0 +1,443 @@
+"""
+Состояние одного боя в памяти на время команды.
+
+Команда боя (атака, перемещение, передача хода) без состояния многократно пересоздаёт ``Battlefield``, ``Layer``,
+``Actor``, ``BattleTeam``, ``GameObject`` и ``StatusManager`` из таблиц ``BATTLE_*``: например, поиск охотников
+на персонажа читает ``CHARS_COMBAT`` каждого участника боя. ``BattleState`` загружает строки боя (персонажей,
+убитых, слои, команды, объекты, ловушки, звуки и боевые статусы) в индексированные структуры - по одному запросу
+на таблицу при первом обращении к ней - и отвечает на чтения из памяти, поэтому число запросов команды не зависит
+от размера боя.
+
+Изменения (``update``) применяются к строкам в памяти и записываются в журнал; в конце команды журнал
+сворачивается (по одной записи на строку) и записывается одной транзакцией через ``bulk_update``.
+Состояние зарегистрировано как буфер ``write_behind``: если другой код читает или пишет таблицу с незаписанными
+изменениями через ``DataManager``, журнал записывается раньше. Изменения таблиц боя в обход состояния
+замечаются по версиям таблиц в кеше строк, и такие таблицы перечитываются при следующем обращении.
+
+Очередь ходов (``TurnScheduler``) строится по строкам участников в памяти за один проход и обновляется вместе
+с ними: смена инициативы или активности участника - O(log n), следующий участник - O(1) в среднем.
+
+Использование: ``with BattleState.command(battle_id): ...`` - модели боя (``Actor``, ``Layer`` и т.д.) внутри
+блока берут данные из ``BattleState.current()``.
+"""
+import heapq
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from ArbDatabase import DEFAULT_MANAGER, DataManager, write_behind
+
+
+@dataclass(frozen=True)
+class StateTable:
+    name: str
+    key: str
+    indexes: tuple[str, ...] = ()
+
+
+class TableState:
+    """Строки одной таблицы боя по ключу и индексы ``{колонка: {значение: {ключ: None}}}`` (в порядке загрузки)."""
+
+    def __init__(self, table: StateTable, rows: list[dict]):
+        self.table = table
+        self.rows: dict[Any, dict] = {}
+        self.indexes: dict[str, dict[Any, dict]] = {column: {} for column in table.indexes}
+        for row in rows:
+            self.rows[row.get(table.key)] = row
+            self._index(row)
+
+    def _index(self, row: dict):
+        key = row.get(self.table.key)
+        for column, index in self.indexes.items():
+            index.setdefault(row.get(column), {})[key] = None
+
+    def _unindex(self, row: dict):
+        key = row.get(self.table.key)
+        for column, index in self.indexes.items():
+            keys = index.get(row.get(column))
+            if keys is not None:
+                keys.pop(key, None)
+
+    def get(self, key) -> dict | None:
+        return self.rows.get(key)
+
+    def keys(self) -> list:
+        return list(self.rows)
+
+    def where(self, column: str, value) -> list:
+        """Ключи строк с ``column = value`` (по индексу, если он есть)."""
+        if column in self.indexes:
+            return list(self.indexes[column].get(value, ()))
+        return [key for key, row in self.rows.items() if row.get(column) == value]
+
+    def update(self, key, values: dict) -> bool:
+        row = self.rows.get(key)
+        if row is None:
+            return False
+        if self.indexes.keys() & values.keys():
+            self._unindex(row)
+            row.update(values)
+            self._index(row)
+        else:
+            row.update(values)
+        return True
+
+
+_MISSING = object()
+
+
+class TurnScheduler:
+    """
+    Очередь ходов боя. Порядок ходов - по убыванию инициативы, при равенстве - в порядке строк таблицы
+    (как устойчивая сортировка в ``Battlefield.turn_order``). Ещё не ходившие участники (``is_active`` равен None)
+    с инициативой больше 0 хранятся в куче ``(-инициатива, порядок, участник)``; устаревшие записи кучи
+    отбрасываются при чтении.
+    """
+
+    def __init__(self, rows: Iterable[tuple[int, int | None, int | None]] = ()):
+        """:param rows: ``(участник, инициатива, is_active)`` в порядке строк таблицы"""
+        self._position: dict[int, int] = {}
+        self._initiative: dict[int, int] = {}
+        self._active: dict[int, Any] = {}
+        for actor_id, initiative, is_active in rows:
+            self._position[actor_id] = len(self._position)
+            self._initiative[actor_id] = initiative or 0
+            self._active[actor_id] = is_active
+
+        self._heap = [self._entry(actor_id) for actor_id in self._position if self._waiting(actor_id)]
+        heapq.heapify(self._heap)
+        self._order: list[int] | None = None
+        self._index: dict[int, int] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], key: str = 'character_id') -> 'TurnScheduler':
+        return cls((row.get(key), row.get('initiative'), row.get('is_active')) for row in rows)
+
+    def _entry(self, actor_id: int) -> tuple[int, int, int]:
+        return -self._initiative[actor_id], self._position[actor_id], actor_id
+
+    def _waiting(self, actor_id: int) -> bool:
+        return self._active[actor_id] is None and self._initiative[actor_id] > 0
+
+    def __contains__(self, actor_id: int) -> bool:
+        return actor_id in self._position
+
+    def __len__(self) -> int:
+        return len(self._position)
+
+    # Изменения
+
+    def set(self, actor_id: int, initiative=_MISSING, is_active=_MISSING):
+        """Добавляет участника в конец порядка строк или изменяет его инициативу и активность."""
+        if actor_id not in self._position:
+            self._position[actor_id] = max(self._position.values(), default=-1) + 1
+            self._initiative[actor_id] = 0
+            self._active[actor_id] = None
+            self._order = None
+
+        if initiative is not _MISSING and (initiative or 0) != self._initiative[actor_id]:
+            self._initiative[actor_id] = initiative or 0
+            self._order = None
+        if is_active is not _MISSING:
+            self._active[actor_id] = is_active
+
+        if self._waiting(actor_id):
+            heapq.heappush(self._heap, self._entry(actor_id))
+
+    def remove(self, actor_id: int):
+        """Убирает участника (смерть, выход из боя); его записи в куче станут устаревшими."""
+        if self._position.pop(actor_id, None) is not None:
+            del self._initiative[actor_id], self._active[actor_id]
+            self._order = None
+
+    # Чтение
+
+    def next_actor(self) -> int | None:
+        """Ещё не ходивший участник с наибольшей инициативой (как ``Battlefield.max_initiative_actor``)."""
+        heap = self._heap
+        while heap:
+            actor_id = heap[0][2]
+            if actor_id in self._position and self._waiting(actor_id) and heap[0] == self._entry(actor_id):
+                return actor_id
+            heapq.heappop(heap)
+        return None
+
+    def order(self) -> list[int]:
+        if self._order is None:
+            self._order = sorted(self._position, key=self._entry)
+            self._index = {actor_id: index for index, actor_id in enumerate(self._order)}
+        return list(self._order)
+
+    def index(self, actor_id: int) -> int | None:
+        if self._order is None:
+            self.order()
+        return self._index.get(actor_id)
+
+    def current_index(self) -> int:
+        """Номер хода первого (по порядку ходов) активного участника или 0."""
+        indexes = [self.index(actor_id) for actor_id, is_active in self._active.items() if is_active]
+        return min(indexes, default=0)
+
+    def last(self) -> int | None:
+        if self._order is None:
+            self.order()
+        return self._order[-1] if self._order else None
+
+
+class BattleState:
+    TABLES = (
+        StateTable('BATTLE_CHARACTERS', 'character_id', ('layer_id', 'team_id', 'object')),
+        StateTable('BATTLE_DEAD', 'character_id', ('layer_id', 'team_id')),
+        StateTable('BATTLE_LAYERS', 'id'),
+        StateTable('BATTLE_TEAMS', 'team_id'),
+        StateTable('BATTLE_OBJECTS', 'object_id', ('layer_id',)),
+        StateTable('BATTLE_TRAPS', 'trap_id', ('layer_id',)),
+        StateTable('BATTLE_SOUNDS', 'id', ('layer_id', 'actor_id')),
+    )
+    # Боевые статусы участников: строки CHARS_COMBAT персонажей боя
+    STATUS_TABLE = StateTable('CHARS_COMBAT', 'id', ('hunted', 'supressed', 'contained', 'melee_target', 'target'))
+
+    _current: ContextVar['BattleState | None'] = ContextVar('arbiter_battle_state', default=None)
+
+    def __init__(self, battle_id: int, data_manager: DataManager = None):
+        self.battle_id = battle_id
+        self.data_manager = data_manager or DEFAULT_MANAGER
+        self.battle: dict | None = None
+        self._tables: dict[str, TableState] = {}
+        self._versions: dict[str, tuple[int, int]] = {}
+        self._changes: list[tuple[str, Any, dict]] = []
+        self._scheduler: tuple[TableState, TurnScheduler] | None = None
+        self.loads = 0
+        self.flushes = 0
+
+    # Загрузка
+
+    def _definitions(self) -> dict[str, StateTable]:
+        return {table.name: table for table in self.TABLES + (self.STATUS_TABLE,)}
+
+    def _read(self, table: StateTable) -> list[dict]:
+        if table is self.STATUS_TABLE:
+            actors = self._table('BATTLE_CHARACTERS').keys()
+            return self.data_manager.select_in(table.name, table.key, actors)
+        return self.data_manager.select_dict(table.name, filter=f'battle_id = {self.battle_id}')
+
+    def _load_table(self, table: StateTable):
+        version = self.data_manager.row_cache.version(table.name)
+        self._tables[table.name] = TableState(table, self._read(table))
+        self._versions[table.name] = version
+        self.loads += 1
+
+    def load(self) -> 'BattleState':
+        """Читает строку боя. Таблицы боя читаются целиком (одним запросом) при первом обращении к ним."""
+        self.battle = self.data_manager.fetch_one_or_none('BATTLE_INIT', f'id = {self.battle_id}')
+        self._tables = {}
+        return self
+
+    def _table(self, name: str) -> TableState:
+        """Таблица боя; перечитывается, если её изменили в обход состояния."""
+        table = self._tables.get(name)
+        if table is None or self._versions[name] != self.data_manager.row_cache.version(name):
+            self._load_table(self._definitions()[name])
+            if name == 'BATTLE_CHARACTERS' and self.STATUS_TABLE.name in self._tables:
+                # Состав боя изменился - статусы могли появиться у новых участников
+                self._load_table(self.STATUS_TABLE)
+            table = self._tables[name]
+        return table
+
+    # Контекст команды
+
+    @classmethod
+    def current(cls, battle_id: int = None) -> 'BattleState | None':
+        """Состояние текущей команды (если ``battle_id`` указан - только состояние этого боя)."""
+        state = cls._current.get()
+        if state is not None and battle_id is not None and state.battle_id != battle_id:
+            return None
+        return state
+
+    @classmethod
+    @contextmanager
+    def command(cls, battle_id: int | None, data_manager: DataManager = None):
+        """
+        Состояние боя на время команды. Журнал изменений записывается в конце блока, при ошибке - отбрасывается
+        (а транзакция команды откатывается). Вложенный блок того же боя использует внешнее состояние.
+        """
+        state = cls._current.get()
+        if battle_id is None or (state is not None and state.battle_id == battle_id):
+            yield state
+            return
+
+        state = cls(battle_id, data_manager).load()
+        token = cls._current.set(state)
+        try:
+            with write_behind(state):
+                yield state
+                state.flush()
+        except BaseException:
+            state.discard()
+            raise
+        finally:
+            cls._current.reset(token)
+
+    @classmethod
+    def command_for_actor(cls, actor_id: int, data_manager: DataManager = None):
+        """``command`` для боя, в котором участвует персонаж (без состояния, если персонаж не в бою)."""
+        row = (data_manager or DEFAULT_MANAGER).fetch_one_or_none('BATTLE_CHARACTERS', f'character_id = {actor_id}',
+                                                                  'battle_id')
+        return cls.command(row.get('battle_id') if row else None, data_manager)
+
+    # Журнал изменений
+
+    def update(self, table: str, key, values: dict) -> bool:
+        """Изменяет строку в памяти и откладывает запись. False - строки нет в состоянии боя."""
+        if not self._table(table).update(key, values):
+            return False
+        self._changes.append((table, key, dict(values)))
+        if table == 'BATTLE_CHARACTERS' and values.keys() & {'initiative', 'is_active'} \
+                and self._scheduler and self._scheduler[0] is self._tables.get(table):
+            row = self._tables[table].get(key)
+            self._scheduler[1].set(key, row.get('initiative'), row.get('is_active'))
+        return True
+
+    def pending_tables(self) -> set[str]:
+        return {table for table, _, _ in self._changes}
+
+    def pending(self) -> dict[str, list[dict]]:
+        """Свёрнутый журнал: по одной строке ``{ключ, изменённые колонки}`` на изменённую строку таблицы."""
+        definitions = self._definitions()
+        merged: dict[tuple[str, Any], dict] = {}
+        for table, key, values in self._changes:
+            merged.setdefault((table, key), {definitions[table].key: key}).update(values)
+
+        rows: dict[str, list[dict]] = {}
+        for (table, _), row in merged.items():
+            rows.setdefault(table, []).append(row)
+        return rows
+
+    def flush(self) -> int:
+        """Записывает журнал одной транзакцией и возвращает число записанных строк."""
+        if not self._changes:
+            return 0
+        rows = self.pending()
+        self._changes = []
+
+        definitions = self._definitions()
+        written = 0
+        with self.data_manager.transaction():
+            for table, table_rows in rows.items():
+                # bulk_update группирует строки по набору колонок
+                written += self.data_manager.bulk_update(table, definitions[table].key, table_rows)
+        for table in rows:
+            self._versions[table] = self.data_manager.row_cache.version(table)
+        self.flushes += 1
+        return written
+
+    def discard(self):
+        self._changes = []
+        self._tables = {}
+        self._scheduler = None
+
+    # Чтение
+
+    def actor(self, actor_id: int) -> dict | None:
+        return self._table('BATTLE_CHARACTERS').get(actor_id)
+
+    def actors(self) -> list[int]:
+        return self._table('BATTLE_CHARACTERS').keys()
+
+    def layer_actors(self, layer_id: int) -> list[int]:
+        return self._table('BATTLE_CHARACTERS').where('layer_id', layer_id)
+
+    def object_actors(self, object_id: int) -> list[int]:
+        return self._table('BATTLE_CHARACTERS').where('object', object_id)
+
+    def team_members(self, team_id: int) -> list[int]:
+        return self._table('BATTLE_CHARACTERS').where('team_id', team_id)
+
+    def dead(self, layer_id: int = None) -> list[int]:
+        table = self._table('BATTLE_DEAD')
+        return table.keys() if layer_id is None else table.where('layer_id', layer_id)
+
+    def dead_team_members(self, team_id: int) -> list[int]:
+        return self._table('BATTLE_DEAD').where('team_id', team_id)
+
+    def layer(self, layer_id: int) -> dict | None:
+        return self._table('BATTLE_LAYERS').get(layer_id)
+
+    def layers(self) -> list[int]:
+        return self._table('BATTLE_LAYERS').keys()
+
+    def team(self, team_id: int) -> dict | None:
+        return self._table('BATTLE_TEAMS').get(team_id)
+
+    def teams(self) -> list[int]:
+        return self._table('BATTLE_TEAMS').keys()
+
+    def game_object(self, object_id: int) -> dict | None:
+        return self._table('BATTLE_OBJECTS').get(object_id)
+
+    def layer_objects(self, layer_id: int) -> list[int]:
+        return self._table('BATTLE_OBJECTS').where('layer_id', layer_id)
+
+    def layer_traps(self, layer_id: int) -> list[int]:
+        return self._table('BATTLE_TRAPS').where('layer_id', layer_id)
+
+    def sounds(self) -> list[int]:
+        return self._table('BATTLE_SOUNDS').keys()
+
+    def status(self, actor_id: int) -> dict | None:
+        return self._table('CHARS_COMBAT').get(actor_id)
+
+    def _status_where(self, column: str, value) -> list[int]:
+        if value is None:
+            return []
+        actors = self._table('BATTLE_CHARACTERS').rows
+        return [actor_id for actor_id in self._table('CHARS_COMBAT').where(column, value) if actor_id in actors]
+
+    def hunters(self, actor_id: int) -> list[int]:
+        return self._status_where('hunted', actor_id)
+
+    def melees(self, actor_id: int) -> list[int]:
+        return self._status_where('melee_target', actor_id)
+
+    def containers(self, layer_id: int) -> list[int]:
+        return self._status_where('contained', layer_id)
+
+    def suppressors(self, object_id: int) -> list[int]:
+        return self._status_where('supressed', object_id)
+
+    def targeters(self, actor_id: int) -> list[int]:
+        return self._status_where('target', actor_id)
+
+    def scheduler(self) -> TurnScheduler:
+        """Очередь ходов; строится заново, если строки участников перечитаны."""
+        table = self._table('BATTLE_CHARACTERS')
+        if self._scheduler is None or self._scheduler[0] is not table:
+            self._scheduler = table, TurnScheduler.from_rows(table.rows.values())
+        return self._scheduler[1]
+
+    def turn_order(self) -> list[int]:
+        """Участники по убыванию инициативы (при равенстве - в порядке строк таблицы, как ``Battlefield.turn_order``)."""
+        return self.scheduler().order()
+
+    def active_actor(self) -> int | None:
+        return next(iter(self._table('BATTLE_CHARACTERS').where('is_active', 1)), None)
+
+    def max_initiative_actor(self) -> int | None:
+        """Ещё не ходивший участник с наибольшей инициативой (как ``Battlefield.max_initiative_actor``)."""
+        return self.scheduler().next_actor()
+
+    # Изменения
+
+    def update_actor(self, actor_id: int, values: dict) -> bool:
+        return self.update('BATTLE_CHARACTERS', actor_id, values)
+
+    def update_status(self, actor_id: int, values: dict) -> bool:
+        return self.update('CHARS_COMBAT', actor_id, values)
+
+    def update_team(self, team_id: int, values: dict) -> bool:
+        return self.update('BATTLE_TEAMS', team_id, values)
+
+    def info(self) -> dict[str, int]:
+        return {'battle_id': self.battle_id, 'loads': self.loads, 'flushes': self.flushes,
+                'pending': len(self._changes), **{table: len(state.rows) for table, state in self._tables.items()}}
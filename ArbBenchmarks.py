@@ -0,0 +1,682 @@
+"""
+Замеры производительности слоя базы данных.
+
+Запуск: ``python ArbBenchmarks.py [название замера ...]``. Все замеры работают со снимком ``Arbiter.db``
+(``create_database(..., snapshot=...)``), поэтому рабочая база не изменяется.
+"""
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from ArbDatabase import Database, DataManager, Logger, QueryBuilder, QueryProfiler, RowCache, connect, create_database
+
+
+DB_NAME = 'Arbiter.db'
+
+
+@contextmanager
+def database_copy(db_name: str = DB_NAME, snapshot: str = 'file', pool_size: int = 4) -> Database:
+    """Создаёт снимок базы данных (во временном файле или в памяти) и удаляет его после замера."""
+    database = create_database(db_name, pool_size=pool_size, snapshot=snapshot)
+    try:
+        yield database
+    finally:
+        database.close()
+
+
+def _timeit(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return time.perf_counter() - start
+
+
+def _report(title: str, results: dict[str, float], iterations: int):
+    print(f'-- {title} ({iterations} итераций)')
+    baseline = next(iter(results.values()))
+    for label, total in results.items():
+        per_call = total / iterations * 1_000_000
+        print(f'   {label:<32} {total:8.4f} с  {per_call:8.2f} мкс/запрос  x{baseline / total:.2f}')
+
+
+def bench_query_builder(iterations: int = 20000):
+    """Сравнивает f-строковые запросы с параметризованными запросами из QueryBuilder."""
+    with database_copy() as database:
+        connection = connect(database.db_name, cached_statements=512)
+        ids = [row[0] for row in connection.execute('SELECT id FROM ITEMS')]
+        builder = QueryBuilder()
+
+        def formatted(i):
+            connection.execute(f'SELECT * FROM ITEMS WHERE id = {ids[i % len(ids)]}').fetchall()
+
+        def parameterized(i):
+            query, params = builder.select('ITEMS', '*', f'id = {ids[i % len(ids)]}')
+            connection.execute(query, params).fetchall()
+
+        def prepared(i):
+            connection.execute('SELECT * FROM ITEMS WHERE id = ?', (ids[i % len(ids)],)).fetchall()
+
+        results = {
+            'f-строка': _timeit(formatted, iterations),
+            'QueryBuilder (строковый фильтр)': _timeit(parameterized, iterations),
+            'готовый запрос с ?': _timeit(prepared, iterations),
+        }
+        connection.close()
+
+    _report('Разбор и планирование запросов', results, iterations)
+    print(f'   {builder.cache_info()["select"]}')
+
+
+def bench_catalog(iterations: int = 20000):
+    """Сравнивает чтение справочных строк через DataManager из базы и из каталога."""
+    with database_copy() as database:
+        catalog = database.catalog
+        catalog.load()
+        without_catalog = database.manager(catalog=None)
+        with_catalog = database.manager(row_cache=RowCache())
+
+        ids = [row['id'] for row in without_catalog.select_dict('INJURY_INIT', 'id')]
+        damage_types = sorted({row['damage_type'] for row in without_catalog.select_dict('INJURY_INIT', 'damage_type')})
+
+        def lookup(manager):
+            def run(i):
+                manager.select_dict('INJURY_INIT', filter=f'id = "{ids[i % len(ids)]}"')
+                manager.select_dict('INJURY_INIT', filter=f'damage_type = "{damage_types[i % len(damage_types)]}"')
+            return run
+
+        results = {
+            'база данных': _timeit(lookup(without_catalog), iterations),
+            'каталог': _timeit(lookup(with_catalog), iterations),
+        }
+        without_catalog.close_connection()
+
+    _report('Справочные таблицы (по ключу и по вторичному индексу)', results, iterations)
+    print(f'   {catalog.info()["lookups"]} запросов обслужено каталогом')
+
+
+def bench_bulk_update(iterations: int = 2000):
+    """Сравнивает обновление строк по одной (update в цикле) с bulk_update и bulk_upsert."""
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        ids = [row['id'] for row in manager.select_dict('ITEMS', 'id')][:iterations]
+        iterations = len(ids)
+
+        def rows(value):
+            return [{'id': item_id, 'endurance': value} for item_id in ids]
+
+        def loop():
+            for row in rows(10):
+                manager.update('ITEMS', {'endurance': row['endurance']}, f'id = {row["id"]}')
+
+        def loop_in_transaction():
+            with manager.transaction():
+                for row in rows(20):
+                    manager.update('ITEMS', {'endurance': row['endurance']}, f'id = {row["id"]}')
+
+        def timed(func):
+            start = time.perf_counter()
+            func()
+            return time.perf_counter() - start
+
+        results = {
+            'update в цикле': timed(loop),
+            'update в цикле, одна транзакция': timed(loop_in_transaction),
+            'bulk_update': timed(lambda: manager.bulk_update('ITEMS', 'id', rows(30))),
+            'bulk_upsert (ON CONFLICT)': timed(lambda: manager.bulk_upsert('ITEMS', 'id', rows(40))),
+        }
+        assert manager.get_count('ITEMS', 'id', 'endurance = 40') >= iterations
+        manager.close_connection()
+
+    _report('Пакетное обновление строк ITEMS', results, iterations)
+
+
+def _peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stream(rows: int = 100_000):
+    """Сравнивает пиковую память и время полного просмотра ITEMS через select_dict и stream на базе из ``rows`` предметов."""
+    with database_copy() as database:
+        with database.writer.transaction() as connection:
+            count, first_id = connection.execute('SELECT COUNT(*), MAX(id) + 1 FROM ITEMS').fetchone()
+            connection.executemany('INSERT INTO ITEMS (id, name, class, type, material, quality, endurance, inventory) '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                   ((first_id + i, f'Предмет {i}', 'Одежда', 'Бронежилет', 'Сталь', 'Нормальное',
+                                     i % 100, i % 500) for i in range(max(rows - count, 0))))
+
+        manager = database.manager(catalog=None)
+
+        variants = {
+            'select_dict': lambda: sum(row['endurance'] for row in manager.select_dict('ITEMS')),
+            'stream, dict': lambda: sum(row['endurance'] for row in manager.stream('ITEMS')),
+            'stream, namedtuple': lambda: sum(row.endurance for row in manager.stream('ITEMS', row_type='namedtuple')),
+            'stream, tuple (одна колонка)': lambda: sum(row[0] for row in manager.stream('ITEMS', 'endurance', row_type='tuple')),
+        }
+        results = {label: _timeit(lambda _: func(), 1) for label, func in variants.items()}
+        memory = {label: _peak_memory(func) for label, func in variants.items()}
+        manager.close_connection()
+
+    _report('Полный просмотр ITEMS', results, rows)
+    for label, peak in memory.items():
+        print(f'   {label:<32} пик памяти {peak / 1024 / 1024:8.2f} МБ')
+
+
+def _retained(func) -> tuple[int, int]:
+    """Память (байт) и число блоков, которые занимает результат ``func``, пока он жив."""
+    gc.collect()
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    result = func()
+    retained = tracemalloc.get_traced_memory()[0], sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def bench_rows(rows: int = 10_000):
+    """Сравнивает списки из ``rows`` строк ITEMS: словари select_dict, namedtuple и слотовые строки select_rows."""
+    with database_copy() as database:
+        with database.writer.transaction() as connection:
+            count, first_id = connection.execute('SELECT COUNT(*), MAX(id) + 1 FROM ITEMS').fetchone()
+            connection.executemany('INSERT INTO ITEMS (id, name, class, type, material, quality, endurance, inventory) '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                   ((first_id + i, f'Предмет {i}', 'Одежда', 'Бронежилет', 'Сталь', 'Нормальное',
+                                     i % 100, i % 500) for i in range(max(rows - count, 0))))
+
+        manager = database.manager(catalog=None)
+        limit = f'id <= (SELECT id FROM ITEMS ORDER BY id LIMIT 1 OFFSET {rows - 1})'
+        variants = {
+            'select_dict': lambda: manager.select_dict('ITEMS', filter=limit),
+            'stream, namedtuple': lambda: list(manager.stream('ITEMS', filter=limit, row_type='namedtuple')),
+            'select_rows': lambda: manager.select_rows('ITEMS', filter=limit),
+        }
+        assert len(variants['select_rows']()) == rows
+        results = {label: _timeit(lambda _: func(), 5) for label, func in variants.items()}
+        memory = {label: _retained(func) for label, func in variants.items()}
+        manager.close_connection()
+
+    _report(f'Список из {rows} строк ITEMS', results, 5)
+    for label, (size, blocks) in memory.items():
+        print(f'   {label:<32} {size / 1024 / 1024:6.2f} МБ  {size / rows:7.1f} байт/строку  '
+              f'{blocks / rows:5.2f} блоков/строку')
+
+
+# Допустимое число запросов при создании модели без прогретого кеша строк (DataModel.load - один запрос на строку)
+MODEL_LOAD_QUERIES = {
+    'Skill': 1,
+    'BodyElement (с имплантом)': 2,
+    'Actor': 1,
+}
+
+
+def model_load_profiles(database: Database) -> dict:
+    """Профили запросов (``QueryProfiler.request``) при создании моделей Skill, BodyElement и Actor."""
+    from ArbBattle import Actor
+    from ArbHealth import BodyElement
+    from ArbSkills import Skill
+
+    database.catalog.load()
+    profiler = QueryProfiler()
+    profiler.enable()
+
+    with database.writer.acquire() as connection:
+        skill = connection.execute('SELECT id, skill_id FROM CHARS_SKILLS LIMIT 1').fetchone()
+        implant = connection.execute('SELECT id, place FROM CHARS_BODY WHERE place IS NOT NULL LIMIT 1').fetchone()
+        actor = connection.execute('SELECT character_id FROM BATTLE_CHARACTERS LIMIT 1').fetchone()
+
+    models = {
+        'Skill': lambda db: Skill(*skill, data_manager=db),
+        'BodyElement (с имплантом)': lambda db: BodyElement(*implant, data_manager=db),
+        'Actor': lambda db: Actor(*actor, data_manager=db),
+    }
+    profiles = {}
+    for label, build in models.items():
+        manager = database.manager(row_cache=RowCache(), profiler=profiler)
+        with profiler.request(label) as profile:
+            build(manager)
+        profiles[label] = profile
+    return profiles
+
+
+def bench_model_load():
+    """
+    Считает запросы к базе при создании моделей Skill, BodyElement и Actor (без прогретого кеша строк) и падает,
+    если их больше, чем в ``MODEL_LOAD_QUERIES``.
+    """
+    with database_copy() as database:
+        profiles = model_load_profiles(database)
+
+    print('-- Запросы при создании модели')
+    for label, profile in profiles.items():
+        print(f'   {label:<32} {len(profile.records)} запр.')
+        for shape in profile.shapes():
+            print(f'      {shape}')
+    for label, profile in profiles.items():
+        assert len(profile.records) <= MODEL_LOAD_QUERIES[label], \
+            f'{label}: {len(profile.records)} запр. вместо {MODEL_LOAD_QUERIES[label]}'
+
+
+# Местность слоёв синтетического боя: открытая, укрытие, возвышенность
+TERRAINS = ('Field', 'Forest', 'Urban', 'Hills', 'Road', 'Ruins')
+
+
+def _insert_battle(manager: DataManager, actors: int = 40) -> int:
+    """Синтетический бой: слои, две команды, ``actors`` персонажей, события и звуки."""
+    battle_id = manager.next_id('BATTLE_INIT', first=1)
+    first_actor = 1_000_000 + battle_id * 1000
+    with manager.transaction():
+        manager.insert('BATTLE_INIT', {'id': battle_id, 'label': 'Замер', 'round': 1})
+        manager.bulk_insert('BATTLE_LAYERS', [{'battle_id': battle_id, 'id': i, 'label': f'Слой {i}',
+                                               'terrain_type': TERRAINS[i % len(TERRAINS)]} for i in range(12)])
+        manager.bulk_insert('BATTLE_TEAMS', [{'battle_id': battle_id, 'team_id': battle_id * 10 + i, 'label': f'Команда {i}'}
+                                             for i in range(2)])
+        manager.bulk_insert('BATTLE_CHARACTERS', [{'character_id': first_actor + i, 'battle_id': battle_id,
+                                                   'layer_id': i % 12, 'team_id': battle_id * 10 + i % 2}
+                                                  for i in range(actors)])
+        events = manager.reserve_ids('BATTLE_EVENTS', 'event_id', actors * 5)
+        manager.bulk_insert('BATTLE_EVENTS', [{'event_id': event_id, 'battle_id': battle_id,
+                                               'actor': first_actor + i % actors} for i, event_id in enumerate(events)])
+        sounds = manager.reserve_ids('BATTLE_SOUNDS', 'id', actors * 5)
+        manager.bulk_insert('BATTLE_SOUNDS', [{'id': sound_id, 'battle_id': battle_id,
+                                               'actor_id': first_actor + i % actors} for i, sound_id in enumerate(sounds)])
+    return battle_id
+
+
+def bench_cascade(iterations: int = 20):
+    """Сравнивает удаление боя из 40 персонажей по таблицам (запрос и коммит на таблицу) с каскадным удалением."""
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+
+        def per_table(battle_id):
+            for table in manager.get_tables_with_column('battle_id'):
+                if 'BATTLE_' in table:
+                    manager.delete(table, f'battle_id = {battle_id}')
+            manager.delete('BATTLE_INIT', filter=f'id = {battle_id}')
+            manager.update('LOC_INIT', {'current_battle': None}, filter=f'current_battle = {battle_id}')
+
+        def timed(delete):
+            total = 0.0
+            for _ in range(iterations):
+                battle_id = _insert_battle(manager)
+                start = time.perf_counter()
+                delete(battle_id)
+                total += time.perf_counter() - start
+                assert not manager.check('BATTLE_CHARACTERS', f'battle_id = {battle_id}')
+            return total
+
+        results = {
+            'по таблицам': timed(per_table),
+            'cascade_delete': timed(lambda battle_id: manager.cascade_delete('battle', battle_id)),
+        }
+        manager.close_connection()
+
+    _report('Удаление боя из 40 персонажей', results, iterations)
+
+
+class _SyncLogger:
+    """Прежняя реализация Logger: открытие файла, запись строки и проверка размера на каждый вызов."""
+
+    def __init__(self, log_file: str, max_size: int = 1024 * 1024 * 5):
+        self.log_file = log_file
+        self.max_size = max_size
+
+    def info(self, message):
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_size:
+            os.rename(self.log_file, f"{self.log_file}.{time.strftime('%Y%m%d-%H%M%S')}")
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [INFO] {message}" + '\n')
+
+
+def bench_logger(iterations: int = 50000):
+    """Сравнивает синхронную запись лога с очередью и фоновой записью."""
+    directory = tempfile.mkdtemp(prefix='arbiter_bench_')
+    try:
+        sync_logger = _SyncLogger(os.path.join(directory, 'sync.log'))
+        queued_logger = Logger(os.path.join(directory, 'queued.log'), queue_size=iterations * 2)
+        sampled_logger = Logger(os.path.join(directory, 'sampled.log'), queue_size=iterations * 2, sampling={'INFO': 0.1})
+
+        def queued_total(logger):
+            def run(i):
+                logger.info(f'Бросок 1d100: {i}')
+            return lambda: _timeit(run, iterations) + _timeit(lambda _: logger.flush(), 1)
+
+        results = {
+            'синхронная запись': _timeit(lambda i: sync_logger.info(f'Бросок 1d100: {i}'), iterations),
+            'очередь (вызов)': _timeit(lambda i: queued_logger.info(f'Бросок 1d100: {i}'), iterations),
+            'очередь (с записью на диск)': queued_total(queued_logger)(),
+            'очередь, выборка 10% INFO': queued_total(sampled_logger)(),
+        }
+        print(f'   {queued_logger.stats()}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    _report('Запись лога', results, iterations)
+
+
+def bench_battle_state(iterations: int = 20):
+    """
+    Сравнивает чтения одной боевой команды (следующий по инициативе, охотники и ближний бой цели, персонажи слоя,
+    смена слоя) запросами по таблицам и через BattleState для боёв из 10, 50 и 200 персонажей.
+    """
+    from ArbBattleState import BattleState
+
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        profiler = QueryProfiler()
+        manager.profiler = profiler
+
+        def by_queries(battle_id, actor_id):
+            actors = [row['character_id'] for row in manager.select_dict('BATTLE_CHARACTERS', filter=f'battle_id = {battle_id}')]
+            rows = [manager.fetch_row('BATTLE_CHARACTERS', f'character_id = {actor}') for actor in actors]
+            max(rows, key=lambda row: row.get('initiative') or 0)
+            # Как StatusManager.get_actor_hunters и get_actor_melee: строка CHARS_COMBAT каждого участника боя
+            for column in ('hunted', 'melee_target'):
+                [actor for actor in actors
+                 if (manager.select_dict('CHARS_COMBAT', filter=f'id = {actor}') or [{}])[0].get(column) == actor_id]
+            manager.select_dict('BATTLE_CHARACTERS', filter=f'layer_id = 3 AND battle_id = {battle_id}')
+            manager.update('BATTLE_CHARACTERS', {'layer_id': 4}, f'character_id = {actor_id}')
+
+        def by_state(battle_id, actor_id):
+            with manager.transaction(), BattleState.command(battle_id, manager) as state:
+                state.max_initiative_actor()
+                state.hunters(actor_id)
+                state.melees(actor_id)
+                state.layer_actors(3)
+                state.update_actor(actor_id, {'layer_id': 4})
+
+        print(f'-- Чтения боевой команды ({iterations} итераций)')
+        for actors in (10, 50, 200):
+            battle_id = _insert_battle(manager, actors)
+            members = manager.select_dict('BATTLE_CHARACTERS', 'character_id', f'battle_id = {battle_id}')
+            manager.bulk_insert('CHARS_COMBAT', [{'id': row['character_id'], 'ap': 0} for row in members])
+            actor_id = members[0]['character_id']
+
+            for label, command in (('запросы по таблицам', by_queries), ('BattleState', by_state)):
+                manager.row_cache.clear()
+                profiler.enable()
+                with profiler.request(label) as profile:
+                    elapsed = _timeit(lambda _: command(battle_id, actor_id), iterations)
+                profiler.disable()
+                print(f'   {actors:>4} перс., {label:<22} {elapsed / iterations * 1000:8.2f} мс/команду  '
+                      f'{len(profile.records) / iterations:6.1f} запр./команду')
+        manager.close_connection()
+
+
+def bench_snapshot(iterations: int = 5000):
+    """Сравнивает чтение строк ITEMS по ключу из файла базы и из её снимка в памяти; замеряет время снятия снимка."""
+    results, load_time = {}, {}
+    for label, snapshot in (('файл', 'file'), ('снимок в памяти', 'memory')):
+        start = time.perf_counter()
+        with database_copy(snapshot=snapshot) as database:
+            load_time[label] = time.perf_counter() - start
+            manager = database.manager(catalog=None)
+            ids = [row['id'] for row in manager.select_dict('ITEMS', 'id')]
+            results[label] = _timeit(lambda i: manager.raw_execute('SELECT * FROM ITEMS WHERE id = ?', (ids[i % len(ids)],)),
+                                     iterations)
+            manager.close_connection()
+
+    _report('Чтение ITEMS по ключу', results, iterations)
+    for label, seconds in load_time.items():
+        print(f'   {label:<32} снимок снят за {seconds * 1000:8.2f} мс')
+
+
+def _visibility_views(actors: int = 60, layers: int = 12):
+    """Синтетический бой для матрицы видимости: ``actors`` персонажей на ``layers`` слоях, часть - в объектах."""
+    from ArbVision import LayerView, ObserverView, TargetView
+
+    layer_views = {i: LayerView(i, (i * 7) % 13, i % 4 == 0, 0.6 + (i % 5) * 0.1) for i in range(layers)}
+    observers, targets = [], []
+    for i in range(actors):
+        layer_id, object_id = i % layers, (i % 6 if i % 3 == 0 else None)
+        observers.append(ObserverView(i, layer_id, object_id, layer_views[layer_id].height + i % 3, 5400 + (i % 7) * 300,
+                                      0.7 + (i % 4) * 0.1, 0.8 + (i % 3) * 0.1, 1 + (i % 5) / 20, 1 + (i % 2) / 10))
+        targets.append(TargetView(i, layer_id, object_id, 20 + (i * 37) % 90))
+    return layer_views, observers, targets
+
+
+def bench_visibility(rounds: int = 50, queries: int = 20):
+    """
+    Сравнивает пересчёт видимости на каждый вызов ``get_visible_characters`` (как без матрицы) с одной матрицей
+    видимости на раунд для боя из 60 персонажей на 12 слоях (``queries`` запросов каждого персонажа за раунд).
+    """
+    from ArbVision import VisibilityMatrix
+
+    layers, observers, targets = _visibility_views()
+    iterations = rounds * queries * len(observers)
+
+    def per_call(i):
+        observer = observers[i % len(observers)]
+        VisibilityMatrix(0, layers, [observer], targets, 50).visible_characters(observer.actor_id)
+
+    matrices = {}
+
+    def per_round(i):
+        matrix = matrices.get(i // (queries * len(observers)))
+        if matrix is None:
+            matrix = matrices[i // (queries * len(observers))] = VisibilityMatrix(0, layers, observers, targets, 50)
+        matrix.visible_characters(observers[i % len(observers)].actor_id)
+
+    matrix = VisibilityMatrix(0, layers, observers, targets, 50)
+    assert all(matrix.visible_characters(observer.actor_id) ==
+               VisibilityMatrix(0, layers, [observer], targets, 50).visible_characters(observer.actor_id)
+               for observer in observers)
+
+    _report(f'Видимость: {len(observers)} перс., {len(layers)} слоёв', {
+        'пересчёт на каждый вызов': _timeit(per_call, iterations),
+        'матрица на раунд': _timeit(per_round, iterations),
+    }, iterations)
+    print(f'   {"видимых пар в матрице":<32} {matrix.info()["pairs"]}')
+
+
+def bench_visibility_queries(iterations: int = 3):
+    """Считает запросы к базе при осмотре всеми персонажами синтетического боя из 60 персонажей на 12 слоях."""
+    from ArbBattle import DEFAULT_STEALTH, DEFAULT_VISIBILITY, Actor, ActorVision
+
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        profiler = QueryProfiler()
+        manager.profiler = profiler
+        battle_id = _insert_battle(manager, 60)
+        actors = manager.select_dict('BATTLE_CHARACTERS', 'character_id', f'battle_id = {battle_id}')
+
+        def look_around(_):
+            for row in actors:
+                ActorVision(Actor(row['character_id'], data_manager=manager)).get_visible_characters()
+
+        def look_around_without_matrix(_):
+            for row in actors:
+                ActorVision(Actor(row['character_id'], data_manager=manager)).compute_visible_characters()
+
+        print(f'-- Осмотр всеми персонажами ({len(actors)} перс., 12 слоёв)')
+        for label, look, runs in (('без матрицы', look_around_without_matrix, 1),
+                                  ('первый расчёт матрицы', look_around, 1),
+                                  ('матрица из кеша', look_around, iterations)):
+            if runs == 1:
+                DEFAULT_VISIBILITY.invalidate(battle_id)
+                DEFAULT_STEALTH.invalidate()
+            profiler.enable()
+            with profiler.request(label) as profile:
+                elapsed = _timeit(look, runs)
+            profiler.disable()
+            print(f'   {label:<32} {elapsed / runs * 1000:8.2f} мс  {len(profile.records) / runs:8.1f} запр.')
+        manager.close_connection()
+
+
+def bench_stealth(actors: int = 20):
+    """
+    Считает запросы к базе при пересчёте матрицы видимости после перемещения персонажа для боя, где на каждом
+    персонаже надето 0, 5 или 20 предметов одежды: без кеша маскировки число запросов растёт с экипировкой.
+    """
+    from ArbBattle import DEFAULT_STEALTH, DEFAULT_VISIBILITY, ActorVision
+
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        profiler = QueryProfiler()
+        manager.profiler = profiler
+        clothes = [row['id'] for row in manager.select_dict('CLOTHES', 'id')]
+
+        print(f'-- Пересчёт матрицы видимости после перемещения ({actors} перс.)')
+        for items in (0, 5, 20):
+            battle_id = _insert_battle(manager, actors)
+            members = [row['character_id'] for row in
+                       manager.select_dict('BATTLE_CHARACTERS', 'character_id', f'battle_id = {battle_id}')]
+            item_ids = manager.reserve_ids('ITEMS', 'id', actors * items)
+            manager.bulk_insert('ITEMS', [{'id': item_id, 'name': 'Замер', 'class': 'Одежда',
+                                           'type': clothes[i % len(clothes)], 'endurance': 100}
+                                          for i, item_id in enumerate(item_ids)])
+            manager.bulk_insert('CHARS_EQUIPMENT', [{'id': members[i % actors], 'item_id': item_id}
+                                                    for i, item_id in enumerate(item_ids)])
+
+            for label, cached in (('без кеша маскировки', False), ('кеш маскировки', True)):
+                DEFAULT_STEALTH.invalidate()
+                ActorVision.build_matrix(battle_id, manager)
+                if not cached:
+                    DEFAULT_STEALTH.invalidate()
+                manager.update('BATTLE_CHARACTERS', {'layer_id': 5}, f'character_id = {members[0]}')
+                DEFAULT_VISIBILITY.invalidate(battle_id)
+
+                profiler.enable()
+                with profiler.request(label) as profile:
+                    start = time.perf_counter()
+                    DEFAULT_VISIBILITY.get(battle_id, manager)
+                    elapsed = time.perf_counter() - start
+                profiler.disable()
+                print(f'   {items:>3} предм./перс., {label:<22} {elapsed * 1000:8.2f} мс  {len(profile.records):6} запр.')
+        manager.close_connection()
+
+
+def reference_turns(rows: dict[int, dict]) -> tuple[list[int], int | None, int]:
+    """Порядок ходов, следующий участник и номер хода так, как их считали методы Battlefield до очереди ходов."""
+    order = sorted(rows, key=lambda actor_id: rows[actor_id].get('initiative') or 0, reverse=True)
+    next_actor, max_initiative = None, 0
+    for actor_id, row in rows.items():
+        initiative = row.get('initiative') or 0
+        if initiative > max_initiative and row.get('is_active') is None:
+            next_actor, max_initiative = actor_id, initiative
+    index = next((index for index, actor_id in enumerate(order) if rows[actor_id].get('is_active')), 0)
+    return order, next_actor, index
+
+
+def bench_turn_scheduler():
+    """
+    Сравнивает время выбора следующего участника перебором (как прежние методы Battlefield) и через TurnScheduler
+    для боёв из 10, 50 и 200 персонажей. Совпадение результатов проверяет ``test_turn_scheduler.py``.
+    """
+    import random
+    from ArbBattleState import TurnScheduler
+
+    generator = random.Random(7)
+    for actors in (10, 50, 200):
+        rows = {actor_id: {'initiative': generator.randint(1, 100), 'is_active': None} for actor_id in range(actors)}
+        scheduler = TurnScheduler((actor_id, row['initiative'], None) for actor_id, row in rows.items())
+
+        def by_scan(i):
+            actor_id = reference_turns(rows)[1] if i % actors else None
+            if actor_id is None:
+                for row in rows.values():
+                    row['is_active'] = None
+            else:
+                rows[actor_id]['is_active'] = 0
+
+        def by_scheduler(i):
+            actor_id = scheduler.next_actor() if i % actors else None
+            if actor_id is None:
+                for key in rows:
+                    scheduler.set(key, is_active=None)
+            else:
+                scheduler.set(actor_id, is_active=0)
+
+        iterations = actors * 50
+        _report(f'Следующий участник, {actors} перс.', {
+            'перебор участников': _timeit(by_scan, iterations),
+            'TurnScheduler': _timeit(by_scheduler, iterations),
+        }, iterations)
+
+
+def bench_round_transition(rounds: int = 3):
+    """
+    Сравнивает переход к следующему раунду по участникам (как ``Battlefield.next_round`` до ``RoundTransition``)
+    и пакетный ``RoundTransition`` для боёв из 10, 50 и 200 персонажей: время и число запросов на раунд. Первый
+    раунд считается отдельно: в нём ``RoundTransition`` заполняет кеш силы персонажей (``DEFAULT_STEALTH``).
+    """
+    from ArbBattle import DEFAULT_STEALTH, ActionPoints, Actor, Battlefield, BattleTeam, RoundTransition
+
+    def per_actor(battle: Battlefield):
+        battle.round += 1
+        battle.data_manager.update('BATTLE_INIT', {'round': battle.round}, f'id = {battle.battle_id}')
+        for actor_id in battle.fetch_actors():
+            actor = Actor(actor_id, data_manager=battle.data_manager)
+            if battle.round % battle.key_round_delay == 0:
+                actor.set_initiative(actor.roll_initiative())
+            ActionPoints.character_ap(actor_id, data_manager=battle.data_manager).new_round_ap()
+            actor.set_active(None)
+        for team_id in battle.fetch_teams():
+            BattleTeam(team_id, data_manager=battle.data_manager).set_activity(True)
+        battle.clear_round_sounds()
+
+    def batched(battle: Battlefield):
+        battle.round = RoundTransition(battle).run().round
+
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        profiler = QueryProfiler()
+        manager.profiler = profiler
+
+        print(f'-- Переход к следующему раунду (первый раунд и ещё {rounds})')
+        for actors in (10, 50, 200):
+            battle_id = _insert_battle(manager, actors)
+            for label, transition in (('по участникам', per_actor), ('RoundTransition', batched)):
+                battle = Battlefield(battle_id, data_manager=manager)
+                manager.row_cache.clear()
+                DEFAULT_STEALTH.invalidate()
+                profiler.enable()
+                with profiler.request(label) as first:
+                    transition(battle)
+                with profiler.request(label) as profile:
+                    elapsed = _timeit(lambda _: transition(battle), rounds)
+                profiler.disable()
+                # Изменение таблицы экипировки, не затрагивающее участников: кеш силы сверяется по отпечаткам
+                manager.bulk_insert('ITEMS', [{'id': manager.reserve_ids('ITEMS', 'id', 1)[0], 'name': 'Замер',
+                                               'class': 'Одежда', 'endurance': 100}])
+                profiler.enable()
+                with profiler.request(label) as changed:
+                    transition(battle)
+                profiler.disable()
+                print(f'   {actors:>4} перс., {label:<22} {elapsed / rounds * 1000:8.2f} мс/раунд  '
+                      f'первый {len(first.records):6} запр., далее {len(profile.records) / rounds:7.1f} запр./раунд, '
+                      f'после изменения ITEMS {len(changed.records):6} запр.')
+        manager.close_connection()
+
+
+BENCHMARKS = {
+    'query_builder': bench_query_builder,
+    'catalog': bench_catalog,
+    'logger': bench_logger,
+    'bulk_update': bench_bulk_update,
+    'stream': bench_stream,
+    'model_load': bench_model_load,
+    'cascade': bench_cascade,
+    'snapshot': bench_snapshot,
+    'rows': bench_rows,
+    'battle_state': bench_battle_state,
+    'visibility': bench_visibility,
+    'visibility_queries': bench_visibility_queries,
+    'stealth': bench_stealth,
+    'turn_scheduler': bench_turn_scheduler,
+    'round_transition': bench_round_transition,
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
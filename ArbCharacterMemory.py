@@ -46,7 +46,7 @@ class MemoryEvent(DataModel):
     def create_memory(character_id:int, event_type:str, desc:str=None, subject_id:int=None, date:str=None, fixed:bool=False):
         db = DataManager()
 
-        event_id = db.maxValue('CHARS_MEMORY', 'event_id') + 1
+        event_id = db.next_id('CHARS_MEMORY', 'event_id')
         query = {
             'id': character_id,
             'event_id': event_id,
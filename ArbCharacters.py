@@ -549,55 +549,7 @@ class Character(DataObject):
             return Character(group.owner_id, data_manager=self.data_manager).org
 
     def delete_character(self):
-        from ArbItems import Inventory
-
-        inv = Inventory.get_inventory_by_character(self.id, data_manager=self.data_manager)
-        self.data_manager.update('ITEMS', {'inventory': None}, filter=f'inventory = {inv.inventory_id}')
-
-        delete_tables = {
-            'BATTLE_CHARACTERS': f'character_id = {self.id}',
-            'BATTLE_DEAD': f'character_id = {self.id}',
-            'BATTLE_EVENTS': f'actor = {self.id}',
-            'BATTLE_SOUNDS': f'actor_id = {self.id}',
-            'CHARS_BODY': f'id = {self.id}',
-            'CHARS_COMBAT': f'id = {self.id}',
-            'CHARS_DISEASE': f'id = {self.id}',
-            'CHARS_EFFECTS': f'id = {self.id}',
-            'CHARS_EQUIPMENT': f'id = {self.id}',
-            'CHARS_INIT': f'id = {self.id}',
-            'CHARS_INJURY': f'id = {self.id}',
-            'CHARS_INV': f'id = {self.id}',
-            'CHARS_LOC': f'id = {self.id}',
-            'CHARS_MEMORY': f'id = {self.id}',
-            'CHARS_PROGRESS': f'id = {self.id}',
-            'CHARS_PSYCHOLOGY': f'id = {self.id}',
-            'CHARS_QUESTS': f'id = {self.id}',
-            'CHARS_RELATIONS': f'id = {self.id} OR subject_id = {self.id}',
-            'CHARS_REPUTATION': f'id = {self.id}',
-            'CHARS_SKILLS': f'id = {self.id}',
-            'CHARS_TRAITS': f'id = {self.id}',
-            'DIALOGUE_MESSAGES': f'character_id = {self.id}',
-            'GROUP_CHARS': f'id = {self.id}',
-            'INVENTORY_INIT': f'owner = {self.id}',
-            'NOTIFICATIONS': f'character_id = {self.id}',
-            'VENDORS_INIT': f'id = {self.id}'
-        }
-        update_tables = {
-            'BATTLEFIELD_TEAMS': [f'commander = {self.id}', {'commander': None}],
-            'CAMPAIGN_INIT': [f'r_rel = {self.id}', {'r_rel': None}],
-            'CHARS_MEMORY': [f'subject_id = {self.id}', {'subject_id': None}],
-            'DIVISION_INIT': [f'commander = {self.id}', {'commander': None}],
-            'GROUP_INIT': [f'owner_id = {self.id}', {'owner_id': None}],
-            'META_INFO': [f'playing_as = {self.id}', {'playing_as': None}],
-            'PLAYERS': [f'character_id = {self.id}', {'character_id': None}]
-        }
-
-        for table, conditions in delete_tables.items():
-            self.data_manager.delete(table, conditions)
-
-        for table, conditions_and_values in update_tables.items():
-            conditions, values = conditions_and_values
-            self.data_manager.update(table, values, conditions)
+        self.data_manager.cascade_delete('character', self.id)
 
     @staticmethod
     def check_owner(character_id:int, data_manager: DataManager = None):
@@ -635,10 +587,9 @@ class Character(DataObject):
     @classmethod
     def get_unused_characters(cls, data_manager: DataManager = None):
         db = data_manager if data_manager else DEFAULT_MANAGER
-        all_characters = [i.get("id") for i in db.select_dict('CHARS_INIT')]
         unused_characters = []
 
-        for i in all_characters:
+        for i, in db.stream('CHARS_INIT', 'id', row_type='tuple'):
             owner = cls.check_owner(i, db)
             user = cls.check_active_user(i, db)
             org_exist = cls.check_org_exist(i, db)
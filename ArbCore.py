@@ -81,7 +81,7 @@ class Review(DataObject):
         rating = kwargs.get('rating', 0)
         reviewer = kwargs.get('reviewer', None)
 
-        review_id = db.maxValue('PLAYERS_REVIEWS', 'id') + 1
+        review_id = db.next_id('PLAYERS_REVIEWS')
 
         db.insert('PLAYERS_REVIEWS', {'id': review_id,
                                       'player': player_id,
@@ -153,7 +153,7 @@ class RPRequest(DataModel):
         planned_timestamp = kwargs.get('planned_timestamp', None)
         status = kwargs.get('status', 'Не рассмотрено')
 
-        request_id = db.maxValue('SERVERS_REQUESTS', 'id') + 1
+        request_id = db.next_id('SERVERS_REQUESTS')
 
         db.insert('SERVERS_REQUESTS', {'id': request_id,
                                        'server': server_id,
@@ -1,40 +1,211 @@
 import asyncio
+import atexit
 import os
+import sys
 import time
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, make_dataclass
+import keyword
 from abc import ABC, abstractmethod
 import pprint
 import random
 import sqlite3
 import datetime
-from queue import Queue
+import itertools
+import shutil
+import tempfile
+from queue import Empty, Full, Queue
 import threading
+import weakref
+from collections import OrderedDict, deque, namedtuple
+from contextvars import ContextVar, copy_context
 import logging
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, Iterator, List, Tuple, Union
 import json
-from tenacity import retry, wait_fixed, stop_after_attempt
-from contextlib import asynccontextmanager, contextmanager
+import re
+from functools import lru_cache, partial, wraps
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+
+class _LogWriter(threading.Thread):
+    """
+    Фоновый поток записи одного лог-файла: забирает записи из очереди пачками, пишет их одним вызовом
+    и ротирует файл по размеру или по времени. Общий для всех ``Logger`` с одним и тем же файлом.
+    """
+
+    _writers: dict[str, '_LogWriter'] = {}
+    _writers_lock = threading.Lock()
+
+    def __init__(self, log_file: str, max_size: int, rotate_interval: float | None, queue_size: int,
+                 batch_size: int, flush_interval: float):
+        super().__init__(name=f'ArbiterLog-{os.path.basename(log_file)}', daemon=True)
+        self.log_file = log_file
+        self.max_size = max_size
+        self.rotate_interval = rotate_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=queue_size)
+        self.dropped: dict[str, int] = {}
+        self.dropped_total = 0
+        self.written = 0
+        self._file = None
+        self._opened_at = 0.0
+
+    @classmethod
+    def for_file(cls, log_file: str, **options) -> '_LogWriter':
+        path = os.path.abspath(log_file)
+        with cls._writers_lock:
+            writer = cls._writers.get(path)
+            if writer is None or not writer.is_alive():
+                writer = cls._writers[path] = cls(log_file, **options)
+                writer.start()
+            return writer
+
+    @classmethod
+    def flush_all(cls, timeout: float = 5):
+        for writer in list(cls._writers.values()):
+            writer.flush(timeout)
+
+    def put(self, record: tuple, block_timeout: float = 0) -> bool:
+        """Ставит запись в очередь; при переполнении запись отбрасывается и учитывается в ``dropped``."""
+        try:
+            if block_timeout:
+                self.queue.put(record, timeout=block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return True
+        except Full:
+            self.dropped[record[1]] = self.dropped.get(record[1], 0) + 1
+            self.dropped_total += 1
+            return False
+
+    def flush(self, timeout: float = 5):
+        """Ждёт, пока все поставленные в очередь записи будут записаны в файл."""
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except Full:
+            return
+        done.wait(timeout)
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.log_file, 'a', encoding='utf-8')
+            self._opened_at = time.time()
+
+    def _rotate_if_needed(self):
+        expired = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if self._file.tell() < self.max_size and not (expired and self._file.tell()):
+            return
+        self._file.close()
+        self._file = None
+        target = f"{self.log_file}.{time.strftime('%Y%m%d-%H%M%S')}"
+        suffix = 1
+        while os.path.exists(target):
+            target = f"{self.log_file}.{time.strftime('%Y%m%d-%H%M%S')}.{suffix}"
+            suffix += 1
+        os.rename(self.log_file, target)
+        self._open()
+
+    @staticmethod
+    def _format(record: tuple) -> str:
+        created, level, message = record
+        return f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))} [{level}] {message}\n"
+
+    def _write(self, records: list[tuple]):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, {}
+            records.append((time.time(), 'WARNING', f'Очередь лога переполнена, пропущено записей: {dropped}'))
+        self._open()
+        self._file.write(''.join(self._format(record) for record in records))
+        self._file.flush()
+        self.written += len(records)
+        self._rotate_if_needed()
+
+    def run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                continue
+
+            records, waiters = [], []
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    records.append(item)
+                if len(records) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    break
+
+            if records:
+                try:
+                    self._write(records)
+                except OSError:
+                    self._file = None
+            for waiter in waiters:
+                waiter.set()
+
+
+atexit.register(_LogWriter.flush_all)
 
 
 class Logger:
-    def __init__(self, log_file='Logs/Arbiter.log', max_size=1024 * 1024 * 5):  # 5 MB
+    """
+    Логгер бота в формате, подходящем для Ideolog. Записи не пишутся в файл в вызывающем потоке, а
+    ставятся в ограниченную очередь; фоновый поток записывает их пачками и ротирует файл по размеру
+    (``max_size``) или по времени (``rotate_interval``, секунды).
+
+    ``sampling`` задаёт долю сохраняемых записей по уровню (например, ``{'DEBUG': 0.1}`` - каждая десятая).
+    При переполнении очереди записи ниже ERROR отбрасываются, ERROR и CRITICAL ждут место в очереди
+    до ``block_timeout`` секунд; количество пропущенных записей попадает в лог.
+    """
+
+    BLOCKING_LEVELS = ('ERROR', 'CRITICAL')
+
+    def __init__(self, log_file='Logs/Arbiter.log', max_size=1024 * 1024 * 5,  # 5 MB
+                 rotate_interval: float | None = 24 * 60 * 60, sampling: dict[str, float] = None,
+                 queue_size: int = 10000, batch_size: int = 500, flush_interval: float = 0.5,
+                 block_timeout: float = 0.5):
         self.log_file = log_file
         self.max_size = max_size
+        self.block_timeout = block_timeout
+        self.sampling = {level: max(0.0, min(1.0, rate)) for level, rate in (sampling or {}).items()}
+        self._sample_counters: dict[str, int] = {}
         # Создаем директорию, если она не существует
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        self._writer = _LogWriter.for_file(log_file, max_size=max_size, rotate_interval=rotate_interval,
+                                           queue_size=queue_size, batch_size=batch_size,
+                                           flush_interval=flush_interval)
 
-    def _rotate_log(self):
-        """Проверяем размер файла и переименовываем, если он превышает максимальный размер."""
-        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_size:
-            timestamp = time.strftime("%Y%m%d-%H%M%S")
-            os.rename(self.log_file, f"{self.log_file}.{timestamp}")
+    def _sampled(self, level: str) -> bool:
+        rate = self.sampling.get(level, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        counter = self._sample_counters.get(level, 0)
+        self._sample_counters[level] = counter + 1
+        return counter % round(1 / rate) == 0
 
     def _log(self, level, message):
-        """Записываем сообщение в лог файл с форматом, подходящим для Ideolog."""
-        self._rotate_log()
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            log_entry = f"{time.strftime('%Y-%m-%d %H:%M:%S')} [{level}] {message}"
-            f.write(log_entry + '\n')
+        """Ставит сообщение в очередь записи."""
+        if not self._sampled(level):
+            return
+        block_timeout = self.block_timeout if level in self.BLOCKING_LEVELS else 0
+        self._writer.put((time.time(), level, message), block_timeout)
+
+    def flush(self, timeout: float = 5):
+        """Дожидается записи всех сообщений, поставленных в очередь."""
+        self._writer.flush(timeout)
+
+    def stats(self) -> dict[str, Any]:
+        return {'queued': self._writer.queue.qsize(), 'written': self._writer.written,
+                'dropped': self._writer.dropped_total}
 
     def debug(self, message):
         """Записываем сообщение уровня DEBUG."""
@@ -57,62 +228,1764 @@ class Logger:
         self._log('CRITICAL', message)
 
 
+class QueryBuilder:
+    """
+    Собирает параметризованные SQL-запросы с плейсхолдерами ``?``.
+
+    Литералы из строковых фильтров (``id = 5 AND name = "abc"``) выносятся в параметры, поэтому
+    запросы к разным персонажам и боям имеют одинаковый текст и переиспользуют подготовленные
+    выражения SQLite. Формы запросов и разобранные фильтры хранятся в LRU-кеше, а все встреченные формы
+    запросов с условием - в ``query_shapes`` (для аудита планов запросов, см. ``ArbMigrations``).
+    """
+
+    _FILTER_LITERAL = re.compile(
+        r"""(?P<op>(?:==|=|!=|<>|<=|>=|<|>|\bLIKE\b)\s*)"""
+        r"""(?P<literal>'(?:[^']|'')*'|"(?:[^"]|"")*"|-?\d+(?:\.\d+)?(?![\w.]))"""
+        r"""|(?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")""",
+        re.IGNORECASE)
+
+    def __init__(self, cache_size: int = 1024):
+        self.cache_size = cache_size
+        self.query_shapes: dict[str, None] = {}
+        self.parse_filter = lru_cache(maxsize=cache_size)(self._parse_filter)
+        self.select_query = lru_cache(maxsize=cache_size)(self._select_query)
+        self.update_query = lru_cache(maxsize=cache_size)(self._update_query)
+        self.insert_query = lru_cache(maxsize=cache_size)(self._insert_query)
+        self.delete_query = lru_cache(maxsize=cache_size)(self._delete_query)
+        self.aggregate_query = lru_cache(maxsize=cache_size)(self._aggregate_query)
+        self.upsert_query = lru_cache(maxsize=cache_size)(self._upsert_query)
+        self.insert_missing_query = lru_cache(maxsize=cache_size)(self._insert_missing_query)
+
+    @staticmethod
+    def _convert_literal(literal: str) -> str | int | float:
+        if literal[0] == "'":
+            return literal[1:-1].replace("''", "'")
+        if literal[0] == '"':
+            return literal[1:-1].replace('""', '"')
+        if '.' in literal:
+            return float(literal)
+        return int(literal)
+
+    def _parse_filter(self, filter: str) -> tuple[str, tuple]:
+        """Заменяет литералы фильтра на ``?`` и возвращает форму фильтра и параметры."""
+        params = []
+
+        def replace(match: re.Match) -> str:
+            if match.group('string') is not None:
+                return match.group('string')
+            params.append(self._convert_literal(match.group('literal')))
+            return f"{match.group('op')}?"
+
+        shape = self._FILTER_LITERAL.sub(replace, filter)
+        return shape, tuple(params)
+
+    def where(self, key: Union[str, 'EID', None]) -> tuple[str, tuple]:
+        """Возвращает параметризованное условие WHERE (без ключевого слова) и его параметры."""
+        if key is None or key == '':
+            return '', ()
+        if isinstance(key, EID):
+            return key.to_params()
+        return self.parse_filter(str(key))
+
+    def _with_where(self, query: str, where: str) -> str:
+        if not where:
+            return query
+        query = f"{query} WHERE {where}"
+        self.query_shapes[query] = None
+        return query
+
+    def _select_query(self, table: str, columns: str, where: str) -> str:
+        return self._with_where(f"SELECT {columns} FROM {table}", where)
+
+    def _update_query(self, table: str, columns: tuple[str, ...], where: str) -> str:
+        set_values = ', '.join(f"{col} = ?" for col in columns)
+        return self._with_where(f"UPDATE {table} SET {set_values}", where)
+
+    def _insert_query(self, table: str, columns: tuple[str, ...]) -> str:
+        column_names = ', '.join(f'"{col}"' for col in columns)
+        placeholders = ', '.join(['?'] * len(columns))
+        return f"INSERT INTO {table} ({column_names}) VALUES ({placeholders})"
+
+    def _upsert_query(self, table: str, columns: tuple[str, ...], key_columns: tuple[str, ...]) -> str:
+        updates = [col for col in columns if col not in key_columns]
+        conflict = ', '.join(f'"{col}"' for col in key_columns)
+        action = f"UPDATE SET {', '.join(f'{col} = excluded.{col}' for col in updates)}" if updates else 'NOTHING'
+        return f"{self._insert_query(table, columns)} ON CONFLICT ({conflict}) DO {action}"
+
+    def _insert_missing_query(self, table: str, columns: tuple[str, ...], key_columns: tuple[str, ...]) -> str:
+        column_names = ', '.join(f'"{col}"' for col in columns)
+        placeholders = ', '.join(['?'] * len(columns))
+        exists = self._with_where(f"SELECT 1 FROM {table}", ' AND '.join(f"{col} = ?" for col in key_columns))
+        return f"INSERT INTO {table} ({column_names}) SELECT {placeholders} WHERE NOT EXISTS ({exists})"
+
+    def _delete_query(self, table: str, where: str) -> str:
+        return self._with_where(f"DELETE FROM {table}", where)
+
+    def _aggregate_query(self, function: str, table: str, parameter: str, where: str) -> str:
+        return self._with_where(f"SELECT {function}({parameter}) FROM {table}", where)
+
+    def select(self, table: str, columns: str = '*', filter: Union[str, 'EID', None] = None) -> tuple[str, tuple]:
+        where, params = self.where(filter)
+        return self.select_query(table, columns, where), params
+
+    def select_in(self, table: str, columns: str, column: str, values: tuple) -> tuple[str, tuple]:
+        """Запрос ``SELECT ... WHERE column IN (?, ?, ...)`` по списку значений."""
+        where = f"{column} IN ({', '.join(['?'] * len(values))})"
+        return self.select_query(table, columns, where), tuple(values)
+
+    def update(self, table: str, values: dict, filter: Union[str, 'EID', None] = None) -> tuple[str, tuple]:
+        values = {col: val for col, val in values.items() if val is None or isinstance(val, (str, int, float))}
+        where, params = self.where(filter)
+        return self.update_query(table, tuple(values.keys()), where), tuple(values.values()) + params
+
+    def insert(self, table: str, values: dict) -> tuple[str, tuple]:
+        return self.insert_query(table, tuple(values.keys())), tuple(values.values())
+
+    @staticmethod
+    def group_rows(rows: list[dict]) -> dict[tuple[str, ...], list[dict]]:
+        """Группирует строки по набору колонок, чтобы каждая группа выполнялась одним ``executemany``."""
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row.keys()), []).append(row)
+        return groups
+
+    def bulk_update(self, table: str, key_columns: tuple[str, ...], rows: list[dict]) -> list[tuple[str, list[tuple]]]:
+        """
+        Запросы ``UPDATE ... WHERE key = ?`` для пакета строк: по запросу и списку параметров на каждый
+        набор обновляемых колонок. Колонки ключа берутся из самих строк и не обновляются.
+        """
+        where = ' AND '.join(f"{col} = ?" for col in key_columns)
+        statements = []
+        for columns, group in self.group_rows(rows).items():
+            values = tuple(col for col in columns if col not in key_columns)
+            if not values:
+                continue
+            query = self.update_query(table, values, where)
+            statements.append((query, [tuple(row[col] for col in values + key_columns) for row in group]))
+        return statements
+
+    def upsert(self, table: str, key_columns: tuple[str, ...], rows: list[dict]) -> list[tuple[str, list[tuple]]]:
+        """Запросы ``INSERT ... ON CONFLICT (key) DO UPDATE`` для пакета строк, сгруппированных по набору колонок."""
+        return [(self.upsert_query(table, columns, key_columns), [tuple(row.values()) for row in group])
+                for columns, group in self.group_rows(rows).items()]
+
+    def insert_missing(self, table: str, key_columns: tuple[str, ...], rows: list[dict]) -> list[tuple[str, list[tuple]]]:
+        """Запросы ``INSERT ... SELECT ... WHERE NOT EXISTS`` - вставка строк, ключа которых ещё нет в таблице."""
+        return [(self.insert_missing_query(table, columns, key_columns),
+                 [tuple(row.values()) + tuple(row[col] for col in key_columns) for row in group])
+                for columns, group in self.group_rows(rows).items()]
+
+    def delete(self, table: str, filter: Union[str, 'EID', None] = None) -> tuple[str, tuple]:
+        where, params = self.where(filter)
+        return self.delete_query(table, where), params
+
+    def aggregate(self, function: str, table: str, parameter: str, filter: Union[str, 'EID', None] = None) -> tuple[str, tuple]:
+        where, params = self.where(filter)
+        return self.aggregate_query(function, table, parameter, where), params
+
+    def cache_info(self) -> dict[str, Any]:
+        """Статистика попаданий в кеш форм запросов."""
+        return {
+            'filters': self.parse_filter.cache_info(),
+            'select': self.select_query.cache_info(),
+            'update': self.update_query.cache_info(),
+            'insert': self.insert_query.cache_info(),
+            'delete': self.delete_query.cache_info(),
+            'aggregate': self.aggregate_query.cache_info(),
+            'upsert': self.upsert_query.cache_info(),
+            'insert_missing': self.insert_missing_query.cache_info(),
+        }
+
+    def clear_cache(self):
+        for cached in (self.parse_filter, self.select_query, self.update_query, self.insert_query,
+                       self.delete_query, self.aggregate_query, self.upsert_query, self.insert_missing_query):
+            cached.cache_clear()
+
+
+@dataclass(frozen=True)
+class ConnectionProfile:
+    """
+    Набор PRAGMA, применяемых к каждому новому соединению.
+
+    WAL позволяет читателям работать параллельно с единственным писателем, ``synchronous=NORMAL``
+    в режиме WAL убирает fsync на каждый коммит (данные остаются целостными при сбое процесса).
+    """
+    journal_mode: str = 'WAL'
+    synchronous: str = 'NORMAL'
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -20000  # в КиБ, если значение отрицательное
+    temp_store: str = 'MEMORY'
+    busy_timeout: int = 10000
+    query_only: bool = False
+
+    def pragmas(self) -> list[str]:
+        pragmas = [
+            f"PRAGMA journal_mode = {self.journal_mode}",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA mmap_size = {int(self.mmap_size)}",
+            f"PRAGMA cache_size = {int(self.cache_size)}",
+            f"PRAGMA temp_store = {self.temp_store}",
+            f"PRAGMA busy_timeout = {int(self.busy_timeout)}",
+        ]
+        if self.query_only:
+            pragmas.append("PRAGMA query_only = 1")
+        return pragmas
+
+    def apply(self, connection: sqlite3.Connection) -> sqlite3.Connection:
+        for pragma in self.pragmas():
+            connection.execute(pragma)
+        return connection
+
+
+DEFAULT_PROFILE = ConnectionProfile()
+READER_PROFILE = ConnectionProfile(query_only=True)
+
+
+def connect(db_name: str, **kwargs) -> sqlite3.Connection:
+    """``sqlite3.connect`` с поддержкой URI-имён (``file:...``), по которым открываются снимки базы в памяти."""
+    return sqlite3.connect(db_name, uri=db_name.startswith('file:'), **kwargs)
+
+
 class ConnectionPool:
-    def __init__(self, max_connections: int, db_name='Arbiter.db', timeout=10):
+    """
+    Пул соединений SQLite с ленивым созданием.
+
+    Соединения открываются только при первом запросе и не больше ``max_connections``. Если все
+    соединения заняты, ``get_connection`` ждёт освобождения до ``checkout_timeout`` секунд.
+    Для потоков исполнителей каждому потоку выдаётся собственное соединение (``thread_connection``),
+    которое возвращается в пул при завершении потока.
+    """
+
+    def __init__(self, max_connections: int, db_name='Arbiter.db', timeout=10, cached_statements=512, checkout_timeout=30,
+                 profile: ConnectionProfile = DEFAULT_PROFILE):
         self.max_connections = max_connections
         self.db_name = db_name
         self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.checkout_timeout = checkout_timeout
+        self.profile = profile
         self.connection_queue = Queue(max_connections)
 
-        for _ in range(max_connections):
-            connection = sqlite3.connect(db_name, timeout=self.timeout, check_same_thread=False)
-            self.connection_queue.put(connection)
-
-    def get_connection(self):
-        if not self.connection_queue.empty():
-            return self.connection_queue.get()
-        else:
-            raise Exception("Нет доступных подключений!")
+        self._lock = threading.Condition()
+        self._connections = set()
+        self._opened = 0
+        self._in_use = 0
+        self._thread_local = threading.local()
+
+        self._checkouts = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = connect(self.db_name, timeout=self.timeout, check_same_thread=False,
+                             cached_statements=self.cached_statements)
+        if self.profile:
+            self.profile.apply(connection)
+        return connection
+
+    def get_connection(self, timeout: float = None) -> sqlite3.Connection:
+        """Выдаёт свободное соединение, при необходимости открывая новое или ожидая освобождения."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        with self._lock:
+            while self.connection_queue.empty() and self._opened >= self.max_connections:
+                remaining = timeout - (time.perf_counter() - started)
+                if remaining <= 0:
+                    raise Exception("Нет доступных подключений!")
+                self._lock.wait(remaining)
+
+            self._in_use += 1
+            self._register_wait(time.perf_counter() - started)
+            if not self.connection_queue.empty():
+                return self.connection_queue.get_nowait()
+            self._opened += 1
+
+        # Новое соединение открываем вне блокировки, место под него уже зарезервировано
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._connections.add(connection)
+        return connection
+
+    def _register_wait(self, waited: float):
+        self._checkouts += 1
+        if waited > 0.001:
+            self._waits += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
 
     def release_connection(self, conn):
-        self.connection_queue.put(conn)
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._in_use -= 1
+            self.connection_queue.put_nowait(conn)
+            self._lock.notify()
+
+    def discard_connection(self, conn):
+        """Убирает из пула соединение, которое больше нельзя использовать (например, закрытое)."""
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._connections.discard(conn)
+            self._opened -= 1
+            self._in_use -= 1
+            holder = getattr(self._thread_local, 'holder', None)
+            if holder is not None and holder.connection is conn:
+                self._thread_local.holder = None
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """Контекстный менеджер: выдаёт соединение и возвращает его в пул по выходу из блока."""
+        conn = self.get_connection(timeout)
+        try:
+            yield conn
+        finally:
+            self.release_connection(conn)
+
+    def thread_connection(self) -> sqlite3.Connection:
+        """Соединение, закреплённое за текущим потоком. Возвращается в пул после завершения потока."""
+        holder = getattr(self._thread_local, 'holder', None)
+        if holder is None:
+            holder = _ThreadConnection(self.get_connection())
+            weakref.finalize(holder, self.release_connection, holder.connection)
+            self._thread_local.holder = holder
+        return holder.connection
+
+    def stats(self) -> dict[str, Any]:
+        """Текущее состояние пула и статистика ожидания выдачи соединений."""
+        with self._lock:
+            return {
+                'max_connections': self.max_connections,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': self.connection_queue.qsize(),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'avg_wait': self._total_wait / self._checkouts if self._checkouts else 0.0,
+                'max_wait': self._max_wait,
+            }
 
     def close_all_connections(self):
-        while not self.connection_queue.empty():
-            conn = self.connection_queue.get()
-            conn.close()
+        with self._lock:
+            while not self.connection_queue.empty():
+                conn = self.connection_queue.get_nowait()
+                self._connections.discard(conn)
+                self._opened -= 1
+                conn.close()
+
+
+class WriterConnection:
+    """
+    Единственное соединение для изменяющих запросов.
+
+    Все записи проходят через него под блокировкой, поэтому писатели не конкурируют за блокировку
+    базы, а читатели из ``ConnectionPool`` в режиме WAL не ждут окончания записи.
+    """
+
+    def __init__(self, db_name='Arbiter.db', timeout=10, cached_statements=512, profile: ConnectionProfile = DEFAULT_PROFILE):
+        self.db_name = db_name
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.profile = profile
+        self._connection = None
+        self._lock = threading.RLock()
+
+        self._owner = None
+        self._depth = 0
+        self._rollback_only = False
+        self._transaction_cursor = None
+        self._after_transaction = []
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    connection = connect(self.db_name, timeout=self.timeout, check_same_thread=False,
+                                         cached_statements=self.cached_statements)
+                    if self.profile:
+                        self.profile.apply(connection)
+                    self._connection = connection
+        return self._connection
+
+    @contextmanager
+    def acquire(self):
+        """Захватывает писателя на время блока и выдаёт его соединение."""
+        self._begin_deferred()
+        with self._lock:
+            yield self.connection
+
+    def in_transaction(self) -> bool:
+        """Открыта ли единица работы в текущем потоке."""
+        return self._owner == threading.get_ident()
+
+    def set_rollback_only(self):
+        """Помечает открытую единицу работы текущего потока на откат (например, после ошибки записи внутри неё)."""
+        if self.in_transaction():
+            self._rollback_only = True
+
+    @property
+    def transaction_cursor(self) -> sqlite3.Cursor | None:
+        """Курсор, через который читает поток-владелец транзакции, чтобы видеть свои незафиксированные изменения."""
+        return self._transaction_cursor if self.in_transaction() else None
+
+    def after_transaction(self, callback):
+        """Вызывает ``callback`` после завершения транзакции текущего потока (или сразу, если её нет)."""
+        if self.in_transaction():
+            self._after_transaction.append(callback)
+        else:
+            callback()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Единица работы: писатель захватывается на весь блок, запросы внутри него не фиксируются по отдельности.
+
+        Внешний блок фиксирует все изменения одним коммитом или откатывает их целиком при ошибке.
+        Вложенные блоки только присоединяются к внешнему; ошибка во вложенном блоке или ошибка записи
+        (``DataManager._write``) приводит к откату всей транзакции, даже если исключение было перехвачено.
+        """
+        self._begin_deferred()
+        with self._lock:
+            connection = self.connection
+            if self._depth == 0:
+                self._owner = threading.get_ident()
+                self._rollback_only = False
+                self._transaction_cursor = connection.cursor()
+            self._depth += 1
+            try:
+                yield connection
+            except BaseException:
+                self._rollback_only = True
+                raise
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        if self._rollback_only:
+                            connection.rollback()
+                        else:
+                            connection.commit()
+                    finally:
+                        self._transaction_cursor.close()
+                        self._transaction_cursor = None
+                        self._owner = None
+                        callbacks, self._after_transaction = self._after_transaction, []
+                        for callback in callbacks:
+                            callback()
+
+    @contextmanager
+    def deferred_transaction(self):
+        """
+        Единица работы, которая захватывает писателя только при первом обращении к нему внутри блока
+        (первой записи): до неё блок только читает и не задерживает записи других потоков. С первой записи
+        и до конца блока действует обычная ``transaction`` - один коммит в конце или откат всего при ошибке.
+        """
+        if self.in_transaction() or getattr(self._local, 'deferred', None) is not None:
+            yield
+            return
+
+        stack = ExitStack()
+        self._local.deferred = stack
+        with stack:
+            try:
+                yield
+            finally:
+                self._local.deferred = None
+
+    def _begin_deferred(self):
+        """Открывает отложенную единицу работы текущего потока (если она есть и ещё не открыта)."""
+        stack = getattr(self._local, 'deferred', None)
+        if stack is not None:
+            self._local.deferred = None
+            stack.enter_context(self.transaction())
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class Snapshot:
+    """
+    Снимок базы данных для тестов, замеров и реплик только для чтения.
+
+    Копия создаётся через backup API SQLite: в памяти (именованная база ``file:...?mode=memory&cache=shared``,
+    общая для всех соединений процесса) или во временном файле (``in_memory=False``). Рабочий файл базы при этом
+    не изменяется. Снимок в памяти живёт, пока открыто удерживающее соединение (до ``close``).
+    ``refresh`` перечитывает источник, ``start_refresh`` делает это периодически в фоновом потоке.
+    """
+
+    _names = itertools.count(1)
+
+    def __init__(self, source: str = 'Arbiter.db', in_memory: bool = True, name: str = None):
+        self.source = source
+        self.in_memory = in_memory
+        name = name or f'arbiter_snapshot_{os.getpid()}_{next(self._names)}'
+        if in_memory:
+            self._directory = None
+            self.db_name = f'file:{name}?mode=memory&cache=shared'
+        else:
+            self._directory = tempfile.mkdtemp(prefix='arbiter_snapshot_')
+            self.db_name = os.path.join(self._directory, os.path.basename(source))
+        self.refreshes = 0
+        self.refreshed_at: float | None = None
+        self._keeper: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> 'Snapshot':
+        """Копирует источник в снимок целиком. Читатели снимка на время копирования ждут."""
+        with self._lock:
+            if self._keeper is None:
+                self._keeper = connect(self.db_name, check_same_thread=False)
+            source = connect(self.source)
+            try:
+                source.backup(self._keeper)
+            finally:
+                source.close()
+            self.refreshes += 1
+            self.refreshed_at = time.time()
+        return self
+
+    def _refresh_loop(self, interval: float, logger: 'Logger' = None):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                if logger is not None:
+                    logger.error(f'Не удалось обновить снимок {self.db_name}: {e}')
+
+    def start_refresh(self, interval: float, logger: 'Logger' = None):
+        """Запускает периодическое обновление снимка раз в ``interval`` секунд."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, args=(interval, logger), daemon=True,
+                                        name=f'ArbiterSnapshot-{self.db_name}')
+        self._thread.start()
+
+    def stop_refresh(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop_refresh()
+        with self._lock:
+            if self._keeper is not None:
+                self._keeper.close()
+                self._keeper = None
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def info(self) -> dict[str, Any]:
+        return {'source': self.source, 'db_name': self.db_name, 'refreshes': self.refreshes,
+                'refreshed_at': self.refreshed_at}
+
+
+class _ThreadConnection:
+    __slots__ = ('connection', '__weakref__')
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+
+@dataclass
+class CacheStats:
+    identity_hits: int = 0
+    cache_hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.identity_hits + self.cache_hits
+
+    def to_dict(self) -> dict[str, int]:
+        return {
+            'identity_hits': self.identity_hits,
+            'cache_hits': self.cache_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+class RowCache:
+    """
+    Кеш строк по ключу ``(таблица, форма условия, параметры)``.
 
+    Состоит из двух уровней:
+    * карта идентичности запроса (``request_scope``) - строки, прочитанные в рамках одной команды
+      текущим потоком; внутри транзакции используется только она, так как в ней видны незафиксированные
+      изменения этого потока;
+    * общий ограниченный LRU-кеш зафиксированных строк.
+
+    Записи через ``DataManager`` сбрасывают затронутые строки: если условие записи и ключ строки
+    состоят только из равенств, сбрасываются лишь совместимые с ним ключи, иначе - вся таблица.
+    Строка, прочитанная до конкурирующей записи, в общий кеш не попадает (проверка версии таблицы).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self.stats = CacheStats()
+        self._rows = OrderedDict()
+        self._table_keys: dict[str, set] = {}
+        self._versions: dict[str, int] = {}
+        self._generation = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _equality_shape(where: str) -> tuple[tuple[str, bool], ...] | None:
+        """Пары (колонка, is NULL) условия вида ``a = ? AND b = ? AND c is NULL`` или None, если условие сложнее."""
+        if not where:
+            return None
+        shape = []
+        for part in re.split(r'\s+AND\s+', where.strip(), flags=re.IGNORECASE):
+            match = re.fullmatch(r'"?(\w+)"?\s*(==?\s*\?|is\s+NULL)', part.strip(), flags=re.IGNORECASE)
+            if not match:
+                return None
+            shape.append((match.group(1).lower(), not match.group(2).startswith('=')))
+        return tuple(shape)
+
+    @classmethod
+    def equality_columns(cls, where: str) -> tuple[str, ...] | None:
+        """Колонки условия вида ``a = ? AND b = ? AND c is NULL`` или None, если условие сложнее."""
+        shape = cls._equality_shape(where)
+        return None if shape is None else tuple(column for column, _ in shape)
+
+    @classmethod
+    def conditions(cls, where: str, params: tuple) -> dict | None:
+        """Условие из равенств в виде ``{колонка: значение}`` (None для ``is NULL``) или None."""
+        shape = cls._equality_shape(where)
+        if shape is None:
+            return None
+        values = iter(params)
+        return {column: (None if is_null else next(values)) for column, is_null in shape}
+
+    @property
+    def _scope(self) -> dict | None:
+        return getattr(self._local, 'scope', None)
+
+    @contextmanager
+    def request_scope(self):
+        """Карта идентичности для одной команды. Вложенные блоки используют внешнюю карту."""
+        if self._scope is not None:
+            yield self._local.scope_stats
+            return
+        self._local.scope = {}
+        self._local.scope_stats = CacheStats()
+        try:
+            yield self._local.scope_stats
+        finally:
+            self._local.scope = None
+
+    def version(self, table: str) -> tuple[int, int]:
+        """Версия таблицы; ``put`` отбрасывает строку, если версия изменилась с момента чтения."""
+        return self._generation, self._versions.get(table, 0)
+
+    def get(self, key: tuple, shared: bool = True) -> tuple[bool, dict | None]:
+        """Возвращает (найдено, строка). Строка None означает, что записи нет в базе."""
+        scope = self._scope
+        scope_stats = self._local.scope_stats if scope is not None else None
+        if scope is not None and key in scope:
+            self.stats.identity_hits += 1
+            scope_stats.identity_hits += 1
+            return True, scope[key]
+
+        if shared:
+            with self._lock:
+                row = self._rows.get(key, self._MISSING)
+                if row is not self._MISSING:
+                    self._rows.move_to_end(key)
+            if row is not self._MISSING:
+                self.stats.cache_hits += 1
+                if scope is not None:
+                    scope_stats.cache_hits += 1
+                    scope[key] = row
+                return True, row
+
+        self.stats.misses += 1
+        if scope_stats is not None:
+            scope_stats.misses += 1
+        return False, None
+
+    def put(self, key: tuple, row: dict | None, version: tuple[int, int], shared: bool = True):
+        scope = self._scope
+        if scope is not None:
+            scope[key] = row
+        if not shared:
+            return
+        table = key[0]
+        with self._lock:
+            if self.version(table) != version:
+                return
+            self._rows[key] = row
+            self._rows.move_to_end(key)
+            self._table_keys.setdefault(table, set()).add(key)
+            while len(self._rows) > self.max_size:
+                old_key, _ = self._rows.popitem(last=False)
+                self._table_keys.get(old_key[0], set()).discard(old_key)
+
+    def peek(self, key: tuple, shared: bool = True) -> tuple[bool, dict | None]:
+        """Как ``get``, но без учёта в статистике и без запроса к базе при промахе."""
+        scope = self._scope
+        if scope is not None and key in scope:
+            return True, scope[key]
+        if shared:
+            with self._lock:
+                row = self._rows.get(key, self._MISSING)
+            if row is not self._MISSING:
+                return True, row
+        return False, None
+
+    @staticmethod
+    def _compatible(first: dict, second: dict) -> bool:
+        """Могут ли условия из равенств выбрать одну и ту же строку."""
+        return all(first[column] == second[column] for column in first.keys() & second.keys())
+
+    def _affected(self, key: tuple, conditions: dict | None, changed: set | None, inserted: dict | None) -> bool:
+        entry = self.conditions(key[1], key[2])
+        if entry is None:
+            return True
+        if inserted is not None:
+            return all(column not in inserted or inserted[column] == value for column, value in entry.items())
+        if conditions is None:
+            return True
+        if changed and entry.keys() & changed:
+            return True
+        return self._compatible(entry, conditions)
+
+    def _drop(self, table: str, conditions: dict | None, changed: set | None, inserted: dict | None):
+        self.stats.invalidations += 1
+        scope = self._scope
+        if scope is not None:
+            self._local.scope_stats.invalidations += 1
+            for key in [key for key in scope if key[0] == table]:
+                if self._affected(key, conditions, changed, inserted):
+                    del scope[key]
+
+        with self._lock:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            keys = self._table_keys.get(table, set())
+            for key in [key for key in keys if self._affected(key, conditions, changed, inserted)]:
+                keys.discard(key)
+                self._rows.pop(key, None)
+
+    def invalidate(self, table: str, where: str = '', params: tuple = (), changed: set | None = None,
+                   writer: 'WriterConnection' = None):
+        """Сбрасывает строки, которые могли измениться после UPDATE/DELETE с условием ``where``."""
+        conditions = self.conditions(where, params)
+        changed = {column.lower() for column in changed} if changed else None
+        self._invalidate(table, writer, conditions, changed, None)
+
+    def invalidate_insert(self, table: str, values: dict, writer: 'WriterConnection' = None):
+        """Сбрасывает строки (в том числе отсутствующие), которые могла затронуть вставка ``values``."""
+        inserted = {column.lower(): value for column, value in values.items()}
+        self._invalidate(table, writer, None, None, inserted)
+
+    def invalidate_table(self, table: str, writer: 'WriterConnection' = None):
+        self._invalidate(table, writer, None, None, None)
+
+    def _invalidate(self, table: str, writer, conditions, changed, inserted):
+        self._drop(table, conditions, changed, inserted)
+        if writer is not None and writer.in_transaction():
+            # Другие потоки могли прочитать старую версию до фиксации - сбрасываем ещё раз после неё
+            writer.after_transaction(lambda: self._drop(table, conditions, changed, inserted))
+
+    def _clear(self):
+        with self._lock:
+            self._generation += 1
+            self._rows.clear()
+            self._table_keys.clear()
+        if self._scope is not None:
+            self._scope.clear()
+
+    def clear(self, writer: 'WriterConnection' = None):
+        """Полностью очищает кеш (например, после произвольного изменяющего запроса)."""
+        self._clear()
+        if writer is not None and writer.in_transaction():
+            writer.after_transaction(self._clear)
+
+    def info(self) -> dict[str, Any]:
+        return {'size': len(self._rows), 'max_size': self.max_size, **self.stats.to_dict()}
+
+
+class CatalogTable:
+    """
+    Неизменяемый снимок справочной таблицы: строки хранятся кортежами, индекс по первичному ключу
+    строится при загрузке, вторичные индексы - при первом поиске по колонке.
+    """
+
+    def __init__(self, name: str, columns: list[str], types: list[str], primary_key: str | None, rows: list[tuple]):
+        self.name = name
+        self.columns = tuple(columns)
+        self.rows = tuple(rows)
+        self.primary_key = primary_key.lower() if primary_key else None
+        self._positions = {column.lower(): index for index, column in enumerate(self.columns)}
+        self._affinities = {column.lower(): self._affinity(column_type) for column, column_type in zip(columns, types)}
+        self._indexes: dict[str, dict] = {}
+        if self.primary_key in self._positions:
+            self.index(self.primary_key)
+
+    @staticmethod
+    def _affinity(column_type: str) -> str:
+        """Родство типа колонки по правилам SQLite."""
+        column_type = (column_type or '').upper()
+        if 'INT' in column_type:
+            return 'INTEGER'
+        if any(name in column_type for name in ('CHAR', 'CLOB', 'TEXT')):
+            return 'TEXT'
+        if not column_type or 'BLOB' in column_type:
+            return 'BLOB'
+        if any(name in column_type for name in ('REAL', 'FLOA', 'DOUB')):
+            return 'REAL'
+        return 'NUMERIC'
+
+    def coerce(self, column: str, value: Any) -> Any:
+        """Приводит значение из условия к родству колонки, как это делает SQLite при сравнении."""
+        affinity = self._affinities.get(column)
+        if value is None or affinity == 'BLOB':
+            return value
+        if affinity == 'TEXT':
+            return str(value) if isinstance(value, (int, float)) else value
+        if isinstance(value, str):
+            try:
+                number = float(value)
+            except ValueError:
+                return value
+            return int(number) if affinity != 'REAL' and number.is_integer() else number
+        return value
+
+    def index(self, column: str) -> dict:
+        """Индекс ``значение -> кортеж строк`` по колонке."""
+        index = self._indexes.get(column)
+        if index is None:
+            position = self._positions[column]
+            groups = {}
+            for row in self.rows:
+                groups.setdefault(row[position], []).append(row)
+            index = {value: tuple(rows) for value, rows in groups.items()}
+            self._indexes[column] = index
+        return index
+
+    def find(self, conditions: dict) -> tuple[tuple, ...] | None:
+        """Строки, удовлетворяющие условию из равенств, или None, если в условии неизвестная колонка."""
+        if any(column not in self._positions for column in conditions):
+            return None
+        if not conditions:
+            return self.rows
+
+        conditions = {column: self.coerce(column, value) for column, value in conditions.items()}
+        column = self.primary_key if self.primary_key in conditions else next(iter(conditions))
+        rows = self.index(column).get(conditions.pop(column), ())
+        for column, value in conditions.items():
+            position = self._positions[column]
+            rows = tuple(row for row in rows if row[position] == value)
+        return rows
+
+    def projection(self, columns: str) -> tuple[tuple[str, ...], tuple[int, ...]] | None:
+        """Имена и позиции колонок для списка ``a, b, c`` или ``*``; None для выражений."""
+        if columns.strip() == '*':
+            return self.columns, tuple(range(len(self.columns)))
+        names = [column.strip().strip('"`[]') for column in columns.split(',')]
+        if not all(name.lower() in self._positions for name in names):
+            return None
+        return tuple(names), tuple(self._positions[name.lower()] for name in names)
+
+
+class Catalog:
+    """
+    Каталог справочных (статических) таблиц игры. Таблица загружается в память целиком при первом
+    обращении или при ``load()`` на старте бота, после чего запросы по равенствам к ней обслуживаются
+    без обращения к базе. Записи в таблицы каталога через ``DataManager`` сбрасывают снимок таблицы,
+    а после правки контента вручную каталог перезагружается командой администратора (``reload``).
+    """
+
+    TABLES = ('WEAPONS', 'WEAPON_DAMAGE', 'AMMO', 'AMMO_DAMAGE', 'DAMAGE_TYPE', 'INJURY_INIT', 'RACES_BODY',
+              'RACES_BODYPART', 'CLOTHES', 'MATERIALS_PROTECTION', 'TERRAIN_TYPE', 'SKILL_INIT', 'CAPACITY_INIT')
+
+    def __init__(self, connection_pool: ConnectionPool, tables: tuple[str, ...] = TABLES):
+        self.connection_pool = connection_pool
+        self.tables = frozenset(tables)
+        self.lookups = 0
+        self._data: dict[str, CatalogTable] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __contains__(self, table: str) -> bool:
+        return table in self.tables
+
+    def _load_table(self, table: str) -> CatalogTable:
+        with self.connection_pool.connection() as connection:
+            info = connection.execute(f"PRAGMA table_info('{table}')").fetchall()
+            rows = connection.execute(f'SELECT * FROM "{table}"').fetchall()
+        primary_key = [column[1] for column in info if column[5]]
+        return CatalogTable(table, [column[1] for column in info], [column[2] for column in info],
+                            primary_key[0] if len(primary_key) == 1 else None, rows)
+
+    def table(self, table: str) -> CatalogTable:
+        """Снимок таблицы; загружается при первом обращении."""
+        data = self._data.get(table)
+        if data is None:
+            with self._lock:
+                data = self._data.get(table)
+                if data is None:
+                    data = self._load_table(table)
+                    self._data[table] = data
+        return data
+
+    def load(self) -> dict[str, int]:
+        """Загружает все таблицы каталога и возвращает количество строк в каждой."""
+        return {table: len(self.table(table).rows) for table in sorted(self.tables)}
+
+    def reload(self, table: str = None) -> dict[str, int]:
+        """Перечитывает из базы одну таблицу или весь каталог (после правки контента)."""
+        tables = [table] if table else sorted(self.tables)
+        snapshots = {name: self._load_table(name) for name in tables}
+        with self._lock:
+            self._data.update(snapshots)
+        return {name: len(snapshot.rows) for name, snapshot in snapshots.items()}
+
+    @property
+    def _pending(self) -> set:
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = set()
+        return pending
+
+    def _drop(self, tables):
+        with self._lock:
+            for table in tables:
+                self._data.pop(table, None)
+
+    def invalidate(self, table: str = None, writer: 'WriterConnection' = None):
+        """
+        Сбрасывает снимок таблицы (или всех таблиц) после записи; он перечитается при следующем обращении.
+        Внутри транзакции записавший поток до её завершения читает эти таблицы из базы.
+        """
+        tables = [table] if table else list(self.tables)
+        tables = [name for name in tables if name in self.tables]
+        if not tables:
+            return
+        self._drop(tables)
+        if writer is not None and writer.in_transaction():
+            pending = self._pending
+            pending.update(tables)
+
+            def finish():
+                pending.difference_update(tables)
+                self._drop(tables)
+
+            writer.after_transaction(finish)
+
+    def select(self, table: str, where: str, params: tuple, columns: str = '*') -> list[dict] | None:
+        """
+        Строки таблицы каталога по условию из равенств в виде словарей.
+        Возвращает None, если каталог не может ответить на запрос и нужно обратиться к базе.
+        """
+        if table not in self.tables or table in self._pending:
+            return None
+        conditions = RowCache.conditions(where, params) if where else {}
+        if conditions is None:
+            return None
+
+        data = self.table(table)
+        rows = data.find(conditions)
+        projection = data.projection(columns)
+        if rows is None or projection is None:
+            return None
+
+        self.lookups += 1
+        names, positions = projection
+        return [{name: row[position] for name, position in zip(names, positions)} for row in rows]
+
+    def info(self) -> dict[str, Any]:
+        return {'tables': {table: len(data.rows) for table, data in sorted(self._data.items())},
+                'lookups': self.lookups}
+
+
+class SchemaRegistry:
+    """
+    Метаданные схемы, прочитанные один раз из ``sqlite_master`` и ``pragma_table_info``: список таблиц,
+    колонки и их типы, а также таблицы по имени колонки (например, все таблицы с колонкой ``battle_id``).
+    Уникальные ключи таблиц (первичный ключ и уникальные индексы) читаются отдельно при первом обращении.
+    Сбрасывается миграциями и изменяющими схему запросами (``invalidate``).
+    """
+
+    def __init__(self, connection_pool: ConnectionPool):
+        self.connection_pool = connection_pool
+        self._snapshot: tuple[list[str], dict[str, tuple[tuple[str, str], ...]], dict[str, tuple[str, ...]]] | None = None
+        self._unique_keys: dict[str, tuple[frozenset[str], ...]] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def _load(self):
+        with self.connection_pool.connection() as connection:
+            objects = connection.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view')").fetchall()
+            columns = {name: tuple(connection.execute('SELECT name, type FROM pragma_table_info(?)', (name,)).fetchall())
+                       for name, _ in objects}
+
+        tables = [name for name, object_type in objects if object_type == 'table']
+        by_column = {}
+        for table in tables:
+            for column, _ in columns[table]:
+                by_column.setdefault(column.lower(), []).append(table)
+        return tables, {name.lower(): info for name, info in columns.items()}, \
+            {column: tuple(names) for column, names in by_column.items()}
+
+    def _get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self._snapshot = self._load()
+        return snapshot
+
+    def _table_info(self, table: str) -> tuple[tuple[str, str], ...]:
+        info = self._get()[1].get(table.lower())
+        if info is None:
+            # Таблица могла появиться после загрузки схемы
+            self.invalidate()
+            info = self._get()[1].get(table.lower())
+        if info is None:
+            raise sqlite3.OperationalError(f'no such table: {table}')
+        return info
+
+    def tables(self) -> list[str]:
+        return list(self._get()[0])
+
+    def columns(self, table: str) -> list[str]:
+        return [column for column, _ in self._table_info(table)]
+
+    def column_types(self, table: str) -> dict[str, str]:
+        return dict(self._table_info(table))
+
+    def tables_with_column(self, column: str) -> list[str]:
+        return list(self._get()[2].get(column.lower(), ()))
+
+    def _load_unique_keys(self, table: str) -> tuple[frozenset[str], ...]:
+        with self.connection_pool.connection() as connection:
+            primary_key = [name for name, pk in connection.execute(
+                'SELECT name, pk FROM pragma_table_info(?) WHERE pk > 0 ORDER BY pk', (table,))]
+            indexes = [name for name, in connection.execute(
+                'SELECT name FROM pragma_index_list(?) WHERE "unique" = 1 AND partial = 0', (table,))]
+            keys = [[name for name, in connection.execute('SELECT name FROM pragma_index_info(?)', (index,))]
+                    for index in indexes]
+        if primary_key:
+            keys.append(primary_key)
+        return tuple(frozenset(column.lower() for column in key) for key in keys if key)
+
+    def unique_keys(self, table: str) -> tuple[frozenset[str], ...]:
+        """Наборы колонок (в нижнем регистре), уникальные в таблице: первичный ключ и уникальные индексы."""
+        keys = self._unique_keys.get(table.lower())
+        if keys is None:
+            self._table_info(table)
+            keys = self._unique_keys[table.lower()] = self._load_unique_keys(table)
+        return keys
+
+    def is_unique(self, table: str, columns) -> bool:
+        """Есть ли у таблицы уникальное ограничение ровно по этим колонкам (нужно для ``ON CONFLICT``)."""
+        return frozenset(column.lower() for column in columns) in self.unique_keys(table)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._unique_keys = {}
+            self.version += 1
+
+
+class Row:
+    """
+    Базовый класс строк, созданных ``RowClasses``: слотовый dataclass с полями по колонкам таблицы.
+
+    Поддерживает чтение как словарь (``row['name']``, ``get``, ``keys``, ``items``, ``in``), поэтому строку
+    можно передать туда, где ожидается результат ``select_dict``. Колонки, имена которых не подходят для
+    атрибутов (например, ``class``), доступны как атрибут с подчёркиванием (``row.class_``) и по имени колонки.
+    """
+    __slots__ = ()
+    _columns: tuple[str, ...] = ()
+    _attributes: dict[str, str] = {}
+
+    @classmethod
+    def _make(cls, values) -> 'Row':
+        return cls(*values)
+
+    def __getitem__(self, column: str):
+        try:
+            return getattr(self, self._attributes[column])
+        except KeyError:
+            raise KeyError(column) from None
+
+    def get(self, column: str, default=None):
+        attribute = self._attributes.get(column)
+        return getattr(self, attribute) if attribute is not None else default
+
+    def __contains__(self, column) -> bool:
+        return column in self._attributes
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def keys(self) -> tuple[str, ...]:
+        return self._columns
+
+    def values(self) -> list:
+        return [getattr(self, attribute) for attribute in self._attributes.values()]
+
+    def items(self) -> list[tuple[str, Any]]:
+        return list(zip(self._columns, self.values()))
+
+    def to_dict(self) -> dict:
+        return dict(zip(self._columns, self.values()))
+
+
+class RowClasses:
+    """
+    Генератор классов строк по реестру схемы: для каждой таблицы (и набора колонок запроса) создаётся
+    слотовый dataclass-наследник ``Row`` с типами полей по объявленным типам колонок. Строка такого класса
+    занимает в несколько раз меньше памяти, чем словарь, и заполняется прямо из курсора (``row_factory``).
+    Классы пересоздаются после изменения схемы.
+    """
+
+    TYPES = (('INT', int), ('CHAR', str), ('CLOB', str), ('TEXT', str), ('JSON', str), ('BLOB', bytes),
+             ('REAL', float), ('FLOA', float), ('DOUB', float))
+
+    def __init__(self, schema: SchemaRegistry):
+        self.schema = schema
+        self._classes: dict[tuple[str, tuple[str, ...]], type[Row]] = {}
+        self._version = schema.version
+        self._lock = threading.Lock()
+
+    @classmethod
+    def python_type(cls, declared_type: str) -> type:
+        """Тип поля по объявленному типу колонки (правила близости типов SQLite)."""
+        declared_type = (declared_type or '').upper()
+        for marker, python_type in cls.TYPES:
+            if marker in declared_type:
+                return python_type
+        return Any
+
+    @staticmethod
+    def attribute_name(column: str) -> str:
+        """Имя поля для колонки: колонки вроде ``class`` или ``keys`` получают подчёркивание в конце."""
+        name = re.sub(r'\W', '_', column).lstrip('_') or 'column'
+        if name[0].isdigit():
+            name = f'c_{name}'
+        if name != column or keyword.iskeyword(name) or hasattr(Row, name):
+            name = f'{name}_'
+        return name
+
+    def _build(self, table: str, columns: tuple[str, ...]) -> type[Row]:
+        try:
+            types = {name.lower(): declared for name, declared in self.schema.column_types(table).items()}
+        except sqlite3.OperationalError:
+            types = {}
+
+        attributes = {}
+        for column in columns:
+            attribute = self.attribute_name(column)
+            while attribute in attributes.values():
+                attribute = f'{attribute}_'
+            attributes[column] = attribute
+
+        fields = [(attributes[column], self.python_type(types.get(column.lower())) | None) for column in columns]
+        row_class = make_dataclass(f'{table.title().replace("_", "")}Row', fields, bases=(Row,), slots=True)
+        row_class._columns = tuple(columns)
+        row_class._attributes = attributes
+        return row_class
+
+    def row_class(self, table: str, columns: tuple[str, ...] = None) -> type[Row]:
+        """Класс строк таблицы: все колонки по схеме или только ``columns`` (в порядке запроса)."""
+        columns = tuple(columns) if columns is not None else tuple(self.schema.columns(table))
+        if self._version != self.schema.version:
+            with self._lock:
+                self._classes = {}
+                self._version = self.schema.version
+
+        key = (table.lower(), columns)
+        row_class = self._classes.get(key)
+        if row_class is None:
+            with self._lock:
+                row_class = self._classes.get(key)
+                if row_class is None:
+                    row_class = self._classes[key] = self._build(table, columns)
+        return row_class
+
+    def row_factory(self, table: str):
+        """``row_factory`` для курсора: создаёт строки класса таблицы по колонкам результата запроса."""
+        cache = {}
+
+        def factory(cursor: sqlite3.Cursor, values: tuple) -> Row:
+            description = cursor.description
+            row_class = cache.get(id(description))
+            if row_class is None:
+                row_class = cache[id(description)] = self.row_class(table, tuple(desc[0] for desc in description))
+            return row_class(*values)
+
+        return factory
+
+    def info(self) -> dict[str, int]:
+        return {'classes': len(self._classes), 'schema_version': self._version}
+
+
+@dataclass
+class CascadeRule:
+    """
+    Правило каскадного удаления корневой записи (боя, персонажа) вместе со ссылающимися на неё строками.
+
+    Ссылающиеся таблицы находятся по схеме: все таблицы с колонками ``columns`` (при заданном ``prefix`` -
+    только с этим префиксом) и таблицы из ``id_tables`` (по префиксу или имени), где ссылкой служит ``id``.
+    ``references`` добавляет ссылки с особыми именами колонок, ``nullify`` - колонки, которые обнуляются
+    вместо удаления строки, ``nested`` - ссылки через промежуточную таблицу:
+    ``таблица: (колонка, промежуточная таблица, колонка-ссылка промежуточной таблицы)``.
+    """
+    table: str
+    key: str = 'id'
+    columns: tuple[str, ...] = ()
+    prefix: str = ''
+    id_tables: tuple[str, ...] = ()
+    references: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    nullify: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    nested: dict[str, tuple[str, str, str]] = field(default_factory=dict)
+
+
+class Cascade:
+    """
+    Каскадное удаление по правилам ``RULES``. План (список запросов) строится по реестру схемы один раз
+    и перестраивается только после изменения схемы; сами запросы выполняются вызывающим кодом в одной
+    транзакции (см. ``DataManager.cascade_delete``). Порядок: ссылки через промежуточные таблицы,
+    обнуление колонок, удаление ссылающихся строк, удаление корневой записи.
+    """
+
+    RULES = {
+        'battle': CascadeRule('BATTLE_INIT', columns=('battle_id',), prefix='BATTLE_',
+                              nullify={'LOC_INIT': ('current_battle',)}),
+        'character': CascadeRule(
+            'CHARS_INIT', columns=('character_id',), id_tables=('CHARS_', 'GROUP_CHARS', 'VENDORS_INIT'),
+            references={'BATTLE_EVENTS': ('actor',), 'BATTLE_SOUNDS': ('actor_id',),
+                        'CHARS_RELATIONS': ('subject_id',), 'CHARS_FAMILIARS': ('encounter',),
+                        'INVENTORY_INIT': ('owner',)},
+            nullify={'BATTLEFIELD_TEAMS': ('commander',), 'BATTLE_TEAMS': ('commander',),
+                     'CAMPAIGN_INIT': ('r_rel',), 'CHARS_MEMORY': ('subject_id',), 'DIVISION_INIT': ('commander',),
+                     'GROUP_INIT': ('owner_id',), 'META_INFO': ('playing_as',), 'PLAYERS': ('character_id',),
+                     'ITEMS': ('inventory',)},
+            nested={'ITEMS': ('inventory', 'INVENTORY_INIT', 'owner')}),
+    }
+
+    def __init__(self, schema: SchemaRegistry, rules: dict[str, CascadeRule] = None):
+        self.schema = schema
+        self.rules = dict(rules or self.RULES)
+        self._plans: dict[str, tuple[int, tuple[tuple[str, str, int], ...]]] = {}
+        self._lock = threading.Lock()
+
+    def _existing(self, table: str, columns) -> tuple[str, ...]:
+        """Колонки таблицы из ``columns`` в написании схемы (таблицы и колонки, которых нет, пропускаются)."""
+        if table.lower() not in {name.lower() for name in self.schema.tables()}:
+            return ()
+        names = {column.lower(): column for column in self.schema.columns(table)}
+        return tuple(names[column.lower()] for column in columns if column.lower() in names)
+
+    def _references(self, rule: CascadeRule) -> dict[str, list[str]]:
+        references: dict[str, list[str]] = {}
+
+        def add(table: str, columns):
+            for column in self._existing(table, columns):
+                if column not in references.setdefault(table, []):
+                    references[table].append(column)
+
+        for column in rule.columns:
+            for table in self.schema.tables_with_column(column):
+                if table.startswith(rule.prefix):
+                    add(table, (column,))
+        for table in self.schema.tables():
+            if any(table == name or (name.endswith('_') and table.startswith(name)) for name in rule.id_tables):
+                add(table, ('id',))
+        for table, columns in rule.references.items():
+            add(table, columns)
+        return references
+
+    def references(self, name: str) -> dict[str, tuple[str, ...]]:
+        """Таблицы, строки которых удаляются вместе с корневой записью, и их колонки-ссылки (без корневой таблицы)."""
+        rule = self.rules[name]
+        references = {}
+        for table, columns in self._references(rule).items():
+            columns = tuple(column for column in columns if column not in rule.nullify.get(table, ()))
+            if columns and table.lower() != rule.table.lower():
+                references[table] = columns
+        return references
+
+    def _build(self, rule: CascadeRule) -> tuple[tuple[str, str, int], ...]:
+        root = rule.table.lower()
+        references = self._references(rule)
+
+        statements = []
+        for table, (column, parent, parent_column) in rule.nested.items():
+            if self._existing(table, (column,)) and self._existing(parent, (parent_column,)):
+                action = f'UPDATE {table} SET {column} = NULL' if column in rule.nullify.get(table, ()) \
+                    else f'DELETE FROM {table}'
+                statements.append((table, f'{action} WHERE {column} IN '
+                                          f'(SELECT id FROM {parent} WHERE {parent_column} = ?)', 1))
+        for table, columns in rule.nullify.items():
+            for column in self._existing(table, columns):
+                if rule.nested.get(table, (None,))[0] == column:
+                    continue
+                statements.append((table, f'UPDATE {table} SET {column} = NULL WHERE {column} = ?', 1))
+        for table, columns in references.items():
+            columns = [column for column in columns if column not in rule.nullify.get(table, ())]
+            if table.lower() == root or not columns:
+                continue
+            statements.append((table, f"DELETE FROM {table} WHERE {' OR '.join(f'{column} = ?' for column in columns)}",
+                               len(columns)))
+        statements.append((rule.table, f'DELETE FROM {rule.table} WHERE {rule.key} = ?', 1))
+        return tuple(statements)
+
+    def plan(self, name: str) -> tuple[tuple[str, str, int], ...]:
+        """Запросы каскадного удаления по правилу ``name``: (таблица, запрос, число параметров-ключей)."""
+        cached = self._plans.get(name)
+        if cached is None or cached[0] != self.schema.version:
+            with self._lock:
+                cached = self._plans[name] = (self.schema.version, self._build(self.rules[name]))
+        return cached[1]
+
+    def statements(self, name: str, key: Any) -> list[tuple[str, str, tuple]]:
+        """(таблица, запрос, параметры) для удаления записи ``key`` по правилу ``name``."""
+        return [(table, query, (key,) * count) for table, query, count in self.plan(name)]
+
+
+@dataclass
+class QueryRecord:
+    shape: str
+    duration: float
+    rows: int | None
+    caller: str
+
+
+@dataclass
+class RequestProfile:
+    """Запросы к базе за время одной команды (или другого запроса к боту)."""
+    name: str
+    started: float = field(default_factory=time.time)
+    records: list[QueryRecord] = field(default_factory=list)
+
+    def shapes(self) -> dict[str, list[QueryRecord]]:
+        shapes = {}
+        for record in self.records:
+            shapes.setdefault(record.shape, []).append(record)
+        return shapes
+
+    def n_plus_one(self, threshold: int) -> list[dict[str, Any]]:
+        """Формы запросов, повторённые в рамках запроса больше ``threshold`` раз."""
+        return [{'shape': shape, 'count': len(records),
+                 'callers': sorted({record.caller for record in records})[:5]}
+                for shape, records in self.shapes().items() if len(records) > threshold]
+
+    def summary(self, threshold: int) -> dict[str, Any]:
+        return {
+            'name': self.name,
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'queries': len(self.records),
+            'time_ms': round(sum(record.duration for record in self.records) * 1000, 3),
+            'rows': sum(record.rows or 0 for record in self.records),
+            'n_plus_one': self.n_plus_one(threshold),
+        }
+
+
+class QueryProfiler:
+    """
+    Профилировщик запросов ``DataManager`` (включается явно через ``enable``). Для каждого запроса
+    сохраняет форму, длительность, число строк и место вызова вне ``ArbDatabase`` и группирует их по
+    активной команде (``request``/``start``). Если одна форма повторяется в команде больше
+    ``n_plus_one_threshold`` раз, это отмечается как N+1 и пишется в лог.
+    """
+
+    OUTSIDE = '<вне команды>'
+
+    def __init__(self, n_plus_one_threshold: int = 10, history: int = 200, logger: Logger = None):
+        self.enabled = False
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.logger = logger
+        self.commands: dict[str, dict[str, Any]] = {}
+        self.recent: deque[dict[str, Any]] = deque(maxlen=history)
+        self._current: ContextVar[RequestProfile | None] = ContextVar('arbiter_request_profile', default=None)
+        self._lock = threading.Lock()
+
+    def enable(self, n_plus_one_threshold: int = None):
+        if n_plus_one_threshold is not None:
+            self.n_plus_one_threshold = n_plus_one_threshold
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.commands.clear()
+            self.recent.clear()
+
+    def start(self, name: str) -> RequestProfile | None:
+        """Начинает профиль команды в текущем контексте (задаче asyncio или потоке)."""
+        if not self.enabled:
+            return None
+        profile = RequestProfile(name)
+        self._current.set(profile)
+        return profile
+
+    def finish(self, profile: RequestProfile = None) -> dict[str, Any] | None:
+        """Завершает профиль команды и добавляет его в отчёт."""
+        profile = profile or self._current.get()
+        if profile is None:
+            return None
+        if self._current.get() is profile:
+            self._current.set(None)
+
+        summary = profile.summary(self.n_plus_one_threshold)
+        with self._lock:
+            self.recent.append(summary)
+            stats = self._command_stats(profile.name)
+            stats['calls'] += 1
+            stats['queries'] += summary['queries']
+            stats['max_queries'] = max(stats['max_queries'], summary['queries'])
+            stats['time_ms'] = round(stats['time_ms'] + summary['time_ms'], 3)
+            for shape, records in profile.shapes().items():
+                stats['shapes'][shape] = stats['shapes'].get(shape, 0) + len(records)
+            for pattern in summary['n_plus_one']:
+                stats['n_plus_one'][pattern['shape']] = max(stats['n_plus_one'].get(pattern['shape'], 0),
+                                                            pattern['count'])
+
+        if summary['n_plus_one'] and self.logger is not None:
+            patterns = ', '.join(f"{pattern['count']}x {pattern['shape']}" for pattern in summary['n_plus_one'])
+            self.logger.warning(f'N+1 в команде {profile.name}: {patterns}')
+        return summary
+
+    @contextmanager
+    def request(self, name: str):
+        profile = self.start(name)
+        try:
+            yield profile
+        finally:
+            if profile is not None:
+                self.finish(profile)
+
+    def _command_stats(self, name: str) -> dict[str, Any]:
+        return self.commands.setdefault(name, {'calls': 0, 'queries': 0, 'max_queries': 0, 'time_ms': 0.0,
+                                               'shapes': {}, 'n_plus_one': {}})
+
+    @staticmethod
+    def _caller() -> str:
+        frame = sys._getframe(2)
+        while frame is not None and frame.f_globals.get('__name__') == __name__:
+            frame = frame.f_back
+        if frame is None:
+            return '?'
+        return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}'
+
+    def record(self, shape: str, duration: float, rows: int | None):
+        if not self.enabled:
+            return
+        record = QueryRecord(shape, duration, rows, self._caller())
+        profile = self._current.get()
+        if profile is not None:
+            profile.records.append(record)
+            return
+        with self._lock:
+            stats = self._command_stats(self.OUTSIDE)
+            stats['queries'] += 1
+            stats['time_ms'] = round(stats['time_ms'] + duration * 1000, 3)
+            stats['shapes'][shape] = stats['shapes'].get(shape, 0) + 1
+
+    def report(self, command: str = None, top: int = 10) -> dict[str, Any]:
+        """Отчёт по командам (или по одной команде): запросы, время, самые частые формы и N+1."""
+        with self._lock:
+            commands = {name: stats for name, stats in self.commands.items() if command is None or name == command}
+            return {
+                name: {**{key: value for key, value in stats.items() if key != 'shapes'},
+                       'avg_queries': round(stats['queries'] / stats['calls'], 1) if stats['calls'] else None,
+                       'top_shapes': sorted(stats['shapes'].items(), key=lambda item: -item[1])[:top]}
+                for name, stats in sorted(commands.items(), key=lambda item: -item[1]['queries'])
+            }
+
+    def dump(self, path: str) -> str:
+        """Сохраняет полный отчёт и последние профили команд в JSON для разбора вне бота."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._lock:
+            data = {'n_plus_one_threshold': self.n_plus_one_threshold, 'commands': self.commands,
+                    'recent': list(self.recent)}
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+
+class IdAllocator:
+    """
+    Выдача идентификаторов новых записей без запроса ``MAX(id)`` на каждую вставку (схема hi/lo).
+
+    Для каждой пары (таблица, колонка) в памяти хранится зарезервированный блок идентификаторов; когда он
+    заканчивается, одной транзакцией резервируется следующий, а верхняя граница выданных значений
+    сохраняется в ``META_ID_BLOCKS``. Новый блок начинается не ниже ``MAX(колонка) + 1``, поэтому записи,
+    добавленные в обход распределителя, не приводят к повторной выдаче занятых значений. Неиспользованный
+    остаток блока при перезапуске бота теряется (в нумерации появляются пропуски).
+    """
+
+    TABLE = 'META_ID_BLOCKS'
+
+    def __init__(self, writer: WriterConnection, block_size: int = 100, schema: 'SchemaRegistry' = None):
+        self.writer = writer
+        self.block_size = block_size
+        self.schema = schema
+        self._blocks: dict[tuple[str, str], list[int]] = {}
+        self._lock = threading.Lock()
+        self._table_ready = False
+
+    def _ensure_table(self, connection: sqlite3.Connection):
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {self.TABLE} '
+                           f'(table_name TEXT, column_name TEXT, next_id INTEGER, PRIMARY KEY (table_name, column_name))')
+        if not self._table_ready and self.schema is not None:
+            self.writer.after_transaction(self.schema.invalidate)
+        self._table_ready = True
+
+    def _reserve_block(self, table: str, column: str, count: int, first: int) -> list[int]:
+        size = max(self.block_size, count)
+        with self.writer.transaction() as connection:
+            self._ensure_table(connection)
+            stored = connection.execute(f'SELECT next_id FROM {self.TABLE} WHERE table_name = ? AND column_name = ?',
+                                        (table, column)).fetchone()
+            current_max = connection.execute(f'SELECT MAX({column}) FROM {table}').fetchone()[0]
+            start = max(stored[0] if stored else first, (current_max if current_max is not None else first - 1) + 1)
+            connection.execute(f'INSERT INTO {self.TABLE} (table_name, column_name, next_id) VALUES (?, ?, ?) '
+                               f'ON CONFLICT (table_name, column_name) DO UPDATE SET next_id = excluded.next_id',
+                               (table, column, start + size))
+        return [start, start + size]
+
+    def reserve(self, table: str, column: str = 'id', count: int = 1, first: int = 0) -> range:
+        """
+        Резервирует ``count`` последовательных идентификаторов и возвращает их диапазон.
+        ``first`` - наименьший идентификатор для пустой таблицы.
+        """
+        key = (table, column)
+        reserved = None
+        while True:
+            with self._lock:
+                block = self._blocks.get(key)
+                if (block is None or block[1] - block[0] < count) and reserved is not None:
+                    block = self._blocks[key] = reserved
+                    reserved = None
+                if block is not None and block[1] - block[0] >= count:
+                    start = block[0]
+                    block[0] += count
+                    return range(start, start + count)
+            # Блок резервируется вне блокировки: транзакция писателя может ждать поток, уже вызвавший reserve
+            reserved = self._reserve_block(table, column, count, first)
+
+    def next_id(self, table: str, column: str = 'id', first: int = 0) -> int:
+        """Следующий свободный идентификатор для колонки ``column`` таблицы ``table``."""
+        return self.reserve(table, column, 1, first).start
+
+    def reset(self, table: str = None):
+        """Забывает зарезервированные в памяти блоки (например, после ручной правки таблицы)."""
+        with self._lock:
+            if table is None:
+                self._blocks.clear()
+            else:
+                for key in [key for key in self._blocks if key[0] == table]:
+                    del self._blocks[key]
+
+    def info(self) -> dict[str, Any]:
+        return {f'{table}.{column}': {'next': block[0], 'reserved_to': block[1]}
+                for (table, column), block in sorted(self._blocks.items())}
+
+
+@dataclass
+class Database:
+    """
+    Связанный набор компонентов доступа к одной базе данных: пул читателей, писатель и всё, что зависит
+    от конкретного файла (кеш строк, каталог, реестр схемы, выдача идентификаторов, каскадное удаление).
+    Создаётся через ``create_database``; ``manager`` выдаёт ``DataManager``, работающий с этой базой.
+    """
+    pool: ConnectionPool
+    writer: WriterConnection
+    row_cache: RowCache
+    catalog: Catalog
+    schema: SchemaRegistry
+    cascade: Cascade
+    profiler: QueryProfiler
+    id_allocator: IdAllocator
+    row_classes: RowClasses
+    logger: Logger
+    snapshot: Snapshot | None = None
 
+    @property
+    def db_name(self) -> str:
+        return self.writer.db_name
+
+    def manager(self, **kwargs) -> 'DataManager':
+        components = {'logger': self.logger, 'writer': self.writer, 'row_cache': self.row_cache, 'catalog': self.catalog,
+                      'schema': self.schema, 'profiler': self.profiler, 'id_allocator': self.id_allocator,
+                      'cascade': self.cascade, 'row_classes': self.row_classes}
+        components.update(kwargs)
+        return DataManager(self.pool, **components)
+
+    def replica(self, refresh_interval: float = None, pool_size: int = 8) -> 'Database':
+        """
+        Реплика только для чтения: снимок этой базы в памяти с отдельным пулом. Записи через неё запрещены
+        (``query_only``), изменения основной базы видны после очередного обновления снимка.
+        """
+        return create_database(self.db_name, pool_size=pool_size, snapshot='memory', read_only=True,
+                               refresh_interval=refresh_interval, logger=self.logger)
+
+    def close(self):
+        self.pool.close_all_connections()
+        self.writer.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
+
+def create_database(db_name: str = 'Arbiter.db', pool_size: int = 64, snapshot: str = None, read_only: bool = False,
+                    refresh_interval: float = None, logger: Logger = None, catalog_tables: tuple[str, ...] = None) -> Database:
+    """
+    Создаёт компоненты доступа к базе ``db_name``. ``snapshot``: None - рабочий файл, 'memory' - копия в памяти,
+    'file' - копия во временном файле; с ``refresh_interval`` снимок периодически перечитывается из ``db_name``.
+    """
+    logger = logger or Logger()
+    source = None
+    if snapshot:
+        source = Snapshot(db_name, in_memory=snapshot == 'memory').refresh()
+        if refresh_interval:
+            source.start_refresh(refresh_interval, logger)
+        db_name = source.db_name
+
+    pool = ConnectionPool(pool_size, db_name=db_name, profile=READER_PROFILE)
+    writer = WriterConnection(db_name=db_name, profile=READER_PROFILE if read_only else DEFAULT_PROFILE)
+    schema = SchemaRegistry(pool)
+    return Database(pool=pool, writer=writer, row_cache=RowCache(),
+                    catalog=Catalog(pool, catalog_tables) if catalog_tables is not None else Catalog(pool),
+                    schema=schema, cascade=Cascade(schema), profiler=QueryProfiler(logger=logger),
+                    id_allocator=IdAllocator(writer, schema=schema), row_classes=RowClasses(schema), logger=logger,
+                    snapshot=source)
+
+
+# ARBITER_DB - путь к базе, ARBITER_DB_SNAPSHOT=memory|file - работать с копией базы (для тестов и замеров)
 DEFAULT_LOGGER = Logger()
-DEFAULT_POOL = ConnectionPool(1000)
+DEFAULT_DATABASE = create_database(os.environ.get('ARBITER_DB', 'Arbiter.db'),
+                                   snapshot=os.environ.get('ARBITER_DB_SNAPSHOT') or None, logger=DEFAULT_LOGGER)
+DEFAULT_POOL = DEFAULT_DATABASE.pool
+DEFAULT_WRITER = DEFAULT_DATABASE.writer
+DEFAULT_QUERY_BUILDER = QueryBuilder()
+DEFAULT_ROW_CACHE = DEFAULT_DATABASE.row_cache
+DEFAULT_CATALOG = DEFAULT_DATABASE.catalog
+DEFAULT_SCHEMA = DEFAULT_DATABASE.schema
+DEFAULT_CASCADE = DEFAULT_DATABASE.cascade
+DEFAULT_PROFILER = DEFAULT_DATABASE.profiler
+DEFAULT_ID_ALLOCATOR = DEFAULT_DATABASE.id_allocator
+DEFAULT_ROW_CLASSES = DEFAULT_DATABASE.row_classes
+
+
+_WRITE_BEHIND: ContextVar[tuple] = ContextVar('arbiter_write_behind', default=())
+
+
+@contextmanager
+def write_behind(buffer):
+    """
+    Регистрирует буфер отложенной записи (например, ``BattleState``) на время блока в текущем контексте.
+
+    Буфер предоставляет ``pending_tables()`` - таблицы с незаписанными изменениями - и ``flush()``. Любой
+    ``DataManager`` перед чтением или записью такой таблицы в обход буфера сначала вызывает ``flush()``,
+    поэтому остальной код видит изменения буфера, а порядок записей сохраняется.
+    """
+    token = _WRITE_BEHIND.set(_WRITE_BEHIND.get() + (buffer,))
+    try:
+        yield buffer
+    finally:
+        _WRITE_BEHIND.reset(token)
 
 
 class DataManager:
-    def __init__(self, connection_pool: ConnectionPool = DEFAULT_POOL, logger: Logger = DEFAULT_LOGGER, idle_timeout=10):
+    IN_BATCH_SIZE = 500
+    STREAM_BATCH_SIZE = 256
+    ROW_TYPES = ('dict', 'tuple', 'namedtuple', 'row')
+
+    def __init__(self, connection_pool: ConnectionPool = DEFAULT_POOL, logger: Logger = DEFAULT_LOGGER, idle_timeout=10,
+                 query_builder: QueryBuilder = DEFAULT_QUERY_BUILDER, writer: WriterConnection = DEFAULT_WRITER,
+                 row_cache: RowCache = DEFAULT_ROW_CACHE, catalog: Catalog = DEFAULT_CATALOG,
+                 schema: SchemaRegistry = DEFAULT_SCHEMA, profiler: QueryProfiler = DEFAULT_PROFILER,
+                 id_allocator: IdAllocator = DEFAULT_ID_ALLOCATOR, cascade: Cascade = DEFAULT_CASCADE,
+                 row_classes: RowClasses = DEFAULT_ROW_CLASSES):
         self.logger = logger or Logger()
         self.connection_pool = connection_pool
-        self.connection = None
-        self.cursor = None
+        self.writer = writer
+        self.row_cache = row_cache
+        self.catalog = catalog
+        self.schema = schema
+        self.profiler = profiler
+        self.id_allocator = id_allocator
+        self.cascade = cascade
+        self.row_classes = row_classes or RowClasses(schema)
+        self.query_builder = query_builder or QueryBuilder()
+        self._local = threading.local()
         self.transaction_started = False
         self.auto_commit = True
         self.idle_timeout = idle_timeout
         self.idle_timer = None
 
+    @property
+    def connection(self) -> sqlite3.Connection | None:
+        """
+        Соединение-читатель текущего потока. Один менеджер может использоваться из нескольких потоков.
+        Внутри ``transaction()`` чтение идёт через писателя, чтобы видеть незафиксированные изменения.
+        """
+        if self.writer.in_transaction():
+            return self.writer.connection
+        return getattr(self._local, 'connection', None)
+
+    @connection.setter
+    def connection(self, value: sqlite3.Connection | None):
+        self._local.connection = value
+
+    @property
+    def cursor(self) -> sqlite3.Cursor | None:
+        return self.writer.transaction_cursor or getattr(self._local, 'cursor', None)
+
+    @cursor.setter
+    def cursor(self, value: sqlite3.Cursor | None):
+        self._local.cursor = value
+
     def open_connection(self):
-        """Открываем соединение, если его нет"""
+        """Открываем соединение, если его нет. Используется соединение, закреплённое за текущим потоком"""
         if not self.connection:
-            self.connection = self.connection_pool.get_connection()
+            self.connection = self.connection_pool.thread_connection()
             self.cursor = self.connection.cursor()
             self.logger.info(f"Соединение с базой данных открыто")
             self._cancel_idle_timer()  # Отменяем таймер закрытия, если он был установлен
 
     def close_connection(self):
         """Закрываем соединение и освобождаем ресурсы"""
-        if self.cursor:
-            self.cursor.close()
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor:
+            cursor.close()
             self.cursor = None
-        if self.connection:
-            self.connection_pool.release_connection(self.connection)
+        if getattr(self._local, 'connection', None):
             self.connection = None
             self.logger.info("Соединение с базой данных закрыто.")
 
@@ -120,6 +1993,8 @@ class DataManager:
         """Проверяем, нужно ли восстановить соединение"""
         if self.connection is None or not self.is_connection_open():
             self.logger.info("Соединение закрыто. Переподключение к базе данных")
+            if self.connection is not None:
+                self.connection_pool.discard_connection(self.connection)
             self.reset_connection()
 
     def _start_idle_timer(self):
@@ -159,149 +2034,239 @@ class DataManager:
         except sqlite3.ProgrammingError:  # Если соединение закрыто, будет выброшено исключение
             return False
 
-    @retry(wait=wait_fixed(2), stop=stop_after_attempt(5), reraise=True)
-    def execute(self, prompt, commit=True) -> None:
-        self.reset_if_needed()
+    @contextmanager
+    def transaction(self, deferred: bool = False):
+        """
+        Единица работы для всей команды: все записи текущего потока внутри блока (через любые
+        ``DataManager``) фиксируются одним коммитом в конце или откатываются целиком при ошибке.
+
+        С ``deferred=True`` писатель захватывается только с первой записи (см. ``WriterConnection.deferred_transaction``):
+        чтения в начале команды не держат блокировку писателя.
+        """
+        unit = self.writer.deferred_transaction() if deferred else self.writer.transaction()
+        with self.row_cache.request_scope(), unit:
+            yield self
+
+    def request_scope(self):
+        """Карта идентичности строк на время одной команды; возвращает её счётчики попаданий и промахов."""
+        return self.row_cache.request_scope()
+
+    @staticmethod
+    def _sync_write_behind(query: str):
+        """Записывает отложенные изменения буферов ``write_behind`` по таблицам, упомянутым в запросе."""
+        for buffer in _WRITE_BEHIND.get():
+            if any(table in query for table in buffer.pending_tables()):
+                buffer.flush()
+
+    def _write(self, query: str, params: tuple | list = (), many: bool = False) -> int:
+        """Выполняет изменяющий запрос через соединение-писатель и возвращает число затронутых строк."""
+        self._sync_write_behind(query)
+        with self.writer.acquire() as connection:
+            in_transaction = self.writer.in_transaction()
+            start = time.perf_counter()
+            try:
+                cursor = connection.executemany(query, params) if many else connection.execute(query, params)
+                if not in_transaction:
+                    connection.commit()
+            except Exception:
+                # Ошибка записи внутри единицы работы откатывает её целиком, даже если вызывающий код её перехватит
+                if in_transaction:
+                    self.writer.set_rollback_only()
+                else:
+                    connection.rollback()
+                raise
+            self.profiler.record(query, time.perf_counter() - start, cursor.rowcount)
+            self.logger.info(f"Запрос успешно выполнен: {query}")
+            return cursor.rowcount
+
+    def _read(self, query: str, params: tuple = (), fetch: str | None = 'all'):
+        """Выполняет читающий запрос через курсор потока (внутри транзакции - через писателя)."""
+        self._sync_write_behind(query)
+        if not self.profiler.enabled:
+            return self._fetch(self.cursor.execute(query, params), fetch)
+
+        start = time.perf_counter()
+        result = self._fetch(self.cursor.execute(query, params), fetch)
+        rows = len(result) if fetch == 'all' else (None if fetch is None else int(result is not None))
+        self.profiler.record(query, time.perf_counter() - start, rows)
+        return result
+
+    @staticmethod
+    def _is_read_query(query: str) -> bool:
+        return query.lstrip().split(None, 1)[0].upper() in ('SELECT', 'PRAGMA', 'EXPLAIN')
+
+    def execute(self, prompt, commit=True, params: tuple = None, fetch: str = None):
+        """
+        Выполняет запрос: с commit=True через писателя, иначе через соединение-читатель потока.
+        Для чтения ``fetch`` ('all' или 'one') сразу возвращает результат. Запрос не повторяется: ожидание
+        занятой базы - ``busy_timeout`` соединения, а повтор посреди транзакции небезопасен (SQLITE_BUSY может
+        откатить её целиком).
+        """
         try:
-            self.cursor.execute(prompt)
             if commit:
-                self.connection.commit()
-                self.logger.info(f"Запрос успешно выполнен: {prompt}")
+                self._write(prompt, params or ())
+            else:
+                self.reset_if_needed()
+                return self._read(prompt, params or (), fetch)
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e):
-                self.logger.warning(f"База данных закрыта. Повторная попытка: {prompt}")
-                time.sleep(1)
-                self.reset_connection()
-                raise e  # попытка снова
+                self.logger.warning(f"База данных занята дольше busy_timeout: {prompt}")
             else:
                 self.logger.critical(f"Ошибка при работе с базой данных: {e}")
-                raise
+            raise
 
     def select(self, table_name, columns='*', filter=None) -> list[tuple]:
+        rows = self._catalog_select(table_name, columns, filter)
+        if rows is not None:
+            return [tuple(row.values()) for row in rows]
+
         with self.managed_connection():
-            query = f"SELECT {columns} FROM {table_name}"
-            if filter:
-                query += f" WHERE {filter}"
-            self.execute(query, commit=False)
-            result = self.cursor.fetchall()
-            return result
+            query, params = self.query_builder.select(table_name, columns, filter)
+            return self.execute(query, commit=False, params=params, fetch='all')
 
     def selectOne(self, table_name, columns='*', filter=None) -> tuple:
+        rows = self._catalog_select(table_name, columns, filter)
+        if rows is not None:
+            return tuple(rows[0].values()) if rows else None
+
         with self.managed_connection():
-            query = f"SELECT {columns} FROM {table_name}"
-            if filter:
-                query += f" WHERE {filter}"
-            self.execute(query, commit=False)
-            result = self.cursor.fetchone()
-            return result
+            query, params = self.query_builder.select(table_name, columns, filter)
+            return self.execute(query, commit=False, params=params, fetch='one')
 
     def insert(self, table_name: str, columns_values: dict) -> None:
-        with self.managed_connection():
-            placeholders = ', '.join(['?'] * len(columns_values))
+        query, values = self.query_builder.insert(table_name, columns_values)
+        self.execute(query, params=values)
+        self.row_cache.invalidate_insert(table_name, columns_values, self.writer)
+        self._invalidate_catalog(table_name)
 
-            column_names = ', '.join(f'"{col}"' for col in columns_values.keys())
+    def update(self, table_name: str, columns_values: dict, filter: str = None) -> None:
+        query, params = self.query_builder.update(table_name, columns_values, filter)
+        self.execute(query, params=params)
+        self._invalidate(table_name, filter, set(columns_values))
 
-            query = f"INSERT INTO {table_name} ({column_names}) VALUES ({placeholders})"
-            values = tuple(columns_values.values())
+    def delete(self, table_name: str, filter: str = None) -> None:
+        query, params = self.query_builder.delete(table_name, filter)
+        self.execute(query, params=params)
+        self._invalidate(table_name, filter)
+
+    def _invalidate(self, table_name: str, filter: Union[str, 'EID', None], changed: set = None):
+        where, params = self.query_builder.where(filter)
+        self.row_cache.invalidate(table_name, where, params, changed, self.writer)
+        self._invalidate_catalog(table_name)
+
+    def _invalidate_catalog(self, table_name: str = None):
+        if self.catalog is not None:
+            self.catalog.invalidate(table_name, self.writer)
+
+    def _catalog_select(self, table_name: str, columns: str, filter: Union[str, 'EID', None]) -> list[dict] | None:
+        """Строки справочной таблицы из каталога или None, если запрос нужно выполнить в базе."""
+        if self.catalog is None or table_name not in self.catalog:
+            return None
+        where, params = self.query_builder.where(filter)
+        return self.catalog.select(table_name, where, params, columns)
 
-            self.cursor.execute(query, values)
-            self.connection.commit()
+    def fetch_row(self, table_name: str, filter: Union[str, 'EID', None]) -> dict | None:
+        """Первая строка по условию (или None) через каталог, карту идентичности и кеш строк."""
+        rows = self._catalog_select(table_name, '*', filter)
+        if rows is not None:
+            return rows[0] if rows else None
 
-    def update(self, table_name: str, columns_values: dict, filter: str = None) -> None:
-        with self.managed_connection():
-            set_values = []
-            for col, val in columns_values.items():
-                if val is None:
-                    set_values.append(f"{col} = NULL")
-                elif isinstance(val, str):
-                    set_values.append(f"{col} = '{val}'")
-                elif isinstance(val, (int, float)):
-                    set_values.append(f"{col} = {val}")
+        self._sync_write_behind(table_name)
+        where, params = self.query_builder.where(filter)
+        key = (table_name, where, params)
+        shared = not self.writer.in_transaction()
 
-            set_values_str = ', '.join(set_values)
+        found, row = self.row_cache.get(key, shared)
+        if found:
+            return dict(row) if row is not None else None
 
-            query = f"UPDATE {table_name} SET {set_values_str}"
+        version = self.row_cache.version(table_name)
+        with self.managed_connection():
+            result = self._read(self.query_builder.select_query(table_name, '*', where), params, 'one')
+            row = dict(zip([desc[0] for desc in self.cursor.description], result)) if result else None
 
-            if filter:
-                query += f" WHERE {filter}"
+        self.row_cache.put(key, row, version, shared)
+        return dict(row) if row is not None else None
 
-            print(query)
+    def fetch_one_or_none(self, table_name: str, filter: Union[str, 'EID', None], columns: str = '*') -> dict | None:
+        """
+        Первая строка по условию или None одним запросом - вместо пары ``check()`` + ``select_dict()[0]``.
+        Полные строки (``columns='*'``) читаются через ``fetch_row`` с каталогом и кешем строк.
+        """
+        if columns == '*':
+            return self.fetch_row(table_name, filter)
 
-            self.cursor.execute(query)
-            self.connection.commit()
+        rows = self._catalog_select(table_name, columns, filter)
+        if rows is not None:
+            return rows[0] if rows else None
 
-    def delete(self, table_name: str, filter: str = None) -> None:
         with self.managed_connection():
-            query = f"DELETE FROM {table_name}"
-            if filter:
-                query += f" WHERE {filter}"
-            self.execute(query)
+            query, params = self.query_builder.select(table_name, columns, filter)
+            result = self._read(query, params, 'one')
+            return dict(zip([desc[0] for desc in self.cursor.description], result)) if result else None
+
+    def peek_row(self, table_name: str, filter: Union[str, 'EID', None]) -> tuple[bool, dict | None]:
+        """Строка из каталога или кеша без обращения к базе: (найдена ли в кеше, строка)."""
+        rows = self._catalog_select(table_name, '*', filter)
+        if rows is not None:
+            return True, rows[0] if rows else None
+
+        self._sync_write_behind(table_name)
+        where, params = self.query_builder.where(filter)
+        return self.row_cache.peek((table_name, where, params), not self.writer.in_transaction())
+
+    def _aggregate(self, function: str, table_name: str, parameter: str, filter: str = None):
+        query, params = self.query_builder.aggregate(function, table_name, parameter, filter)
+        return self._read(query, params, 'one')[0]
 
     def maxValue(self, table_name: str, parameter: str, filter: str = None) -> int | float:
         with self.managed_connection():
-            if filter:
-                query = f'SELECT MAX({parameter}) FROM {table_name} WHERE {filter}'
-            else:
-                query = f'SELECT MAX({parameter}) FROM {table_name}'
-
-            c_output = self.cursor.execute(query).fetchone()[0]
-            self.connection.commit()
+            c_output = self._aggregate('MAX', table_name, parameter, filter)
 
             if c_output is None:
                 return -1
             else:
                 return c_output
 
+    def next_id(self, table_name: str, column: str = 'id', first: int = 0) -> int:
+        """Идентификатор для новой записи (вместо ``maxValue(table_name, column) + 1``)."""
+        return self.id_allocator.next_id(table_name, column, first)
+
+    def reserve_ids(self, table_name: str, column: str = 'id', count: int = 1, first: int = 0) -> range:
+        """Диапазон из ``count`` идентификаторов для пакетной вставки."""
+        return self.id_allocator.reserve(table_name, column, count, first)
+
     def minValue(self, table_name: str, parameter: str, filter: str = None) -> int | float:
         with self.managed_connection():
-            if filter:
-                query = f'SELECT MIN({parameter}) FROM {table_name} WHERE {filter}'
-            else:
-                query = f'SELECT MIN({parameter}) FROM {table_name}'
-
-            c_output = self.cursor.execute(query).fetchone()[0]
-            self.connection.commit()
-            return c_output
+            return self._aggregate('MIN', table_name, parameter, filter)
 
     def avgValue(self, table_name: str, parameter: str, filter: str = None) -> float:
         with self.managed_connection():
-            if filter:
-                query = f'SELECT AVG({parameter}) FROM {table_name} WHERE {filter}'
-            else:
-                query = f'SELECT AVG({parameter}) FROM {table_name}'
-
-            c_output = self.cursor.execute(query).fetchone()[0]
-            self.connection.commit()
-            return c_output
+            return self._aggregate('AVG', table_name, parameter, filter)
 
     def get_count(self, table_name: str, parameter: str, filter: str = None) -> int | float:
         with self.managed_connection():
-            if filter:
-                query = f'SELECT COUNT({parameter}) FROM {table_name} WHERE {filter}'
-            else:
-                query = f'SELECT COUNT({parameter}) FROM {table_name}'
-
-            c_output = self.cursor.execute(query).fetchone()[0]
-            self.connection.commit()
-            return c_output
+            return self._aggregate('COUNT', table_name, parameter, filter)
 
     def check(self, table_name: str, filter: str) -> bool:
-        with self.managed_connection():
-            query = f"SELECT COUNT(*) FROM {table_name} WHERE {filter}"
+        rows = self._catalog_select(table_name, '*', filter)
+        if rows is not None:
+            return True if rows else None
 
-            self.cursor.execute(query)
-            result = self.cursor.fetchone()[0]
+        with self.managed_connection():
+            query, params = self.query_builder.aggregate('COUNT', table_name, '*', filter)
+            result = self._read(query, params, 'one')[0]
 
             return result > 0 if result else None
 
     def select_dict(self, table_name: str, columns='*', filter=None) -> list[dict]:
-        with self.managed_connection():
-            query = f"SELECT {columns} FROM {table_name}"
-            if filter:
-                query += f" WHERE {filter}"
+        rows = self._catalog_select(table_name, columns, filter)
+        if rows is not None:
+            return rows
 
-            self.cursor.execute(query)
-            result = self.cursor.fetchall()
+        with self.managed_connection():
+            query, params = self.query_builder.select(table_name, columns, filter)
+            result = self._read(query, params)
 
             columns = [desc[0] for desc in self.cursor.description]
 
@@ -315,52 +2280,142 @@ class DataManager:
 
             return typed_result
 
-    def get_all_tables(self) -> list:
-        with self.managed_connection():
-            # Получение списка всех таблиц из базы данных
-            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [table[0] for table in self.cursor.fetchall()]
+    def select_rows(self, table_name: str, columns='*', filter=None) -> list[Row]:
+        """Как ``select_dict``, но строки - слотовые объекты ``RowClasses`` (меньше памяти и выделений на строку)."""
+        return list(self.stream(table_name, columns, filter, row_type='row'))
+
+    def select_in(self, table_name: str, column: str, values: list, columns: str = '*') -> list[dict]:
+        """
+        Строки, у которых ``column`` равна одному из ``values``. Для таблиц каталога запрос в базу не выполняется,
+        иначе значения передаются пачками по ``IN_BATCH_SIZE`` в ``WHERE column IN (...)``.
+        """
+        values = list(dict.fromkeys(value for value in values if value is not None))
+        if not values:
+            return []
 
-            return tables
+        if self.catalog is not None and table_name in self.catalog:
+            rows = [self._catalog_select(table_name, columns, EID(**{column: value})) for value in values]
+            if all(part is not None for part in rows):
+                return [row for part in rows for row in part]
 
-    def get_tables_with_prefix(self, prefix:str) -> list:
+        result = []
         with self.managed_connection():
-            c_tables = self.get_all_tables()
-            total = [table for table in c_tables if prefix in table]
-            return total
+            for start in range(0, len(values), self.IN_BATCH_SIZE):
+                query, params = self.query_builder.select_in(table_name, columns, column,
+                                                             tuple(values[start:start + self.IN_BATCH_SIZE]))
+                rows = self._read(query, params)
+                names = [desc[0] for desc in self.cursor.description]
+                result.extend(dict(zip(names, row)) for row in rows)
+        return result
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _row_tuple(table_name: str, columns: tuple[str, ...]) -> type:
+        return namedtuple(f'{table_name.title().replace("_", "")}Row', columns, rename=True)
+
+    def _row_factory(self, table_name: str, columns: tuple[str, ...], row_type: str):
+        if row_type == 'tuple':
+            return None
+        if row_type == 'namedtuple':
+            return self._row_tuple(table_name, columns)._make
+        if row_type == 'row':
+            return self.row_classes.row_class(table_name, columns)._make
+        return lambda row: dict(zip(columns, row))
+
+    def stream(self, table_name: str, columns: str = '*', filter=None, batch_size: int = None,
+               row_type: str = 'dict') -> Iterator[dict | tuple]:
+        """
+        Генератор строк таблицы: читает результат пачками по ``batch_size`` через ``fetchmany`` на отдельном
+        курсоре, поэтому полный просмотр больших таблиц (``ITEMS``, ``CHARS_INIT``, ``LOC_INIT``) не собирает
+        все строки в памяти. ``row_type``: 'dict' (как в ``select_dict``), 'tuple', 'namedtuple' или 'row'
+        (слотовые строки ``RowClasses``, создаются прямо в курсоре).
+
+        Внутри цикла по строкам можно выполнять другие запросы. Курсор закрывается, когда генератор исчерпан
+        или закрыт (выход из цикла по ``break``).
+        """
+        if row_type not in self.ROW_TYPES:
+            raise ValueError(f'Неизвестный тип строк: {row_type} (ожидается один из {self.ROW_TYPES})')
+        batch_size = batch_size or self.STREAM_BATCH_SIZE
+
+        rows = self._catalog_select(table_name, columns, filter)
+        if rows is not None:
+            if row_type == 'dict':
+                yield from rows
+            else:
+                factory = self._row_factory(table_name, tuple(rows[0]) if rows else (), row_type)
+                values = (tuple(row.values()) for row in rows)
+                yield from (values if factory is None else map(factory, values))
+            return
 
-    def delete_from_all_tables(self, filters: dict, tables:list=None) -> None:
+        query, params = self.query_builder.select(table_name, columns, filter)
+        self._sync_write_behind(query)
         with self.managed_connection():
-            if not tables:
-                tables = self.get_all_tables()
+            cursor = self.connection.cursor()
 
-            for table_name in tables:
-                # Generating filter conditions for deleting records in a specific table
-                where_clauses = []
-                for column, value in filters.items():
-                    # Check if the value is numeric
-                    if str(value).replace(".", "", 1).isdigit():  # Check if the value is numeric (int or float)
-                        value_formatted = int(value) if value.is_integer() else float(value)
-                    else:
-                        value_formatted = f"'{value}'"
+        # В профилировщик попадает только время чтения из базы, без обработки строк вызывающим кодом
+        elapsed, count = 0.0, 0
+        try:
+            start = time.perf_counter()
+            if row_type == 'row':
+                cursor.row_factory = self.row_classes.row_factory(table_name)
+            cursor.execute(query, params)
+            factory = None if row_type == 'row' else \
+                self._row_factory(table_name, tuple(desc[0] for desc in cursor.description), row_type)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                elapsed += time.perf_counter() - start
+                if not batch:
+                    break
+                count += len(batch)
+                if factory is None:
+                    yield from batch
+                else:
+                    yield from map(factory, batch)
+                start = time.perf_counter()
+        finally:
+            cursor.close()
+            self.profiler.record(query, elapsed, count)
 
-                    where_clauses.append(f"{column} = {value_formatted}")
+    def get_all_tables(self) -> list:
+        return self.schema.tables()
 
-                where_clause = ' AND '.join(where_clauses)
+    def get_tables_with_prefix(self, prefix:str) -> list:
+        return [table for table in self.schema.tables() if prefix in table]
 
-                # Construct and execute the delete query
-                delete_query = f"DELETE FROM {table_name}"
-                if where_clause:
-                    delete_query += f" WHERE {where_clause}"
+    def get_tables_with_column(self, column: str) -> list[str]:
+        """Все таблицы, в которых есть колонка ``column`` (без учёта регистра)."""
+        return self.schema.tables_with_column(column)
 
-                self.cursor.execute(delete_query)
-                self.connection.commit()
+    def delete_from_all_tables(self, filters: dict, tables:list=None) -> None:
+        """Удаляет строки по ``filters`` одной транзакцией из ``tables`` или из всех таблиц, где есть эти колонки."""
+        if not tables:
+            tables = self.get_all_tables()
+            for column in filters or {}:
+                tables = [table for table in self.get_tables_with_column(column) if table in tables]
+
+        key = EID(**filters) if filters else None
+        with self.writer.transaction():
+            for table_name in tables:
+                self._write(*self.query_builder.delete(table_name, key))
+        for table_name in tables:
+            self._invalidate(table_name, key)
+
+    def cascade_delete(self, rule: str, key: Any) -> dict[str, int]:
+        """
+        Удаляет корневую запись (``'battle'``, ``'character'`` - см. ``Cascade.RULES``) и все ссылающиеся на неё
+        строки одной транзакцией. Возвращает число удалённых или изменённых строк по таблицам.
+        """
+        affected = {}
+        with self.writer.transaction():
+            for table_name, query, params in self.cascade.statements(rule, key):
+                affected[table_name] = affected.get(table_name, 0) + self._write(query, params)
+        for table_name in affected:
+            self.row_cache.invalidate_table(table_name, self.writer)
+            self._invalidate_catalog(table_name)
+        return affected
 
     def get_all_columns(self, table_name:str) -> list[str]:
-        with self.managed_connection():
-            self.cursor.execute(f'SELECT * FROM {table_name} LIMIT 0')
-            column_names = [desc[0] for desc in self.cursor.description]
-            return column_names
+        return self.schema.columns(table_name)
 
     def get_columns_desc(self, table_name:str):
         with self.managed_connection():
@@ -370,55 +2425,112 @@ class DataManager:
             return column_desc
 
     def get_columns_types(self, table_name:str) -> dict[str]:
-        with self.managed_connection():
-            column_types = {}
-            self.cursor.execute(f"SELECT name, type FROM pragma_table_info('{table_name}')")
-            for row in self.cursor.fetchall():
-                column_types[row[0]] = row[1]
-            return column_types
+        return self.schema.column_types(table_name)
 
     def bulk_insert(self, table_name: str, columns_values_list: list[dict]):
-        with self.managed_connection():
-            if not columns_values_list:
-                return
-
-            columns_str = ', '.join(columns_values_list[0].keys())
-            placeholders = ', '.join(['?'] * len(columns_values_list[0]))
-            values_list = [tuple(item.values()) for item in columns_values_list]
-
-            query = f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
-
-            self.cursor.executemany(query, values_list)
-            self.connection.commit()
+        if not columns_values_list:
+            return
+
+        query, _ = self.query_builder.insert(table_name, columns_values_list[0])
+        values_list = [tuple(item.values()) for item in columns_values_list]
+
+        self._write(query, values_list, many=True)
+        self.row_cache.invalidate_table(table_name, self.writer)
+        self._invalidate_catalog(table_name)
+
+    @staticmethod
+    def _key_columns(key_columns: str | list[str] | tuple[str, ...]) -> tuple[str, ...]:
+        return (key_columns,) if isinstance(key_columns, str) else tuple(key_columns)
+
+    def bulk_update(self, table_name: str, key_columns: str | list[str], rows: list[dict]) -> int:
+        """
+        Обновляет пакет строк одной транзакцией через ``executemany``. Каждая строка - словарь с колонками ключа
+        (``key_columns``) и новыми значениями остальных колонок; строки с разным набором колонок выполняются
+        отдельными запросами. Возвращает число изменённых строк.
+
+        ``bulk_update('CHARS_COMBAT', 'id', [{'id': 1, 'ap': 5}, {'id': 2, 'ap': 3}])``
+        """
+        if not rows:
+            return 0
+
+        key_columns = self._key_columns(key_columns)
+        with self.writer.transaction():
+            affected = sum(self._write(query, params, many=True)
+                           for query, params in self.query_builder.bulk_update(table_name, key_columns, rows))
+        self.row_cache.invalidate_table(table_name, self.writer)
+        self._invalidate_catalog(table_name)
+        return affected
+
+    def bulk_upsert(self, table_name: str, key_columns: str | list[str], rows: list[dict]) -> int:
+        """
+        Вставляет строки пакета, а для уже существующих ключей обновляет остальные колонки, одной транзакцией.
+
+        Если по ``key_columns`` в таблице есть первичный ключ или уникальный индекс, используется
+        ``INSERT ... ON CONFLICT DO UPDATE``; иначе - вставка отсутствующих ключей (``WHERE NOT EXISTS``)
+        и обновление всех строк пакета. Возвращает число вставленных и обновлённых строк.
+        """
+        if not rows:
+            return 0
+
+        key_columns = self._key_columns(key_columns)
+        with self.writer.transaction():
+            if self.schema.is_unique(table_name, key_columns):
+                affected = sum(self._write(query, params, many=True)
+                               for query, params in self.query_builder.upsert(table_name, key_columns, rows))
+            else:
+                affected = 0
+                for group in self.query_builder.group_rows(rows).values():
+                    inserted = sum(self._write(query, params, many=True)
+                                   for query, params in self.query_builder.insert_missing(table_name, key_columns, group))
+                    updated = [self._write(query, params, many=True)
+                               for query, params in self.query_builder.bulk_update(table_name, key_columns, group)]
+                    # Только что вставленные строки тоже обновляются - их считает UPDATE
+                    affected += updated[0] if updated else inserted
+        self.row_cache.invalidate_table(table_name, self.writer)
+        self._invalidate_catalog(table_name)
+        return affected
 
     def raw_execute(self, query: str, params: tuple = None, fetch: str = 'all') -> list | tuple:
-        """Выполнение произвольного SQL-запроса."""
-        with self.managed_connection():
-            self.cursor.execute(query, params or ())
-            if fetch == 'all':
-                result = self.cursor.fetchall()
-            elif fetch == 'one':
-                result = self.cursor.fetchone()
-            else:
-                result = None
-            self.connection.commit()
+        """Выполнение произвольного SQL-запроса. Читающие запросы идут через читателя, остальные - через писателя."""
+        if self._is_read_query(query):
+            with self.managed_connection():
+                return self._read(query, params or (), fetch)
+
+        self._sync_write_behind(query)
+        with self.writer.transaction() as connection:
+            start = time.perf_counter()
+            cursor = connection.execute(query, params or ())
+            result = self._fetch(cursor, fetch)
+            self.profiler.record(query, time.perf_counter() - start, cursor.rowcount)
+            self.row_cache.clear(self.writer)
+            self._invalidate_catalog()
+            if query.lstrip().split(None, 1)[0].upper() in ('CREATE', 'ALTER', 'DROP'):
+                self.schema.invalidate()
             return result
 
+    @staticmethod
+    def _fetch(cursor: sqlite3.Cursor, fetch: str):
+        if fetch == 'all':
+            return cursor.fetchall()
+        elif fetch == 'one':
+            return cursor.fetchone()
+        return None
+
     def selector(self, table: str, columns: list[str] | str = None, key: Union[str, 'EID'] = None):
-        with self.managed_connection():
-            if isinstance(columns, str):
-                columns_list = columns
-            elif isinstance(columns, list):
-                columns_list = ', '.join(columns)
-            else:
-                columns_list = '*'
+        if isinstance(columns, str):
+            columns_list = columns
+        elif isinstance(columns, list):
+            columns_list = ', '.join(columns)
+        else:
+            columns_list = '*'
 
-            query = f"SELECT {columns_list} FROM {table}"
-            if key:
-                query += f" WHERE {str(key)}"
+        rows = self._catalog_select(table, columns_list, key)
+        if rows is not None:
+            return rows
 
-            self.execute(query)
-            result = self.cursor.fetchall()
+        with self.managed_connection():
+            query, params = self.query_builder.select(table, columns_list, key)
+            result = self.execute(query, commit=False, params=params, fetch='all')
 
             columns = [desc[0] for desc in self.cursor.description]
 
@@ -433,45 +2545,219 @@ class DataManager:
             return typed_result
 
     def updator(self, table: str, key: Union[str, 'EID'] = None, **kwargs):
-        set_values = []
-        for col, val in kwargs.items():
-            if val is None:
-                set_values.append(f"{col} = NULL")
-            elif isinstance(val, str):
-                set_values.append(f"{col} = '{val}'")
-            elif isinstance(val, (int, float)):
-                set_values.append(f"{col} = {val}")
+        query, params = self.query_builder.update(table, kwargs, key)
+        self.execute(query, params=params)
+        self._invalidate(table, key, set(kwargs))
 
-        set_values_str = ', '.join(set_values)
+    def deleter(self, table: str, key: Union[str, 'EID'] = None):
+        query, params = self.query_builder.delete(table, key)
+        self.execute(query, params=params)
+        self._invalidate(table, key)
 
-        query = f"UPDATE {table} SET {set_values_str}"
+    def inserter(self, table: str, **kwargs):
+        query, values = self.query_builder.insert(table, kwargs)
 
-        if key:
-            query += f" WHERE {str(key)}"
+        self.execute(query, params=values)
+        self.row_cache.invalidate_insert(table, kwargs, self.writer)
+        self._invalidate_catalog(table)
 
-        print(query)
 
-        self.execute(query)
-        self.connection.commit()
+DEFAULT_MANAGER = DEFAULT_DATABASE.manager(idle_timeout=15)
 
-    def deleter(self, table: str, key: Union[str, 'EID'] = None):
-        query = f"DELETE FROM {table}"
-        if filter:
-            query += f" WHERE {str(key)}"
-        self.execute(query)
+_REPLICA_MANAGER: DataManager | None = None
+_REPLICA_LOCK = threading.Lock()
 
-    def inserter(self, table: str, **kwargs):
-        placeholders = ', '.join(kwargs.values())
 
-        column_names = ', '.join(f'"{col}"' for col in kwargs.keys())
+def replica_manager(refresh_interval: float = 30) -> DataManager:
+    """
+    ``DataManager`` реплики основной базы в памяти (создаётся при первом вызове и обновляется раз в
+    ``refresh_interval`` секунд). Для автодополнений и других чтений, которым допустимо отставание.
+    """
+    global _REPLICA_MANAGER
+    if _REPLICA_MANAGER is None:
+        with _REPLICA_LOCK:
+            if _REPLICA_MANAGER is None:
+                _REPLICA_MANAGER = DEFAULT_DATABASE.replica(refresh_interval).manager(idle_timeout=15)
+    return _REPLICA_MANAGER
+
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ArbiterDB')
+DOMAIN_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ArbiterDomain')
+
+
+async def run_blocking(func, *args, executor: ThreadPoolExecutor = None, **kwargs):
+    """Выполняет синхронную функцию в пуле потоков, не блокируя цикл событий бота."""
+    loop = asyncio.get_running_loop()
+    # Контекст (например, профиль текущей команды) переносится в поток исполнителя
+    context = copy_context()
+    return await loop.run_in_executor(executor or DOMAIN_EXECUTOR, partial(context.run, func, *args, **kwargs))
+
+
+def blocking(func):
+    """
+    Декоратор для синхронных доменных вызовов (например, ``Actor(...).range_attack``), которые
+    используются в командах: превращает функцию в корутину, выполняемую вне цикла событий.
+    """
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(func, *args, **kwargs)
+
+    return wrapper
+
 
-        query = f"INSERT INTO {table} ({column_names}) VALUES ({placeholders})"
+class AsyncTransaction:
+    """
+    Накопитель изменяющих запросов для ``AsyncDataManager.transaction``.
 
-        self.cursor.execute(query)
-        self.connection.commit()
+    Запросы выполняются при выходе из блока ``async with`` одним обращением к потоку базы данных
+    и фиксируются одним коммитом. При исключении внутри блока ничего не записывается, при ошибке
+    записи транзакция откатывается целиком. Чтения внутри блока не видят накопленных изменений.
+    """
+
+    def __init__(self, manager: 'AsyncDataManager'):
+        self._manager = manager
+        self._statements: list[tuple[str, tuple | list, bool]] = []
+        self._tables: set[str | None] = set()
+
+    def execute(self, query: str, params: tuple = (), table_name: str = None):
+        self._statements.append((query, params, False))
+        self._tables.add(table_name)
+
+    def insert(self, table_name: str, columns_values: dict):
+        self.execute(*self._manager.query_builder.insert(table_name, columns_values), table_name)
+
+    def update(self, table_name: str, columns_values: dict, filter: str = None):
+        self.execute(*self._manager.query_builder.update(table_name, columns_values, filter), table_name)
+
+    def delete(self, table_name: str, filter: str = None):
+        self.execute(*self._manager.query_builder.delete(table_name, filter), table_name)
+
+    def bulk_insert(self, table_name: str, columns_values_list: list[dict]):
+        if not columns_values_list:
+            return
+        query, _ = self._manager.query_builder.insert(table_name, columns_values_list[0])
+        self._statements.append((query, [tuple(item.values()) for item in columns_values_list], True))
+        self._tables.add(table_name)
+
+    def bulk_update(self, table_name: str, key_columns: str | list[str], rows: list[dict]):
+        key_columns = DataManager._key_columns(key_columns)
+        for query, params in self._manager.query_builder.bulk_update(table_name, key_columns, rows):
+            self._statements.append((query, params, True))
+        self._tables.add(table_name)
+
+    def _commit(self, data_manager: DataManager):
+        with data_manager.writer.transaction() as connection:
+            for query, params, many in self._statements:
+                if many:
+                    connection.executemany(query, params)
+                else:
+                    connection.execute(query, params)
+
+        # Произвольный запрос (без таблицы) сбрасывает кеши целиком
+        if None in self._tables:
+            data_manager.row_cache.clear()
+            data_manager._invalidate_catalog()
+            return
+        for table_name in self._tables:
+            data_manager.row_cache.invalidate_table(table_name)
+            data_manager._invalidate_catalog(table_name)
+
+    async def __aenter__(self) -> 'AsyncTransaction':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None and self._statements:
+            await self._manager.run(self._commit, self._manager.data_manager)
+        self._statements.clear()
+        self._tables.clear()
+        return False
+
+
+class AsyncDataManager:
+    """
+    Асинхронный фасад над ``DataManager`` для discord-когов.
+
+    Все обращения к SQLite выполняются в отдельном потоке базы данных (``DB_EXECUTOR``), поэтому
+    запросы из команд не останавливают цикл событий шлюза.
+    """
+
+    def __init__(self, data_manager: DataManager = None, executor: ThreadPoolExecutor = None):
+        self.data_manager = data_manager or DEFAULT_MANAGER
+        self.executor = executor or DB_EXECUTOR
+
+    @property
+    def query_builder(self) -> QueryBuilder:
+        return self.data_manager.query_builder
 
+    async def run(self, func, *args, **kwargs):
+        """Выполняет синхронную функцию в потоке базы данных."""
+        return await run_blocking(func, *args, executor=self.executor, **kwargs)
 
-DEFAULT_MANAGER = DataManager(idle_timeout=15)
+    async def select(self, table_name: str, columns='*', filter=None) -> list[tuple]:
+        return await self.run(self.data_manager.select, table_name, columns, filter)
+
+    async def select_dict(self, table_name: str, columns='*', filter=None) -> list[dict]:
+        return await self.run(self.data_manager.select_dict, table_name, columns, filter)
+
+    async def select_rows(self, table_name: str, columns='*', filter=None) -> list[Row]:
+        return await self.run(self.data_manager.select_rows, table_name, columns, filter)
+
+    async def check(self, table_name: str, filter: str) -> bool:
+        return await self.run(self.data_manager.check, table_name, filter)
+
+    async def get_count(self, table_name: str, parameter: str, filter: str = None) -> int:
+        return await self.run(self.data_manager.get_count, table_name, parameter, filter)
+
+    async def maxValue(self, table_name: str, parameter: str, filter: str = None) -> int | float:
+        return await self.run(self.data_manager.maxValue, table_name, parameter, filter)
+
+    async def insert(self, table_name: str, columns_values: dict) -> None:
+        await self.run(self.data_manager.insert, table_name, columns_values)
+
+    async def update(self, table_name: str, columns_values: dict, filter: str = None) -> None:
+        await self.run(self.data_manager.update, table_name, columns_values, filter)
+
+    async def delete(self, table_name: str, filter: str = None) -> None:
+        await self.run(self.data_manager.delete, table_name, filter)
+
+    async def bulk_insert(self, table_name: str, columns_values_list: list[dict]) -> None:
+        await self.run(self.data_manager.bulk_insert, table_name, columns_values_list)
+
+    async def bulk_update(self, table_name: str, key_columns: str | list[str], rows: list[dict]) -> int:
+        return await self.run(self.data_manager.bulk_update, table_name, key_columns, rows)
+
+    async def bulk_upsert(self, table_name: str, key_columns: str | list[str], rows: list[dict]) -> int:
+        return await self.run(self.data_manager.bulk_upsert, table_name, key_columns, rows)
+
+    def transaction(self) -> AsyncTransaction:
+        """``async with db.transaction() as tx:`` - накопить записи и зафиксировать их одним коммитом."""
+        return AsyncTransaction(self)
+
+
+DEFAULT_ASYNC_MANAGER = AsyncDataManager()
+
+
+class MissingRow:
+    """
+    Отсутствующая запись - результат ``DataModel.load``, если строка не найдена. Ложна в условиях,
+    ``get`` всегда возвращает значение по умолчанию, а ``empty()`` - словарь колонок таблицы со значениями None.
+    """
+    __slots__ = ('table_name', 'key_filter')
+
+    def __init__(self, table_name: str, key_filter: Union[str, 'EID', None]):
+        self.table_name = table_name
+        self.key_filter = key_filter
+
+    def __bool__(self):
+        return False
+
+    def get(self, key: str, default_value=None):
+        return default_value
+
+    def empty(self, data_manager: 'DataManager') -> dict:
+        return {col: None for col in data_manager.get_all_columns(self.table_name)}
+
+    def __repr__(self):
+        return f'MissingRow({self.table_name}, {self.key_filter})'
 
 
 class DataModel:
@@ -480,16 +2766,32 @@ class DataModel:
         self._key_filter = key_filter
         self.data_manager = kwargs.get('data_manager', DataManager())
         self._data = None
-        self.refresh_data()
+        self._exists = False
+        row = kwargs.get('row')
+        if row is None:
+            self.refresh_data()
+        else:
+            # Строка уже прочитана (например, из BattleState) - повторный запрос не нужен
+            self._data = row
+            self._exists = True
+
+    @classmethod
+    def load(cls, table_name: str, key_filter: Union[str, 'EID', None], data_manager: DataManager = None) -> dict | MissingRow:
+        """Строка таблицы по фильтру одним запросом или ``MissingRow``, если записи нет."""
+        row = (data_manager or DEFAULT_MANAGER).fetch_one_or_none(table_name, key_filter)
+        return row if row is not None else MissingRow(table_name, key_filter)
 
     def refresh_data(self):
         """Refresh the data from the database."""
 
-        columns = self.data_manager.get_all_columns(self._table_name)
-        if self.data_manager.check(self._table_name, self._key_filter):
-            self._data = self.data_manager.select_dict(self._table_name, filter=self._key_filter)[0]
-        else:
-            self._data = {col: None for col in columns}
+        row = self.load(self._table_name, self._key_filter, self.data_manager)
+        self._exists = not isinstance(row, MissingRow)
+        self._data = row if self._exists else row.empty(self.data_manager)
+
+    @property
+    def exists(self) -> bool:
+        """Была ли запись в таблице при последней загрузке."""
+        return self._exists
 
     def update_record(self, data: Dict[str, Any]):
         """Update the record in the database and the local cache."""
@@ -501,6 +2803,7 @@ class DataModel:
         """Delete the record from the database."""
         self.data_manager.delete(self._table_name, self._key_filter)
         self._data = {col: None for col in self._data.keys()}
+        self._exists = False
 
     def get(self, key: str, default_value=None):
         """Get the value of a specific key with an optional default value."""
@@ -534,9 +2837,49 @@ class DataObject:
         self.__table_name__ = table
         self.__key__ = key
         self.data_manager = data_manager or DataManager()
+        self._links: list[Link] = []
 
     def field(self, column: str, default: Any = None) -> 'Link':
-        return Link(self.__table_name__, column, self.__key__, default)
+        link = Link(self.__table_name__, column, self.__key__, default, owner=self)
+        self._links.append(link)
+        return link
+
+    def hydrate(self, row: dict = None, data_manager: DataManager = None):
+        """
+        Заполняет все незагруженные поля объекта из одной строки таблицы. Если строка не передана,
+        она читается целиком одним запросом (через каталог и кеш строк) при первом обращении к любому полю.
+        """
+        if row is None:
+            row = (data_manager or self.data_manager).fetch_row(self.__table_name__, self.__key__) or {}
+        for link in self._links:
+            if not link.is_loaded:
+                link.fill(row)
+
+    @classmethod
+    def load_many(cls, ids: list, **kwargs) -> list['DataObject']:
+        """
+        Создаёт объекты класса по списку идентификаторов и заполняет их поля одним запросом
+        ``WHERE key IN (...)``. Поддерживаются объекты с ключом из одной колонки.
+        """
+        objects = [cls(object_id, **kwargs) for object_id in ids]
+        if not objects:
+            return []
+
+        first = objects[0]
+        if len(first.__key__.columns()) != 1:
+            raise ValueError('Пакетная загрузка поддерживается только для ключа из одной колонки')
+        column = first.__key__.columns()[0]
+        values = [obj.__key__.values()[0] for obj in objects]
+
+        rows = first.data_manager.select_in(first.__table_name__, column, values)
+        rows_by_key = {}
+        for row in rows:
+            value = next((value for name, value in row.items() if name.lower() == column.lower()), None)
+            rows_by_key.setdefault(str(value), row)
+
+        for obj, value in zip(objects, values):
+            obj.hydrate(rows_by_key.get(str(value), {}))
+        return objects
 
     def delete_record(self):
         """Delete the record from the database."""
@@ -607,10 +2950,7 @@ class DataDict:
         self._data = self._get_record()
 
     def _get_record(self) -> dict:
-        if self._data_manager.check(self._table_name, self._key_filter):
-            return self._data_manager.select_dict(self._table_name, filter=self._key_filter)[0]
-        else:
-            return {}
+        return self._data_manager.fetch_row(self._table_name, self._key_filter) or {}
 
     def get(self, key: str, default_value=None) -> Any:
         value = self._data.get(key, default_value) if self._data.get(key) is not None else default_value if default_value else None
@@ -652,13 +2992,15 @@ class DataList:
         self._data_manager = kwargs.get('data_manager', DataManager())
         self._table_name = table_name
         self._key_filter = key_filter
+        self._rows = kwargs.get('rows', False)
         self._data = self._get_records()
 
     def _get_records(self) -> list:
+        select = self._data_manager.select_rows if self._rows else self._data_manager.select_dict
         if self._key_filter:
-            return self._data_manager.select_dict(self._table_name, filter=self._key_filter)
+            return select(self._table_name, filter=self._key_filter)
         else:
-            return self._data_manager.select_dict(self._table_name)
+            return select(self._table_name)
 
     def get(self, index: int) -> dict:
         return self._data[index] if index < len(self._data) else None
@@ -768,8 +3110,7 @@ class DataTable:
     def _get_columns(self):
         if self._table_name not in self._data_manager.get_all_tables():
             return []
-        columns = self._data_manager.get_all_columns(self._table_name)
-        return columns
+        return self._data_manager.get_all_columns(self._table_name)
 
     def get_record(self, filter: str):
         data = self._data_manager.select_dict(self._table_name, filter=filter)
@@ -808,20 +3149,44 @@ class Table:
 
 
 class Link:
-    def __init__(self, table: str, column: str, key: Union[str, 'EID'], default: Any = None):
+    def __init__(self, table: str, column: str, key: Union[str, 'EID'], default: Any = None, owner: DataObject = None):
         self.table = table
         self.column = column
         self.key = key
+        self.owner = owner
         self._value = None
         self._default_value = default
         self._is_loaded = False
 
+    @property
+    def is_loaded(self) -> bool:
+        return self._is_loaded
+
+    def fill(self, row: dict):
+        """Берёт значение из уже прочитанной строки таблицы (пустая строка - записи нет)."""
+        if not row:
+            self._value = self._default_value
+        elif self.column in row:
+            self._value = row[self.column]
+        else:
+            self._value = next((value for name, value in row.items() if name.lower() == self.column.lower()),
+                               self._default_value)
+        self._is_loaded = True
+
     def load(self, data_manager: DataManager):
-        """Загружает список данных из базы, если они еще не загружены."""
+        """Загружает значение из базы, если оно еще не загружено. Поля объекта загружаются всей строкой."""
         if self._is_loaded:
             return self._value
 
-        data = data_manager.selector(self.table, [self.column], str(self.key))
+        if self.owner is not None:
+            self.owner.hydrate(data_manager=data_manager)
+            return self._value
+
+        found, row = data_manager.peek_row(self.table, self.key)
+        if found:
+            data = [row] if row is not None else []
+        else:
+            data = data_manager.selector(self.table, [self.column], self.key)
 
         if not data:
             self._value = self._default_value
@@ -849,7 +3214,7 @@ class Link:
 
     def save(self, data_manager: DataManager, value: Union[str, int, float]):
         """Сохраняет новое значение в базу данных."""
-        data_manager.updator(self.table, str(self.key), **{self.column: value})
+        data_manager.updator(self.table, self.key, **{self.column: value})
         self._value = value
 
     def invalidate_cache(self):
@@ -887,6 +3252,27 @@ class EID:
 
         return f' AND '.join(conditions)
 
+    def to_params(self) -> tuple[str, tuple]:
+        """Преобразует ключевые значения в условие с плейсхолдерами ``?`` и кортеж параметров."""
+        conditions = []
+        params = []
+        for key, value in self._key_data.items():
+            if value is None:
+                conditions.append(f'{key} is NULL')
+            elif isinstance(value, (str, int, float)):
+                conditions.append(f'{key} = ?')
+                params.append(value)
+            else:
+                raise ValueError('Значение ключа может быть в форматах None (NULL), str (TEXT), int (INTEGER), float (REAL)')
+
+        return ' AND '.join(conditions), tuple(params)
+
+    def columns(self) -> list[str]:
+        return list(self._key_data.keys())
+
+    def values(self) -> list[Any]:
+        return list(self._key_data.values())
+
     def __repr__(self):
         return f'IDKey[ {self._process_key()} ]'
 
@@ -383,7 +383,7 @@ class Dialogue(DataModel):
     @staticmethod
     def create_dialogue(label: str, channel: int, data_manager: DataManager = None) -> 'Dialogue':
         db = data_manager if data_manager is not None else DataManager()
-        dialogue_id = db.maxValue('DIALOGUE_INIT', 'id') + 1
+        dialogue_id = db.next_id('DIALOGUE_INIT')
         db.insert('DIALOGUE_INIT', {'id': dialogue_id, 'label': label, 'channel': channel})
 
         return Dialogue(dialogue_id, label=label, channel=channel, data_manager=db)
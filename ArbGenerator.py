@@ -167,20 +167,19 @@ class ItemManager:
     def batch_spawn_items(item_data: list[dict], data_manager: DataManager, equip_to_character: int = None):
         inventory_id = item_data[0].get('inventory') if item_data[0].get('inventory') else None
 
+        item_ids = data_manager.reserve_ids('ITEMS', 'id', len(item_data))
         item_tuples = [
-            (item['name'], item['type'], item['class'], item['material'],
+            (item_id, item['name'], item['type'], item['class'], item['material'],
              item['quality'], item['endurance'], item['biocode'], item['inventory'])
-            for item in item_data
+            for item_id, item in zip(item_ids, item_data)
         ]
 
-        with data_manager.connection as conn:
-            cursor = conn.cursor()
+        with data_manager.transaction():
+            cursor = data_manager.writer.connection.cursor()
             try:
-                last_item_id = data_manager.maxValue('ITEMS', 'id') + 1
-
                 # Пакетная вставка данных в таблицу ITEMS
-                cursor.executemany('''INSERT INTO ITEMS (name, type, class, material, quality, endurance, biocode, inventory)
-                                      VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', item_tuples)
+                cursor.executemany('''INSERT INTO ITEMS (id, name, type, class, material, quality, endurance, biocode, inventory)
+                                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', item_tuples)
 
                 # Экипируем предметы и вставляем данные о пулях для оружия
                 equip_tuples = []
@@ -189,8 +188,7 @@ class ItemManager:
                 if equip_to_character:
                     from ArbItems import CharacterEquipment
 
-                    for idx, item in enumerate(item_data):
-                        item_id = last_item_id + idx  # Последовательный ID предмета
+                    for item_id, item in zip(item_ids, item_data):
                         if item['class'] == 'Оружие':
                             # Добавляем данные о пулях для оружия в batch
                             bullets = ItemManager.get_weapon_capacity_static(item['type'], data_manager)
@@ -214,21 +212,20 @@ class ItemManager:
                 if equip_tuples:
                     cursor.executemany('''INSERT INTO CHARS_EQUIPMENT (id, item_id) VALUES (?, ?)''', equip_tuples)
 
-                conn.commit()
-
             except Exception as e:
-                conn.rollback()
                 data_manager.logger.error(f"Error during batch insertion: {e}")
                 raise
             finally:
                 cursor.close()
+                for table in ('ITEMS', 'ITEMS_BULLETS', 'CHARS_EQUIPMENT'):
+                    data_manager.row_cache.invalidate_table(table, data_manager.writer)
 
         return inventory_id
 
     def spawn_item(self, equip_to_character: int = None):
         from ArbItems import CharacterEquipment, Item
 
-        item_id = self.data_manager.maxValue('ITEMS', f'id') + 1
+        item_id = self.data_manager.next_id('ITEMS')
         query = {
             'id': item_id,
             'name': self.item_label,
@@ -314,7 +311,7 @@ def TitleGenerator(type:str):
 def create_inventory(label:str=None, owner:int=None, type:str=None, **kwargs):
     data_manager = kwargs.get('data_manager', DataManager())
 
-    c_id = data_manager.maxValue('INVENTORY_INIT','id') + 1
+    c_id = data_manager.next_id('INVENTORY_INIT')
 
     prompt = {
         'id': c_id,
@@ -1023,7 +1020,7 @@ class CharacterTemplate:
                                                                      budget, self.data_manager)
 
     def insert_data(self) -> int:
-        character_id = self.data_manager.maxValue('CHARS_INIT', 'id') + 1
+        character_id = self.data_manager.next_id('CHARS_INIT')
         self.basic_info.save_to_db(character_id, self.data_manager)
         self.worldview.save_to_db(character_id, self.data_manager)
         for skill in self.skills:
@@ -1608,7 +1605,7 @@ class GenerateCharacter:
         from ArbOrgs import Organization
 
 
-        character_id = self.data_manager.maxValue('CHARS_INIT', 'id') + 1
+        character_id = self.data_manager.next_id('CHARS_INIT')
 
         basic_info = self.basicCfg.to_dict()
         basic_query = {'id': character_id,
@@ -1713,11 +1710,7 @@ class GenerateObject:
         self.uses = kwargs.get('uses', 0)
 
     def get_available_id(self):
-        objects = self.data_manager.select_dict('BATTLE_OBJECTS')
-        if not objects:
-            return 0
-        else:
-            return self.data_manager.maxValue('BATTLE_OBJECTS', 'object_id') + 1
+        return self.data_manager.next_id('BATTLE_OBJECTS', 'object_id')
 
     def get_endurance(self):
         if self.data_manager.check('OBJECT_TYPE', f'object_id = "{self.object_type}"'):
@@ -1842,10 +1835,7 @@ class GenerateBattle:
         self.generate_special_objects()
 
     def get_battle_id(self):
-        if self.data_manager.check('BATTLE_INIT', 'id'):
-            return self.data_manager.maxValue('BATTLE_INIT', 'id') + 1
-        else:
-            return 1
+        return self.data_manager.next_id('BATTLE_INIT', first=1)
 
     def get_terrain_types(self, terrain_category: str):
         if self.data_manager.check('TERRAIN_TYPE', f'type = "{terrain_category}"'):
@@ -1976,10 +1966,7 @@ class GenerateTeam:
         self.generate_coordinator = kwargs.get('generate_coordinator', False)
 
     def get_current_id(self):
-        if self.data_manager.check('BATTLE_TEAMS', 'team_id'):
-            return self.data_manager.maxValue('BATTLE_TEAMS', 'team_id') + 1
-        else:
-            return 1
+        return self.data_manager.next_id('BATTLE_TEAMS', 'team_id', first=1)
 
     def generate_units(self):
         from ArbBattle import ActionPoints
@@ -2091,7 +2078,7 @@ class GenerateGroup:
 
     def insert_data(self):
         from ArbItems import CharacterEquipment
-        group_id = self.data_manager.maxValue('GROUP_INIT', 'id') + 1
+        group_id = self.data_manager.next_id('GROUP_INIT')
 
         chars = self.generate_units()
         chars_ids = []
@@ -192,7 +192,7 @@ class Group(DataObject):
     @staticmethod
     def create(label:str, owner_id:int):
         db = DEFAULT_MANAGER
-        max_id = db.maxValue('GROUP_INIT', 'id') + 1
+        max_id = db.next_id('GROUP_INIT')
         group_id = max_id if max_id else 1
 
         db.insert('GROUP_INIT', {'id': group_id, 'label': label, 'owner_id': owner_id})
@@ -204,7 +204,7 @@ class Injury(DataObject):
     @classmethod
     def create_injury(cls, character_id:int, injury_type:str, place:str, damage:int, root:str=None, heal_efficiency:int=0, is_scar:bool=False):
         db = DEFAULT_MANAGER
-        id_inj = db.maxValue('CHARS_INJURY', 'id_inj') + 1
+        id_inj = db.next_id('CHARS_INJURY', 'id_inj')
 
         query = {
             'id': character_id,
@@ -473,7 +473,7 @@ class Disease(DataObject):
     @classmethod
     def create_character_disease(cls, character_id: int, disease_type_id:str, **kwargs):
         db = kwargs.get('data_manager', DEFAULT_MANAGER)
-        dis_id = db.maxValue('CHARS_DISEASE', 'dis_id') + 1
+        dis_id = db.next_id('CHARS_DISEASE', 'dis_id')
 
         place = kwargs.get('place', None)
         severity = kwargs.get('severity', 0)
@@ -845,7 +845,7 @@ class Implant(DataObject):
     @classmethod
     def create_implant(cls, character_id:int, implant_type:str, place:str=None, label:str=None):
         db = DEFAULT_MANAGER
-        imp_id = db.maxValue('CHARS_BODY', 'imp_id') + 1
+        imp_id = db.next_id('CHARS_BODY', 'imp_id')
         query = {
             'id': character_id,
             'imp_id': imp_id,
@@ -1041,14 +1041,14 @@ class BodyElement:
             return False
 
     def check_element_replaced_with_implant(self):
-        if not self.data_manager.check('CHARS_BODY', f'id = {self.character_id}'):
+        row = DataModel.load('CHARS_BODY', f'id = {self.character_id} AND place = "{self.element_id}"', self.data_manager)
+        if not row:
             return None
-        if self.data_manager.check('CHARS_BODY', f'id = {self.character_id} AND place = "{self.element_id}"'):
-            imp_id = self.data_manager.select_dict('CHARS_BODY', filter=f'id = {self.character_id} AND place = "{self.element_id}"')[0].get('imp_id')
-            if Implant(imp_id, data_manager=self.data_manager).type.is_replacing:
-                return imp_id
-            else:
-                return None
+
+        implant = Implant(row.get('imp_id'), data_manager=self.data_manager)
+        implant.hydrate(row)
+        if implant.type.is_replacing:
+            return implant.imp_id
         else:
             return None
 
@@ -1144,7 +1144,7 @@ class BodyElement:
         if not self.data_manager.check('CHARS_INJURY', f'id_inj = 0'):
             c_id = 0
         else:
-            c_id = self.data_manager.maxValue('CHARS_INJURY', 'id_inj') + 1
+            c_id = self.data_manager.next_id('CHARS_INJURY', 'id_inj')
 
         injury_type = damage.random_injury()
 
@@ -332,7 +332,7 @@ class Inventory(DataObject):
             inventory_id = data_manager.select_dict('INVENTORY_INIT', filter=f'owner = {character_id} AND loc is NULL')[0].get('id')
             return cls(inventory_id, data_manager=data_manager)
         else:
-            idx = data_manager.maxValue('INVENTORY_INIT', 'id') + 1
+            idx = data_manager.next_id('INVENTORY_INIT')
             query = {
                 'id': idx,
                 'label': 'Инвентарь',
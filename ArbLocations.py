@@ -487,7 +487,7 @@ class Location(DataObject):
         return total_objects
 
     def add_object(self, type_id:str, label:str=None):
-        object_id = self.data_manager.maxValue('LOC_OBJECTS', 'object_id') + 1
+        object_id = self.data_manager.next_id('LOC_OBJECTS', 'object_id')
         query = {
             'id': self.id,
             'type': type_id,
@@ -742,11 +742,9 @@ class CharacterLocation(DataObject):
         return [Location(loc) for loc in total_locs]
 
     def graph_all_locations(self):
-        locations = self.data_manager.select_dict('LOC_INIT')
         graph = {}
-        for location in locations:
-            graph[location.get('id')] = Location(location.get('id'),
-                                                 data_manager=self.data_manager).process_connections()
+        for location_id, in self.data_manager.stream('LOC_INIT', 'id', row_type='tuple'):
+            graph[location_id] = Location(location_id, data_manager=self.data_manager).process_connections()
 
         return graph
 
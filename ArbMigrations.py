@@ -0,0 +1,160 @@
+"""
+Версионные миграции схемы ``Arbiter.db``.
+
+Миграции идемпотентны (``CREATE INDEX IF NOT EXISTS``) и применяются при запуске бота по порядку версий,
+каждая в своей транзакции. Применённые версии записываются в таблицу ``META_MIGRATIONS``, после применения
+сбрасывается реестр схемы ``DEFAULT_SCHEMA``.
+
+Запуск вручную: ``python ArbMigrations.py migrate`` или ``python ArbMigrations.py audit`` - список
+запросов, которые по-прежнему читают таблицу целиком (по ``EXPLAIN QUERY PLAN``).
+"""
+import datetime
+import sqlite3
+import sys
+from dataclasses import dataclass
+
+from ArbArchive import ARCHIVE_SCHEMA
+from ArbDatabase import DEFAULT_LOGGER, DEFAULT_QUERY_BUILDER, DEFAULT_SCHEMA, DEFAULT_WRITER, Logger, SchemaRegistry, \
+    WriterConnection
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+    def apply(self, connection: sqlite3.Connection):
+        for statement in self.statements:
+            connection.execute(statement)
+
+
+MIGRATIONS = (
+    Migration(1, 'Индексы персонажей', (
+        'CREATE INDEX IF NOT EXISTS IDX_CHARS_EQUIPMENT_ID ON CHARS_EQUIPMENT (id)',
+        'CREATE INDEX IF NOT EXISTS IDX_ITEMS_INVENTORY ON ITEMS (inventory)',
+        'CREATE INDEX IF NOT EXISTS IDX_CHARS_INJURY_ID_PLACE ON CHARS_INJURY (id, place)',
+        'CREATE INDEX IF NOT EXISTS IDX_CHARS_DISEASE_ID ON CHARS_DISEASE (id)',
+        'CREATE INDEX IF NOT EXISTS IDX_CHARS_BODY_ID ON CHARS_BODY (id)',
+        'CREATE INDEX IF NOT EXISTS IDX_CHARS_MEMORY_ID ON CHARS_MEMORY (id)',
+        'CREATE INDEX IF NOT EXISTS IDX_CHARS_RELATIONS_SUBJECT ON CHARS_RELATIONS (subject_id)',
+        'CREATE INDEX IF NOT EXISTS IDX_NOTIFICATIONS_CHARACTER ON NOTIFICATIONS (character_id)',
+    )),
+    Migration(2, 'Индексы боя', (
+        'CREATE INDEX IF NOT EXISTS IDX_BATTLE_CHARACTERS_BATTLE ON BATTLE_CHARACTERS (battle_id, layer_id)',
+        'CREATE INDEX IF NOT EXISTS IDX_BATTLE_SOUNDS_BATTLE ON BATTLE_SOUNDS (battle_id)',
+        'CREATE INDEX IF NOT EXISTS IDX_BATTLE_DEAD_BATTLE_LAYER ON BATTLE_DEAD (battle_id, layer_id)',
+        'CREATE INDEX IF NOT EXISTS IDX_BATTLE_DEAD_CHARACTER ON BATTLE_DEAD (character_id)',
+    )),
+    # Архив раньше уникальных индексов: ошибка уникального индекса на живых дубликатах останавливает
+    # следующие миграции (таблицы архива при этом создаёт сам ``BattleArchive``)
+    Migration(3, 'Архив боёв', ARCHIVE_SCHEMA),
+    Migration(4, 'Уникальность экипировки и отношений', (
+        'CREATE UNIQUE INDEX IF NOT EXISTS UQ_CHARS_EQUIPMENT_ITEM ON CHARS_EQUIPMENT (item_id)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS UQ_CHARS_RELATIONS_PAIR ON CHARS_RELATIONS (id, subject_id)',
+    )),
+)
+
+# Частые формы запросов бота - для аудита без запущенного бота
+HOT_QUERIES = (
+    'SELECT * FROM CHARS_EQUIPMENT WHERE id = ?',
+    'SELECT * FROM CHARS_EQUIPMENT WHERE item_id = ?',
+    'SELECT * FROM ITEMS WHERE inventory = ?',
+    'SELECT * FROM BATTLE_CHARACTERS WHERE battle_id = ?',
+    'SELECT * FROM BATTLE_CHARACTERS WHERE character_id = ?',
+    'SELECT * FROM BATTLE_CHARACTERS WHERE battle_id = ? AND layer_id = ?',
+    'SELECT * FROM CHARS_INJURY WHERE id = ?',
+    'SELECT * FROM CHARS_INJURY WHERE id = ? AND place = ?',
+    'SELECT * FROM CHARS_DISEASE WHERE id = ?',
+    'SELECT * FROM CHARS_BODY WHERE id = ?',
+    'SELECT * FROM BATTLE_SOUNDS WHERE battle_id = ?',
+    'SELECT * FROM BATTLE_DEAD WHERE battle_id = ? AND layer_id = ?',
+    'SELECT * FROM BATTLE_DEAD WHERE character_id = ?',
+    'SELECT * FROM CHARS_MEMORY WHERE id = ?',
+    'SELECT * FROM CHARS_RELATIONS WHERE id = ? AND subject_id = ?',
+    'SELECT * FROM CHARS_RELATIONS WHERE id = ? OR subject_id = ?',
+    'SELECT * FROM NOTIFICATIONS WHERE character_id = ?',
+)
+
+
+class Migrator:
+    TABLE = 'META_MIGRATIONS'
+
+    def __init__(self, writer: WriterConnection = DEFAULT_WRITER, migrations: tuple[Migration, ...] = MIGRATIONS,
+                 logger: Logger = DEFAULT_LOGGER, schema: SchemaRegistry = DEFAULT_SCHEMA):
+        self.writer = writer
+        self.schema = schema
+        self.migrations = tuple(sorted(migrations, key=lambda migration: migration.version))
+        self.logger = logger
+
+    def _ensure_table(self, connection: sqlite3.Connection):
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {self.TABLE} '
+                           f'(version INTEGER PRIMARY KEY, name TEXT, applied_at TEXT)')
+
+    def current_version(self) -> int:
+        with self.writer.transaction() as connection:
+            self._ensure_table(connection)
+            version = connection.execute(f'SELECT MAX(version) FROM {self.TABLE}').fetchone()[0]
+        return version or 0
+
+    def pending(self) -> list[Migration]:
+        version = self.current_version()
+        return [migration for migration in self.migrations if migration.version > version]
+
+    def migrate(self) -> list[Migration]:
+        """
+        Применяет неприменённые миграции по порядку. Ошибка миграции откатывает только её саму и
+        останавливает применение следующих: бот продолжит работу на прежней версии схемы.
+        """
+        applied = []
+        for migration in self.pending():
+            try:
+                with self.writer.transaction() as connection:
+                    migration.apply(connection)
+                    connection.execute(f'INSERT INTO {self.TABLE} (version, name, applied_at) VALUES (?, ?, ?)',
+                                       (migration.version, migration.name, datetime.datetime.now().isoformat()))
+            except sqlite3.DatabaseError as e:
+                self.logger.critical(f'Миграция {migration.version} ({migration.name}) не применена: {e}')
+                break
+            self.logger.info(f'Применена миграция {migration.version}: {migration.name}')
+            applied.append(migration)
+
+        if applied:
+            with self.writer.acquire() as connection:
+                connection.execute('PRAGMA optimize')
+            self.schema.invalidate()
+        return applied
+
+
+def audit_query_plans(connection: sqlite3.Connection, queries=None) -> list[tuple[str, str]]:
+    """
+    Прогоняет ``EXPLAIN QUERY PLAN`` по формам запросов (по умолчанию - ``HOT_QUERIES`` и все формы, собранные
+    ``DEFAULT_QUERY_BUILDER`` за время работы бота) и возвращает пары (запрос, шаг плана) для полных просмотров.
+    """
+    if queries is None:
+        queries = list(dict.fromkeys(HOT_QUERIES + tuple(DEFAULT_QUERY_BUILDER.query_shapes)))
+
+    scans = []
+    for query in queries:
+        params = (None,) * query.count('?')
+        try:
+            plan = connection.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        except sqlite3.DatabaseError:
+            continue
+        scans.extend((query, step[-1]) for step in plan if step[-1].startswith('SCAN'))
+    return scans
+
+
+DEFAULT_MIGRATOR = Migrator()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command == 'migrate':
+        for migration in DEFAULT_MIGRATOR.migrate():
+            print(f'-- {migration.version}: {migration.name}')
+        print(f'Версия схемы: {DEFAULT_MIGRATOR.current_version()}')
+    elif command == 'audit':
+        with DEFAULT_WRITER.acquire() as connection:
+            for query, step in audit_query_plans(connection):
+                print(f'{step:<40} {query}')
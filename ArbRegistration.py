@@ -174,7 +174,7 @@ class RegForm(DataModel):
     @staticmethod
     def write_form_id_database(form: dict, **kwargs):
         db = kwargs.get('data_manager', DataManager())
-        form_id = db.maxValue('REGISTRATION', 'form_id') + 1
+        form_id = db.next_id('REGISTRATION', 'form_id')
         form_json = json.dumps(form)
 
         server_id = form.pop('server')
@@ -188,7 +188,7 @@ class Notification(DataModel):
             if not owner_data:
                 return
 
-        note_id = db.maxValue('NOTIFICATIONS', 'note_id') + 1 if db.select_dict('NOTIFICATIONS') else 0
+        note_id = db.next_id('NOTIFICATIONS', 'note_id')
         query = {'note_id':note_id, 'content':content, 'character_id': character_id, 'title': title, 'type': type}
 
         db.insert('NOTIFICATIONS', query)
@@ -97,10 +97,7 @@ class Skill(SkillInit, DataModel):
         self.update_record(query)
 
     def check_skill_record(self):
-        if self.data_manager.check('CHARS_SKILLS', f'id = {self.character_id} and skill_id = "{self.skill_id}"'):
-            return True
-        else:
-            return False
+        return self.exists
 
     def insert_skill(self):
         query = {'id': self.character_id,
@@ -111,6 +108,7 @@ class Skill(SkillInit, DataModel):
                    'exp': self.exp}
 
         self.data_manager.insert('CHARS_SKILLS', query)
+        self._exists = True
 
     def skill_progression(self, current_lvl: int):
         formula = round( 50**(1+current_lvl/100) + current_lvl * 50 )
@@ -26,7 +26,7 @@ class Sound(DataModel):
         battle_id = battle_data.get('battle_id')
         layer_id = battle_data.get('layer_id')
 
-        sound_id = db.maxValue('BATTLE_SOUNDS', 'id') + 1
+        sound_id = db.next_id('BATTLE_SOUNDS')
 
         query = {
             'id': sound_id,
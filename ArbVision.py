@@ -0,0 +1,302 @@
+"""
+Матрица видимости боя.
+
+Без матрицы ``ActorVision`` на каждый вызов заново читает слои, местность и маскировку каждого персонажа слоя
+(``Actor.disguise()``). ``VisibilityMatrix`` считается один раз для всего боя по снимкам наблюдателей
+(``ObserverView``), целей (``TargetView``) и слоёв (``LayerView``). Для каждого наблюдателя считается видимость
+слоёв (по правилам ``ActorVision.total_layers_vigilance``) и порог маскировки на слой, с которым сравнивается
+маскировка целей слоя. Ответ на вопрос "кого видит персонаж" после этого - готовый словарь.
+
+``VisibilityCache`` хранит матрицы по боям и пересчитывает матрицу, когда меняется одна из таблиц, от которых она
+зависит (по версиям таблиц в кеше строк: раунд и время суток, слои, позиции, объекты, экипировка, тело и навыки),
+или когда её сбрасывают явно (``invalidate``) - например, при перемещении внутри команды боя, изменения которой
+ещё не записаны в базу.
+
+``StealthCache`` хранит составляющие маскировки персонажа (``StealthScore``: одежда и навык брони, природная
+маскировка и способность, навык скрытности, укрытие объекта) по отдельности: каждая составляющая пересчитывается
+только при изменении своих таблиц, поэтому пересчёт матрицы после перемещения не перечитывает экипировку.
+Там же хранятся способности тела и навыки брони персонажа (``capacities``, ``armor_skills``), из которых
+считаются зрение наблюдателя и очки действия нового раунда.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from ArbBattleState import BattleState
+from ArbDatabase import DEFAULT_MANAGER, DataManager
+
+
+@dataclass(frozen=True)
+class LayerView:
+    layer_id: int
+    height: float
+    coverage: bool
+    visibility: float
+
+
+@dataclass(frozen=True)
+class ObserverView:
+    actor_id: int
+    layer_id: int | None
+    object_id: int | None
+    height: float
+    distance_of_view: float
+    time_factor: float
+    weather_factor: float
+    thermal_factor: float = 1
+    recon_factor: float = 1
+
+
+@dataclass(frozen=True)
+class TargetView:
+    actor_id: int
+    layer_id: int | None
+    object_id: int | None
+    disguise: float
+
+
+def layer_vigilance(observer: ObserverView, layer: LayerView, distance_delta: float) -> float:
+    total_distance = abs(layer.layer_id - observer.layer_id) * distance_delta
+    layer_baff = 0 if observer.layer_id != layer.layer_id else 40
+
+    return round((observer.distance_of_view - total_distance) / observer.distance_of_view * 100 * observer.time_factor
+                 * observer.weather_factor * layer.visibility + layer_baff, 2)
+
+
+def layers_vigilance(observer: ObserverView, layers: dict[int, LayerView], distance_delta: float) -> dict[int, float]:
+    """
+    Видимость слоёв для наблюдателя: обход от слоя наблюдателя назад и вперёд до слоя с нулевой видимостью,
+    укрытия (если наблюдатель не выше его более чем на 10) или возвышенности (на 5 и выше наблюдателя).
+    """
+    if observer.layer_id is None or observer.distance_of_view <= 0:
+        return {}
+
+    layer_ids = sorted(layers)
+    result = {}
+    for direction in (reversed([i for i in layer_ids if i < observer.layer_id]),
+                      [i for i in layer_ids if i >= observer.layer_id]):
+        for layer_id in direction:
+            layer = layers[layer_id]
+            vigilance = layer_vigilance(observer, layer, distance_delta)
+            if vigilance <= 0:
+                break
+            result[layer_id] = vigilance
+
+            if layer.coverage and layer_id != observer.layer_id:
+                if observer.height - layer.height > 10:
+                    continue
+                else:
+                    break
+            if layer.height - observer.height >= 5:
+                break
+
+    return result
+
+
+class VisibilityMatrix:
+    """Видимость всех персонажей боя друг для друга: ``{наблюдатель: {слой: [видимые персонажи]}}``."""
+
+    def __init__(self, battle_id: int, layers: dict[int, LayerView], observers: list[ObserverView],
+                 targets: list[TargetView], distance_delta: float, round: int = None):
+        self.battle_id = battle_id
+        self.round = round
+        self.layers: dict[int, dict[int, float]] = {}
+        self.visible: dict[int, dict[int, list[int]]] = {}
+        self._seen: dict[int, frozenset[int]] = {}
+
+        layer_targets: dict[int, list[TargetView]] = {}
+        for target in targets:
+            layer_targets.setdefault(target.layer_id, []).append(target)
+
+        for observer in observers:
+            vigilance = layers_vigilance(observer, layers, distance_delta)
+            visible = {}
+            for layer_id, value in vigilance.items():
+                if not layer_targets.get(layer_id):
+                    continue
+                # Один порог на слой; цели в том же объекте, что и наблюдатель, видны с бонусом 20
+                threshold = value * observer.thermal_factor * observer.recon_factor
+                visible[layer_id] = [target.actor_id for target in layer_targets[layer_id]
+                                     if target.disguise <= threshold + (20 if target.object_id == observer.object_id else 0)]
+
+            self.layers[observer.actor_id] = vigilance
+            self.visible[observer.actor_id] = visible
+            self._seen[observer.actor_id] = frozenset(actor_id for ids in visible.values() for actor_id in ids)
+
+    def __contains__(self, actor_id: int) -> bool:
+        return actor_id in self.visible
+
+    def layers_vigilance(self, actor_id: int) -> dict[int, float]:
+        return dict(self.layers.get(actor_id, {}))
+
+    def visible_characters(self, actor_id: int) -> dict[int, list[int]]:
+        return {layer_id: list(actors) for layer_id, actors in self.visible.get(actor_id, {}).items()}
+
+    def can_see(self, observer_id: int, target_id: int) -> bool:
+        return target_id in self._seen.get(observer_id, ())
+
+    def observers_of(self, target_id: int) -> list[int]:
+        return [observer_id for observer_id, seen in self._seen.items() if target_id in seen]
+
+    def info(self) -> dict[str, int]:
+        return {'observers': len(self.visible), 'pairs': sum(len(seen) for seen in self._seen.values())}
+
+
+@dataclass
+class _Entry:
+    matrix: VisibilityMatrix
+    versions: tuple
+    state: BattleState | None
+
+
+class VisibilityCache:
+    """Матрицы видимости по боям; матрица пересчитывается при изменении таблиц из ``TABLES`` или после ``invalidate``."""
+
+    TABLES = ('BATTLE_INIT', 'BATTLE_LAYERS', 'BATTLE_CHARACTERS', 'BATTLE_OBJECTS',
+              'CHARS_EQUIPMENT', 'ITEMS', 'CLOTHES', 'CHARS_INIT', 'CHARS_BODY', 'CHARS_INJURY', 'CHARS_DISEASE',
+              'CHARS_SKILLS')
+
+    def __init__(self, builder: Callable[[int, DataManager], VisibilityMatrix], data_manager: DataManager = None):
+        self.builder = builder
+        self.data_manager = data_manager or DEFAULT_MANAGER
+        self._entries: dict[int, _Entry] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+
+    def _versions(self, data_manager: DataManager) -> tuple:
+        return tuple(data_manager.row_cache.version(table) for table in self.TABLES)
+
+    @staticmethod
+    def _pending_state(battle_id: int) -> BattleState | None:
+        state = BattleState.current(battle_id)
+        return state if state and state.pending_tables() & set(VisibilityCache.TABLES) else None
+
+    def get(self, battle_id: int, data_manager: DataManager = None) -> VisibilityMatrix:
+        data_manager = data_manager or self.data_manager
+        versions = self._versions(data_manager)
+        state = self._pending_state(battle_id)
+
+        with self._lock:
+            entry = self._entries.get(battle_id)
+            # Матрица, посчитанная по незаписанным изменениям команды, действительна только внутри этой команды
+            if entry and entry.versions == versions and entry.state is state:
+                self.hits += 1
+                return entry.matrix
+
+        matrix = self.builder(battle_id, data_manager)
+        with self._lock:
+            self._entries[battle_id] = _Entry(matrix, versions, state)
+            self.builds += 1
+        return matrix
+
+    def invalidate(self, battle_id: int = None):
+        with self._lock:
+            if battle_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(battle_id, None)
+
+    def info(self) -> dict[str, int]:
+        return {'battles': len(self._entries), 'builds': self.builds, 'hits': self.hits}
+
+
+@dataclass(frozen=True)
+class StealthScore:
+    """Составляющие маскировки персонажа; ``total`` считается так же, как ``Actor.disguise``."""
+    actor_id: int
+    clothes: float
+    armor_skill: float
+    race: float
+    capacity: float
+    skill: int
+    object_cover: float
+
+    @property
+    def armor(self) -> float:
+        return (self.armor_skill + self.clothes) / 2 if self.armor_skill >= self.clothes else self.clothes
+
+    @property
+    def natural(self) -> float:
+        return max(self.race, self.capacity)
+
+    @property
+    def modifier(self) -> float:
+        return 0.75 + self.skill * 0.005
+
+    @property
+    def total(self) -> float:
+        return round((self.armor + self.natural + self.object_cover) * self.modifier, 2)
+
+    def explain(self) -> list[str]:
+        return [f'Одежда: {self.clothes:.2f}, навык брони: {self.armor_skill:.2f} -> броня {self.armor:.2f}',
+                f'Природная маскировка: {self.race:.2f}, способность: {self.capacity:.2f} -> {self.natural:.2f}',
+                f'Укрытие объекта: {self.object_cover:.2f}',
+                f'Навык скрытности: {self.skill} -> множитель x{self.modifier:.3f}',
+                f'Итого: ({self.armor:.2f} + {self.natural:.2f} + {self.object_cover:.2f}) x {self.modifier:.3f} = {self.total:.2f}']
+
+
+class StealthCache:
+    """
+    Составляющие маскировки по персонажам. Составляющая пересчитывается при изменении версии своих таблиц в кеше
+    строк (``COMPONENTS``), смене ключа (объект персонажа для укрытия) или после ``invalidate``.
+    """
+
+    COMPONENTS = {
+        'armor': ('CHARS_EQUIPMENT', 'ITEMS', 'CLOTHES'),
+        'armor_skills': ('CHARS_EQUIPMENT', 'ITEMS', 'CLOTHES'),
+        'body': ('CHARS_INIT', 'CHARS_BODY', 'CHARS_INJURY', 'CHARS_DISEASE'),
+        'capacities': ('CHARS_INIT', 'CHARS_BODY', 'CHARS_INJURY', 'CHARS_DISEASE'),
+        'skill': ('CHARS_SKILLS',),
+        'cover': ('BATTLE_OBJECTS',),
+    }
+
+    def __init__(self, data_manager: DataManager = None):
+        self.data_manager = data_manager or DEFAULT_MANAGER
+        self._entries: dict[tuple[int, str], tuple[Any, tuple, Any, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def component(self, actor_id: int, name: str, compute: Callable[[], Any], data_manager: DataManager = None,
+                  key=None, fingerprint: Callable[[], Any] = None) -> Any:
+        """
+        Значение составляющей ``name`` персонажа. Если версии таблиц составляющей изменились, но её ``fingerprint``
+        (один лёгкий запрос, например, экипированные предметы персонажа) прежний, значение не пересчитывается.
+        """
+        row_cache = (data_manager or self.data_manager).row_cache
+        versions = tuple(row_cache.version(table) for table in self.COMPONENTS[name])
+
+        with self._lock:
+            entry = self._entries.get((actor_id, name))
+        if entry and entry[0] == key:
+            if entry[1] == versions:
+                self.hits += 1
+                return entry[3]
+            if fingerprint is not None:
+                current = fingerprint()
+                if current == entry[2]:
+                    with self._lock:
+                        self._entries[(actor_id, name)] = (key, versions, current, entry[3])
+                        self.hits += 1
+                    return entry[3]
+
+        current = fingerprint() if fingerprint is not None else None
+        value = compute()
+        with self._lock:
+            self._entries[(actor_id, name)] = (key, versions, current, value)
+            self.misses += 1
+        return value
+
+    def invalidate(self, actor_id: int = None, components: tuple[str, ...] = None):
+        with self._lock:
+            if actor_id is None and components is None:
+                self._entries.clear()
+                return
+            for entry_key in [entry_key for entry_key in self._entries
+                              if (actor_id is None or entry_key[0] == actor_id)
+                              and (components is None or entry_key[1] in components)]:
+                del self._entries[entry_key]
+
+    def info(self) -> dict[str, int]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
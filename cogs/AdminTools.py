@@ -6,9 +6,11 @@ import discord
 from discord.enums import ChannelType
 from discord.ext import commands
 from discord import default_permissions
-from ArbDatabase import DEFAULT_MANAGER, DataManager
+from ArbDatabase import DEFAULT_MANAGER, DEFAULT_CATALOG, DEFAULT_PROFILER, DataManager, replica_manager, run_blocking
 from ArbUIUX import ArbEmbed, HealthEmbed, Paginator, SuccessEmbed, ErrorEmbed, InteractiveForm, FormStep, Selection, SelectingForm
 from ArbResponse import Response, ResponsePool, Notification
+from ArbMigrations import DEFAULT_MIGRATOR, audit_query_plans
+from ArbArchive import DEFAULT_ARCHIVE
 
 from cogs.BasicCog import BasicCog
 
@@ -149,9 +151,8 @@ class AdminTools(BasicCog):
         return [f'{attack.get("id")} - {attack.get("name")}' for attack in attacks]
 
     async def get_all_characters(ctx: discord.AutocompleteContext):
-        db = DEFAULT_MANAGER
-        print([f'{char.get("id")} - {Character(char.get("id"), data_manager=db).name}' for char in db.select_dict('CHARS_INIT', 'id')])
-        return [f'{char.get("id")} - {Character(char.get("id"), data_manager=db).name}' for char in db.select_dict('CHARS_INIT', 'id')]
+        db = replica_manager()
+        return [f'{char_id} - {name}' for char_id, name in db.stream('CHARS_INIT', 'id, name', row_type='tuple')]
 
     async def get_all_races(ctx: discord.AutocompleteContext):
         db = DEFAULT_MANAGER
@@ -422,9 +423,8 @@ class AdminTools(BasicCog):
         await ctx.respond(f'', embed=response)
 
     async def get_all_items(ctx: discord.AutocompleteContext):
-        db = DEFAULT_MANAGER
-        items = db.select_dict('ITEMS')
-        return [f'{item.get("id")} - {item.get("name")}' for item in items]
+        db = replica_manager()
+        return [f'{item_id} - {name}' for item_id, name in db.stream('ITEMS', 'id, name', row_type='tuple')]
 
     async def get_all_itemtypes(ctx: discord.AutocompleteContext):
         db = DEFAULT_MANAGER
@@ -507,9 +507,8 @@ class AdminTools(BasicCog):
         return [f'{location.get("id")} - {location.get("label")}' for location in locations]
 
     async def get_all_locations(ctx: discord.AutocompleteContext):
-        db = DEFAULT_MANAGER
-        locations = db.select_dict('LOC_INIT')
-        return [f'{location.get("id")} - {location.get("label")}' for location in locations]
+        db = replica_manager()
+        return [f'{loc_id} - {label}' for loc_id, label in db.stream('LOC_INIT', 'id, label', row_type='tuple')]
 
     async def get_location_connections(ctx: discord.AutocompleteContext):
         from ArbLocations import Location
@@ -646,6 +645,61 @@ class AdminTools(BasicCog):
         db.update('SERVER_SETTINGS', {'features_chat': chat.id}, f'id = {ctx.guild.id}')
         await self.cfg_response(ctx, f'Вы успешно установили чат для получения обновлений: ``{chat}``')
 
+    @cfg_server.command(name='обновить-справочники', description="Перечитать справочные таблицы (оружие, ранения, навыки и т.д.) после правки контента")
+    @BasicCog.exception_handle
+    @BasicCog.admin_required
+    async def __reload_catalog(self, ctx, table: discord.Option(str, required=False, default=None,
+                                                              choices=sorted(DEFAULT_CATALOG.tables))):
+        tables = await run_blocking(DEFAULT_CATALOG.reload, table)
+        total = '\n'.join(f'-# - ``{name}``: {count} записей' for name, count in tables.items())
+        await ctx.respond(f'', embed=SuccessEmbed('Справочники обновлены', total))
+
+    @cfg_server.command(name='аудит-запросов', description="Показать запросы бота, которые читают таблицы целиком")
+    @BasicCog.exception_handle
+    @BasicCog.admin_required
+    async def __audit_queries(self, ctx):
+        def audit():
+            with DEFAULT_MANAGER.connection_pool.connection() as connection:
+                return audit_query_plans(connection)
+
+        scans = await run_blocking(audit)
+        version = await run_blocking(DEFAULT_MIGRATOR.current_version)
+        total = '\n'.join(f'-# - ``{step}``: ``{query}``' for query, step in scans[:15])
+        if len(scans) > 15:
+            total += f'\n-# *...и ещё {len(scans) - 15}*'
+        await ctx.respond(f'', embed=SuccessEmbed(f'Полные просмотры таблиц: {len(scans)} (схема v{version})',
+                                                  total or '-# *Все запросы используют индексы*'))
+
+    @cfg_server.command(name='профилировщик', description="Профилирование запросов к базе данных по командам")
+    @BasicCog.exception_handle
+    @BasicCog.admin_required
+    async def __query_profiler(self, ctx,
+                               action: discord.Option(str, choices=['включить', 'выключить', 'отчёт', 'сохранить', 'сбросить']),
+                               command: discord.Option(str, required=False, default=None),
+                               threshold: discord.Option(int, required=False, default=None, min_value=1)):
+        profiler = DEFAULT_PROFILER
+        if action == 'включить':
+            profiler.enable(threshold)
+            await self.cfg_response(ctx, f'Профилирование запросов включено (N+1 при повторе более {profiler.n_plus_one_threshold} раз)')
+        elif action == 'выключить':
+            profiler.disable()
+            await self.cfg_response(ctx, 'Профилирование запросов выключено')
+        elif action == 'сбросить':
+            profiler.reset()
+            await self.cfg_response(ctx, 'Статистика профилирования сброшена')
+        elif action == 'сохранить':
+            path = await run_blocking(profiler.dump, f'Logs/queries-{datetime.datetime.now():%Y%m%d-%H%M%S}.json')
+            await self.cfg_response(ctx, f'Отчёт профилирования сохранён: ``{path}``')
+        else:
+            report = profiler.report(command)
+            lines = []
+            for name, stats in list(report.items())[:10]:
+                lines.append(f'**{name}** — вызовов: {stats["calls"]}, запросов: {stats["queries"]} '
+                             f'(в среднем {stats["avg_queries"]}, максимум {stats["max_queries"]}), {stats["time_ms"]} мс')
+                lines.extend(f'-# - N+1: {count}x ``{shape}``' for shape, count in list(stats['n_plus_one'].items())[:3])
+            await ctx.respond(f'', embed=SuccessEmbed('Запросы к базе данных по командам',
+                                                      '\n'.join(lines)[:4000] or '-# *Нет данных*'))
+
     @cfg.command(name='чат-модерации', description="Установить чат администрации")
     @BasicCog.exception_handle
     @BasicCog.admin_required
@@ -1487,7 +1541,7 @@ class AdminTools(BasicCog):
                               battle_type: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(AAC.db_call('BATTLE_CONDITIONS', 'label')), required=False, default='Столкновение'),
                               battle_type_value: discord.Option(str, required=False, default=None)):
 
-        battle_id = DEFAULT_MANAGER.maxValue('BATTLE_INIT', 'id') + 1
+        battle_id = DEFAULT_MANAGER.next_id('BATTLE_INIT')
         query = {
             'id': battle_id,
             'label': label,
@@ -1534,6 +1588,44 @@ class AdminTools(BasicCog):
 
         await ctx.respond(embed=embed)
 
+    @cfg_battle.command(name='архив-боёв', description="Завершённые бои в архиве и их восстановление для разбора")
+    @BasicCog.exception_handle
+    @BasicCog.admin_required
+    async def __battle_archive(self, ctx,
+                               action: discord.Option(str, choices=['список', 'восстановить']),
+                               battle_id: discord.Option(int, required=False, default=None)):
+        if action == 'восстановить':
+            if battle_id is None:
+                await ctx.respond(f'', embed=ErrorEmbed('Архив боёв', '-# *Укажите номер боя для восстановления*'))
+                return
+            restored = await run_blocking(DEFAULT_ARCHIVE.restore, battle_id)
+            if restored is None:
+                await ctx.respond(f'', embed=ErrorEmbed('Архив боёв', f'-# *Бой {battle_id} не найден в архиве*'))
+                return
+            total = '\n'.join(f'-# - ``{table}``: {count} записей' for table, count in restored.items())
+            await ctx.respond(f'', embed=SuccessEmbed(f'Бой {battle_id} восстановлен из архива', total))
+            return
+
+        entries = await run_blocking(DEFAULT_ARCHIVE.entries)
+        info = await run_blocking(DEFAULT_ARCHIVE.info)
+        total = '\n'.join(f'**{entry.battle_id}** — {entry.label} ({entry.battle_type}), раундов: {entry.rounds}, '
+                          f'участников: {entry.actors}\n-# *{entry.archived_at}, {entry.size // 1024} КБ*'
+                          for entry in entries)
+        await ctx.respond(f'', embed=SuccessEmbed(f'Архив боёв: {info["battles"]} ({info["bytes"] // 1024} КБ)',
+                                                  total[:4000] or '-# *Архив пуст*'))
+
+    @cfg_battle.command(name='маскировка-участника', description="Показать, из чего складывается маскировка участника боя")
+    @BasicCog.exception_handle
+    @BasicCog.admin_required
+    async def __actor_stealth(self, ctx,
+                              battle: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(active_battles), required=True),
+                              actor: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(get_battle_actors), required=True)):
+        actor_id = BasicCog.prepare_id(actor)
+        score = await run_blocking(lambda: Actor(actor_id).stealth_score())
+
+        total = '\n'.join(f'-# - {line}' for line in score.explain())
+        await ctx.respond(f'', embed=SuccessEmbed(f'Маскировка {Character(actor_id).name} ({actor_id})', total))
+
     @cfg_battle.command(name='изменить-параметры-участника', description="Изменить настройки участника боя")
     @BasicCog.exception_handle
     @BasicCog.admin_required
@@ -1586,9 +1678,8 @@ class AdminTools(BasicCog):
                           take_actor_control: discord.Option(bool, default=True, required=False)):
 
         battle_id = BasicCog.prepare_id(battle)
-        battlefield = Battlefield(battle_id)
 
-        result = battlefield.next_actor()
+        result = await self.battle_action(battle_id, 'next_actor')
         await Notification.send_all_notifications(ctx)
 
         if take_actor_control:
@@ -1605,9 +1696,8 @@ class AdminTools(BasicCog):
     async def __end_round(self, ctx,
                           battle: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(active_battles), required=True)):
         battle_id = BasicCog.prepare_id(battle)
-        battlefield = Battlefield(battle_id)
 
-        is_end, result = battlefield.next_round()
+        is_end, result = await self.battle_action(battle_id, 'next_round')
         embeds = result.get_embeds()
         view = Paginator(embeds, ctx)
         await view.update_button()
@@ -1620,8 +1710,7 @@ class AdminTools(BasicCog):
     async def __end_battle(self, ctx,
                           battle: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(active_battles), required=True)):
         battle_id = BasicCog.prepare_id(battle)
-        battlefield = Battlefield(battle_id)
-        result = battlefield.end_battle()
+        result = await self.battle_action(battle_id, 'end_battle')
         embeds = result.get_embeds()
         view = Paginator(embeds, ctx)
         await view.update_button()
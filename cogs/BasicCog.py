@@ -1,4 +1,4 @@
-from ArbDatabase import DataManager, DataModel, DataDict, DEFAULT_MANAGER
+from ArbDatabase import DataManager, DataModel, DataDict, DEFAULT_MANAGER, blocking
 import discord
 from discord.ext import commands
 from ArbUtils.ArbDataParser import get_owners_character
@@ -73,6 +73,37 @@ class BasicCog(commands.Cog):
         else:
             return False
 
+    @staticmethod
+    @blocking
+    def actor_action(character_id: int, action: str, *args):
+        """
+        Выполняет боевое действие персонажа одной транзакцией в пуле потоков, не блокируя цикл событий бота.
+        Данные боя читаются из ``BattleState`` и записываются в конце действия; писатель захватывается только
+        с первой записи, поэтому чтения действия не задерживают записи других команд.
+        """
+        from ArbBattle import Actor
+        from ArbBattleState import BattleState
+        with DEFAULT_MANAGER.request_scope() as cache_stats, DEFAULT_MANAGER.transaction(deferred=True), \
+                BattleState.command_for_actor(character_id):
+            result = getattr(Actor(character_id), action)(*args)
+        DEFAULT_MANAGER.logger.info(f"Кеш строк ({action}): {cache_stats.to_dict()}")
+        return result
+
+    @staticmethod
+    @blocking
+    def battle_action(battle_id: int, action: str, *args):
+        """
+        Выполняет действие с полем боя одной транзакцией в пуле потоков, не блокируя цикл событий бота.
+        Данные боя читаются из ``BattleState`` и записываются в конце действия (писатель захватывается с первой записи).
+        """
+        from ArbBattle import Battlefield
+        from ArbBattleState import BattleState
+        with DEFAULT_MANAGER.request_scope() as cache_stats, DEFAULT_MANAGER.transaction(deferred=True), \
+                BattleState.command(battle_id):
+            result = getattr(Battlefield(battle_id), action)(*args)
+        DEFAULT_MANAGER.logger.info(f"Кеш строк ({action}): {cache_stats.to_dict()}")
+        return result
+
     async def respond_if_not_admin(self, ctx):
         respond = ErrorEmbed('Недостаточно прав', f'-# *{ctx.author.mention} у Вас недостаточно прав для использования данного функционала!*')
         await ctx.respond(embed=respond, ephemeral=True)
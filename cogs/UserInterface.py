@@ -1607,8 +1607,7 @@ class CharacterCombat(BasicCog):
                              character_id: int = None):
         sound_id = BasicCog.prepare_id(sound)
 
-        actor = Actor(character_id)
-        responses = actor.detect_sound(sound_id)
+        responses = await self.actor_action(character_id, 'detect_sound', sound_id)
 
         embeds = responses.get_embeds()
 
@@ -1645,8 +1644,7 @@ class CharacterCombat(BasicCog):
                               character_id: int=None):
         layer_id = BasicCog.prepare_id(layer)
 
-        actor = Actor(character_id)
-        responses: ActionManager = actor.move_to_layer(layer_id)
+        responses: ActionManager = await self.actor_action(character_id, 'move_to_layer', layer_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1661,8 +1659,7 @@ class CharacterCombat(BasicCog):
                                character_id: int = None):
         object_id = BasicCog.prepare_id(object)
 
-        actor = Actor(character_id)
-        responses: ActionManager = actor.move_to_object(object_id)
+        responses: ActionManager = await self.actor_action(character_id, 'move_to_object', object_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1673,8 +1670,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __escape(self, ctx, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.escape()
+        responses: ActionManager = await self.actor_action(character_id, 'escape')
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1687,8 +1683,7 @@ class CharacterCombat(BasicCog):
     async def __fly(self, ctx,
                     height: discord.Option(int, min_value=0, max_value=500, default=None, required=False),
                     character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.fly(height)
+        responses: ActionManager = await self.actor_action(character_id, 'fly', height)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1701,11 +1696,9 @@ class CharacterCombat(BasicCog):
     async def __reload(self, ctx,
                        ammo_type: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(ammo_type), required=True),
                        character_id: int = None):
-        actor = Actor(character_id)
-
         ammo_id = AAC.extract('AMMO', 'name', ammo_type, 'id')
         print(ammo_id)
-        responses: ActionManager = actor.reload(ammo_id)
+        responses: ActionManager = await self.actor_action(character_id, 'reload', ammo_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1716,8 +1709,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __range_attack(self, ctx, enemy_id: int=None, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.range_attack(enemy_id)
+        responses: ActionManager = await self.actor_action(character_id, 'range_attack', enemy_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1736,8 +1728,7 @@ class CharacterCombat(BasicCog):
                              enemy: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(get_melees)),
                              character_id: int = None):
         enemy_id = BasicCog.prepare_id(enemy)
-        actor = Actor(character_id)
-        responses: ActionManager = actor.melee_attack(enemy_id)
+        responses: ActionManager = await self.actor_action(character_id, 'melee_attack', enemy_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1753,8 +1744,7 @@ class CharacterCombat(BasicCog):
                             character_id: int = None):
         attack_id = attack.split(' ')[0] if attack else None
 
-        actor = Actor(character_id)
-        responses: ActionManager = actor.race_attack(enemy_id, attack_id)
+        responses: ActionManager = await self.actor_action(character_id, 'race_attack', enemy_id, attack_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1766,8 +1756,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.in_battle
     async def __grenade_attack(self, ctx, layer: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(get_near_layers)), grenade_id: int = None, character_id: int = None):
         layer_id = BasicCog.prepare_id(layer)
-        actor = Actor(character_id)
-        responses: ActionManager = actor.throw_grenade(layer_id, grenade_id)
+        responses: ActionManager = await self.actor_action(character_id, 'throw_grenade', layer_id, grenade_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1778,8 +1767,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __set_target(self, ctx, enemy_id: int = None, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.set_target(enemy_id)
+        responses: ActionManager = await self.actor_action(character_id, 'set_target', enemy_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1790,8 +1778,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __set_melee_target(self, ctx, enemy_id: int = None, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.set_melee_target(enemy_id)
+        responses: ActionManager = await self.actor_action(character_id, 'set_melee_target', enemy_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1802,8 +1789,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __flee_from_melee(self, ctx, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.flee_from_melee()
+        responses: ActionManager = await self.actor_action(character_id, 'flee_from_melee')
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1814,8 +1800,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __object_interaction(self, ctx, target_id:int=None, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.interact_with_object(target_id)
+        responses: ActionManager = await self.actor_action(character_id, 'interact_with_object', target_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1826,8 +1811,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __hunt(self, ctx, enemy_id:int=None, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.set_hunt(enemy_id)
+        responses: ActionManager = await self.actor_action(character_id, 'set_hunt', enemy_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1841,8 +1825,7 @@ class CharacterCombat(BasicCog):
                          cover: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(get_all_objects)),
                          character_id: int = None):
         cover_id = BasicCog.prepare_id(cover)
-        actor = Actor(character_id)
-        responses: ActionManager = actor.set_suppression(cover_id)
+        responses: ActionManager = await self.actor_action(character_id, 'set_suppression', cover_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1857,8 +1840,7 @@ class CharacterCombat(BasicCog):
                         character_id: int = None):
         layer_id = BasicCog.prepare_id(layer)
 
-        actor = Actor(character_id)
-        responses: ActionManager = actor.set_containment(layer_id)
+        responses: ActionManager = await self.actor_action(character_id, 'set_containment', layer_id)
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1869,8 +1851,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __overwatch(self, ctx, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.set_overwatch()
+        responses: ActionManager = await self.actor_action(character_id, 'set_overwatch')
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1881,8 +1862,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __wait(self, ctx, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.waiting()
+        responses: ActionManager = await self.actor_action(character_id, 'waiting')
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -1893,8 +1873,7 @@ class CharacterCombat(BasicCog):
     @BasicCog.character_required
     @BasicCog.in_battle
     async def __stop(self, ctx, character_id: int = None):
-        actor = Actor(character_id)
-        responses: ActionManager = actor.reset_statuses()
+        responses: ActionManager = await self.actor_action(character_id, 'reset_statuses')
         embeds = responses.log
 
         await embeds.view_responds(ctx)
@@ -5,7 +5,8 @@ from ArbUIUX import ErrorEmbed, SuccessEmbed
 import json
 import os
 
-from ArbDatabase import DataManager
+from ArbDatabase import DataManager, DEFAULT_CATALOG, DEFAULT_PROFILER, run_blocking
+from ArbMigrations import DEFAULT_MIGRATOR
 
 file = open('config.json', 'r')
 config = json.load(file)
@@ -22,8 +23,19 @@ async def on_ready():
             server.register_player(member.id)
             Player.register(member.id)
 
+    catalog = await run_blocking(DEFAULT_CATALOG.load)
+    print(f'-- Catalog loaded: {sum(catalog.values())} rows in {len(catalog)} tables')
     print('-- Arbiter ready')
 
+@bot.before_invoke
+async def profile_command(ctx):
+    DEFAULT_PROFILER.start(ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def finish_command_profile(ctx):
+    DEFAULT_PROFILER.finish()
+
 # @bot.slash_command(name='option_test')
 # async def __test(
 #         ctx,
@@ -39,6 +51,9 @@ async def on_ready():
 #     for argument in (number, boolean, member, text, choice):
 #         print(f'{argument} ({type(argument).__name__})\n')
 
+for migration in DEFAULT_MIGRATOR.migrate():
+    print(f'-- Migration {migration.version} applied: {migration.name}')
+
 for file in os.listdir('./cogs'):
     if file.endswith('.py'):
         bot.load_extension(f'cogs.{file[:-3]}')
@@ -0,0 +1,30 @@
+"""
+Архив боёв ``BattleArchive`` на снимке ``Arbiter.db`` без применённых миграций: таблицы архива создаются
+при первом обращении, обнулённая каскадом ссылка ``LOC_INIT.current_battle`` возвращается при ``restore``.
+Запуск: ``python -m pytest -q test_archive.py``.
+"""
+from ArbArchive import BattleArchive
+from ArbBenchmarks import _insert_battle, database_copy
+
+
+def test_archive_and_restore_without_migrations():
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        assert 'ARCHIVE_BATTLES' not in manager.schema.tables()
+
+        battle_id = _insert_battle(manager, 10)
+        location = manager.raw_execute('SELECT id FROM LOC_INIT LIMIT 1')[0][0]
+        manager.update('LOC_INIT', {'current_battle': battle_id}, f'id = "{location}"')
+
+        archive = BattleArchive(manager)
+        entry = archive.archive(battle_id, summary='Замер')
+        assert entry.actors == 10
+        assert not manager.check('BATTLE_INIT', f'id = {battle_id}')
+        assert manager.select_dict('LOC_INIT', filter=f'id = "{location}"')[0]['current_battle'] is None
+
+        restored = archive.restore(battle_id)
+        assert restored['BATTLE_CHARACTERS'] == 10
+        assert manager.check('BATTLE_INIT', f'id = {battle_id}')
+        assert manager.select_dict('LOC_INIT', filter=f'id = "{location}"')[0]['current_battle'] == battle_id
+        assert archive.get(battle_id) is None
+        manager.close_connection()
@@ -0,0 +1,43 @@
+"""
+Число запросов при создании моделей: ``DataModel.load`` читает строку одним запросом (без ``check`` и
+``get_all_columns``). Проверки работают со снимком ``Arbiter.db``. Запуск: ``python -m pytest -q test_model_load.py``.
+"""
+from ArbBenchmarks import MODEL_LOAD_QUERIES, database_copy, model_load_profiles
+
+
+def test_model_load_queries():
+    with database_copy() as database:
+        profiles = model_load_profiles(database)
+
+    for label, profile in profiles.items():
+        assert len(profile.records) <= MODEL_LOAD_QUERIES[label], (label, profile.shapes())
+
+
+def test_actor_single_query():
+    with database_copy() as database:
+        profile = model_load_profiles(database)['Actor']
+
+    assert len(profile.records) == 1
+    assert list(profile.shapes()) == ['SELECT * FROM BATTLE_CHARACTERS WHERE character_id = ?']
+
+
+def test_missing_skill_inserted_once():
+    """``Skill`` вставляет недостающую строку сам; повторные проверки (как в команде повышения навыка) её видят."""
+    from ArbSkills import Skill
+
+    with database_copy() as database:
+        manager = database.manager()
+        character_id = manager.raw_execute('SELECT id FROM CHARS_INIT LIMIT 1')[0][0]
+        skill_id = manager.raw_execute('SELECT id FROM SKILL_INIT WHERE id NOT IN '
+                                       '(SELECT skill_id FROM CHARS_SKILLS WHERE id = ?) LIMIT 1', (character_id,))[0][0]
+
+        skill = Skill(character_id, skill_id, data_manager=manager)
+        assert skill.check_skill_record()
+        if not skill.check_skill_record():
+            skill.insert_skill()
+        skill.upgrade_skill(10)
+
+        rows = manager.raw_execute('SELECT COUNT(*) FROM CHARS_SKILLS WHERE id = ? AND skill_id = ?', (character_id, skill_id))
+        manager.close_connection()
+
+    assert rows[0][0] == 1
@@ -0,0 +1,44 @@
+"""
+Единица работы ``DataManager.transaction``: ошибка записи внутри блока откатывает все его изменения, даже если
+вызывающий код перехватил исключение. Проверки работают со снимком ``Arbiter.db``.
+Запуск: ``python -m pytest -q test_transaction.py``.
+"""
+import sqlite3
+
+import pytest
+
+from ArbBenchmarks import database_copy
+
+
+def character_name(manager, character_id: int) -> str:
+    return manager.raw_execute('SELECT name FROM CHARS_INIT WHERE id = ?', (character_id,))[0][0]
+
+
+@pytest.mark.parametrize('deferred', (False, True))
+def test_caught_write_error_rolls_back(deferred):
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        character_id = manager.raw_execute('SELECT id FROM CHARS_INIT LIMIT 1')[0][0]
+        name = character_name(manager, character_id)
+
+        with manager.transaction(deferred=deferred):
+            manager.update('CHARS_INIT', {'name': 'Замер'}, f'id = {character_id}')
+            try:
+                manager.insert('CHARS_INIT', {'id': character_id})
+            except sqlite3.IntegrityError:
+                pass
+
+        assert character_name(manager, character_id) == name
+        manager.close_connection()
+
+
+def test_transaction_commits_without_errors():
+    with database_copy() as database:
+        manager = database.manager(catalog=None)
+        character_id = manager.raw_execute('SELECT id FROM CHARS_INIT LIMIT 1')[0][0]
+
+        with manager.transaction():
+            manager.update('CHARS_INIT', {'name': 'Замер'}, f'id = {character_id}')
+
+        assert character_name(manager, character_id) == 'Замер'
+        manager.close_connection()
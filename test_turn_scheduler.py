@@ -0,0 +1,122 @@
+"""
+Очередь ходов ``TurnScheduler`` против прежних методов ``Battlefield`` (``turn_order``, ``max_initiative_actor``,
+``current_turn_index``), переписанных в ``ArbBenchmarks.reference_turns``: случайные бои с равными инициативами,
+смертями и новыми участниками. Запуск: ``python -m pytest -q test_turn_scheduler.py``.
+"""
+import random
+
+import pytest
+
+from ArbBattleState import TurnScheduler
+from ArbBenchmarks import reference_turns
+
+INITIATIVES = [None, 0, 1, 5, 5, 20, 50, 50, 99]
+ACTIVITIES = [None, None, 0, 1]
+
+
+def assert_same_turns(scheduler: TurnScheduler, rows: dict[int, dict]):
+    order, next_actor, index = reference_turns(rows)
+    assert scheduler.order() == order
+    assert scheduler.next_actor() == next_actor
+    assert scheduler.current_index() == index
+    assert scheduler.last() == (order[-1] if order else None)
+    assert [scheduler.index(actor_id) for actor_id in order] == list(range(len(order)))
+    assert len(scheduler) == len(rows)
+
+
+def random_battle(generator: random.Random, actors: int) -> tuple[dict[int, dict], TurnScheduler]:
+    rows = {actor_id: {'initiative': generator.choice(INITIATIVES), 'is_active': generator.choice(ACTIVITIES)}
+            for actor_id in generator.sample(range(1000), actors)}
+    return rows, TurnScheduler((actor_id, row['initiative'], row['is_active']) for actor_id, row in rows.items())
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_random_changes(seed):
+    generator = random.Random(seed)
+    rows, scheduler = random_battle(generator, generator.randint(0, 30))
+
+    for _ in range(200):
+        assert_same_turns(scheduler, rows)
+
+        action = generator.random()
+        if action < 0.1 and rows:
+            actor_id = generator.choice(list(rows))
+            del rows[actor_id]
+            scheduler.remove(actor_id)
+        elif action < 0.2:
+            actor_id = generator.randrange(1000, 2000)
+            if actor_id not in rows:
+                rows[actor_id] = {'initiative': None, 'is_active': None}
+                scheduler.set(actor_id)
+        elif rows:
+            actor_id = generator.choice(list(rows))
+            column = generator.choice(('initiative', 'is_active'))
+            value = generator.choice(INITIATIVES if column == 'initiative' else ACTIVITIES)
+            rows[actor_id][column] = value
+            scheduler.set(actor_id, **{column: value})
+
+    assert_same_turns(scheduler, rows)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_full_rounds(seed):
+    """Раунды целиком: участники ходят по очереди, иногда умирают или вступают в бой, в начале раунда - новые инициативы."""
+    generator = random.Random(seed)
+    rows, scheduler = random_battle(generator, generator.randint(1, 40))
+
+    for _ in range(5):
+        for actor_id, row in rows.items():
+            row.update(initiative=generator.choice(INITIATIVES), is_active=None)
+            scheduler.set(actor_id, initiative=row['initiative'], is_active=None)
+        assert_same_turns(scheduler, rows)
+
+        while (actor_id := scheduler.next_actor()) is not None:
+            rows[actor_id]['is_active'] = 1
+            scheduler.set(actor_id, is_active=1)
+            assert_same_turns(scheduler, rows)
+
+            rows[actor_id]['is_active'] = 0
+            scheduler.set(actor_id, is_active=0)
+            if generator.random() < 0.1:
+                victim = generator.choice(list(rows))
+                del rows[victim]
+                scheduler.remove(victim)
+            if generator.random() < 0.1:
+                newcomer = generator.randrange(1000, 2000)
+                if newcomer not in rows:
+                    rows[newcomer] = {'initiative': generator.choice(INITIATIVES), 'is_active': None}
+                    scheduler.set(newcomer, initiative=rows[newcomer]['initiative'])
+            assert_same_turns(scheduler, rows)
+
+
+def test_ties_keep_row_order():
+    rows = {actor_id: {'initiative': 50, 'is_active': None} for actor_id in (7, 3, 9, 1)}
+    scheduler = TurnScheduler.from_rows({'character_id': actor_id, **row} for actor_id, row in rows.items())
+
+    assert scheduler.order() == [7, 3, 9, 1]
+    assert scheduler.next_actor() == 7
+    assert_same_turns(scheduler, rows)
+
+
+def test_dead_and_readded_actor_goes_last():
+    rows = {actor_id: {'initiative': 20, 'is_active': None} for actor_id in (1, 2, 3)}
+    scheduler = TurnScheduler((actor_id, 20, None) for actor_id in rows)
+
+    del rows[1]
+    scheduler.remove(1)
+    assert scheduler.next_actor() == 2
+    assert 1 not in scheduler
+
+    rows[1] = {'initiative': 20, 'is_active': None}
+    scheduler.set(1, initiative=20)
+    assert scheduler.order() == [2, 3, 1]
+    assert_same_turns(scheduler, rows)
+
+
+def test_no_waiting_actors():
+    rows = {1: {'initiative': 0, 'is_active': None}, 2: {'initiative': None, 'is_active': None},
+            3: {'initiative': 40, 'is_active': 0}}
+    scheduler = TurnScheduler((actor_id, row['initiative'], row['is_active']) for actor_id, row in rows.items())
+
+    assert scheduler.next_actor() is None
+    assert_same_turns(scheduler, rows)